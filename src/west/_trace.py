@@ -0,0 +1,131 @@
+# SPDX-License-Identifier: Apache-2.0
+
+'''Timeline tracing for "west --trace FILE".
+
+This is private to west. It records spans of time (manifest loading,
+imports, git commands, and so on) and saves them in the Chrome trace
+event format, which can be viewed in Perfetto (https://ui.perfetto.dev)
+or chrome://tracing.
+
+Tracing is off unless start() is called. While it is off, span() and
+traced() add almost no overhead.'''
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections.abc import Callable, Iterator
+from typing import Any
+
+# List of trace events while tracing, None otherwise.
+_events: list[dict[str, Any]] | None = None
+_thread_names: dict[int, str] = {}
+_lock = threading.Lock()
+
+
+def start() -> None:
+    '''Start recording trace events.'''
+    global _events
+
+    _events = []
+
+
+def stop() -> None:
+    '''Stop recording trace events and forget any recorded so far.'''
+    global _events
+
+    with _lock:
+        _events = None
+        _thread_names.clear()
+
+
+def enabled() -> bool:
+    '''True if trace events are being recorded.'''
+    return _events is not None
+
+
+def _now() -> float:
+    # Trace event timestamps are in microseconds.
+    return time.perf_counter_ns() / 1000
+
+
+@contextlib.contextmanager
+def _span(name: str, cat: str, args: dict[str, Any]) -> Iterator[None]:
+    thread = threading.current_thread()
+    tid = threading.get_ident()
+    start_ts = _now()
+    try:
+        yield
+    finally:
+        event = {
+            'name': name,
+            'cat': cat,
+            'ph': 'X',
+            'ts': start_ts,
+            'dur': _now() - start_ts,
+            'pid': os.getpid(),
+            'tid': tid,
+        }
+        if args:
+            event['args'] = args
+        with _lock:
+            _thread_names[tid] = thread.name
+            if _events is not None:
+                _events.append(event)
+
+
+def span(name: str, cat: str = 'west', **args: Any) -> contextlib.AbstractContextManager:
+    '''Context manager which records a span named *name* around its
+    body, with *args* shown as its details.
+
+    :param name: span name
+    :param cat: span category
+    '''
+    if _events is None:
+        return contextlib.nullcontext()
+    return _span(name, cat, args)
+
+
+def traced(
+    name: str, cat: str = 'west', args: Callable[..., dict[str, Any]] | None = None
+) -> Callable:
+    '''Decorator which records a span around each call to a function.
+
+    :param name: span name
+    :param cat: span category
+    :param args: if given, called with the function's arguments to
+        get the span's details
+    '''
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*func_args, **func_kwargs):
+            if _events is None:
+                return func(*func_args, **func_kwargs)
+            details = args(*func_args, **func_kwargs) if args else {}
+            with _span(name, cat, details):
+                return func(*func_args, **func_kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def save(path: str) -> None:
+    '''Save the trace events recorded so far to the file *path* in
+    the Chrome trace event format.'''
+
+    with _lock:
+        events = list(_events or [])
+        names = dict(_thread_names)
+    pid = os.getpid()
+    metadata = [
+        {'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'west'}},
+    ] + [
+        {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+        for tid, name in names.items()
+    ]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f)
@@ -21,6 +21,7 @@ import signal
 import sys
 import tempfile
 import textwrap
+import threading
 import traceback
 from collections import OrderedDict
 from io import StringIO
@@ -38,9 +39,10 @@ if __name__ == "__main__":
     sys.path.insert(0, os.fspath(src_dir))
 
 import west.configuration
-from west import log
+from west import _trace, log
 from west.app.config import Config
 from west.app.project import (
+    Cache,
     Compare,
     Diff,
     ForAll,
@@ -62,13 +64,16 @@ from west.commands import (
 )
 from west.manifest import (
     MANIFEST_REV_BRANCH,
+    GitCall,
     MalformedConfig,
     MalformedManifest,
-    Manifest,
     ManifestImportFailed,
     ManifestProject,
     ManifestVersionError,
+    _manifest_from_topdir_cached,
     _ManifestImportDepth,
+    add_git_call_hook,
+    remove_git_call_hook,
 )
 from west.util import WestNotFound, quote_sh_list, west_topdir
 from west.version import __version__
@@ -92,6 +97,8 @@ class EarlyArgs(NamedTuple):
     help: bool  # True if -h was given
     version: bool  # True if -V was given
     zephyr_base: str | None  # -z argument value
+    trace: str | None  # --trace argument value
+    git_summary: bool  # True if --git-summary was given
     verbosity: int  # 0 if not given, otherwise counts
     command_name: str | None
 
@@ -105,11 +112,14 @@ def parse_early_args(argv: list[str]) -> EarlyArgs:
     help = False
     version = False
     zephyr_base = None
+    trace = None
+    git_summary = False
     verbosity = 0
     command_name = None
     unexpected_arguments = []
 
     expecting_zephyr_base = False
+    expecting_trace = False
 
     def consume_more_args(rest):
         # Handle the 'Vv' portion of 'west -hVv'.
@@ -145,6 +155,15 @@ def parse_early_args(argv: list[str]) -> EarlyArgs:
     for arg in argv:
         if expecting_zephyr_base:
             zephyr_base = arg
+        elif expecting_trace:
+            trace = arg
+            expecting_trace = False
+        elif arg == '--trace':
+            expecting_trace = True
+        elif arg.startswith('--trace='):
+            trace = arg[len('--trace=') :]
+        elif arg == '--git-summary':
+            git_summary = True
         elif arg.startswith('-h'):
             help = True
             consume_more_args(arg[2:])
@@ -176,7 +195,87 @@ def parse_early_args(argv: list[str]) -> EarlyArgs:
             command_name = arg
             break
 
-    return EarlyArgs(help, version, zephyr_base, verbosity, command_name, unexpected_arguments)
+    return EarlyArgs(
+        help,
+        version,
+        zephyr_base,
+        trace,
+        git_summary,
+        verbosity,
+        command_name,
+        unexpected_arguments,
+    )
+
+
+def git_subcommand(args: list[str]) -> str:
+    # Get the subcommand name ('fetch', 'rev-parse', ...) from a git
+    # command line, skipping any options before it.
+
+    it = iter(args[1:])
+    for arg in it:
+        if arg in ('-c', '-C'):
+            next(it, None)
+        elif not arg.startswith('-'):
+            return arg
+    return '<none>'
+
+
+class GitSummary:
+    # Keeps track of the git commands west runs for 'west
+    # --git-summary'. Instances are registered as git call hooks with
+    # west.manifest.add_git_call_hook(), which documents which
+    # commands are included.
+
+    # How many subcommands to list in the report.
+    MAX_COMMANDS = 10
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}  # subcommand name -> number of calls
+        self.times = {}  # subcommand name -> total duration, in seconds
+        self.failures = 0  # number of calls with nonzero exit codes
+
+    def __call__(self, call: GitCall):
+        name = git_subcommand(call.args)
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+            self.times[name] = self.times.get(name, 0.0) + call.duration
+            if call.returncode:
+                self.failures += 1
+
+    def report(self, file=None):
+        if file is None:
+            file = sys.stderr
+
+        with self.lock:
+            counts = dict(self.counts)
+            times = dict(self.times)
+            failures = self.failures
+
+        total_count = sum(counts.values())
+        total_time = sum(times.values())
+        print(
+            f'west: git summary: {total_count} command(s) in {total_time:.3f} s, {failures} failed',
+            file=file,
+        )
+        if not counts:
+            return
+
+        names = sorted(counts, key=lambda name: (-times[name], -counts[name], name))
+        print(f'  {"count":>7}  {"total (s)":>10}  {"mean (ms)":>10}  command', file=file)
+        for name in names[: self.MAX_COMMANDS]:
+            mean_ms = 1000 * times[name] / counts[name]
+            print(
+                f'  {counts[name]:7}  {times[name]:10.3f}  {mean_ms:10.1f}  git {name}', file=file
+            )
+        if len(names) > self.MAX_COMMANDS:
+            rest = names[self.MAX_COMMANDS :]
+            print(
+                f'  {sum(counts[name] for name in rest):7}  '
+                f'{sum(times[name] for name in rest):10.3f}  {"":10}  '
+                f'({len(rest)} other command(s))',
+                file=file,
+            )
 
 
 class LogFormatter(logging.Formatter):
@@ -247,6 +346,24 @@ class WestApp:
 
         early_args = parse_early_args(argv)
 
+        # Start tracing as early as we can, so the trace covers as
+        # much of the run as possible.
+        if early_args.trace:
+            _trace.start()
+        git_summary = GitSummary() if early_args.git_summary else None
+        if git_summary:
+            add_git_call_hook(git_summary)
+        try:
+            self._run(argv, early_args)
+        finally:
+            if early_args.trace:
+                self.save_trace(early_args.trace)
+                _trace.stop()
+            if git_summary:
+                remove_git_call_hook(git_summary)
+                git_summary.report()
+
+    def _run(self, argv, early_args):
         # Silence validation errors from pykwalify, which are logged at
         # logging.ERROR level. We want to handle those ourselves as
         # needed.
@@ -275,10 +392,15 @@ class WestApp:
         # backwards compatibility.
         self.config._copy_to_configparser(west.configuration.config)
 
-        # Set self.manifest and self.extensions.
-        self.load_manifest()
-        self.load_extension_specs()
+        # Set self.aliases, then self.manifest and self.extensions if
+        # the command might need them. Resolving the manifest can be
+        # expensive, so don't do it unless we have to.
         self.load_aliases()
+        if self.needs_manifest(early_args):
+            with _trace.span('load_manifest'):
+                self.load_manifest()
+            with _trace.span('load_extension_specs'):
+                self.load_extension_specs()
 
         # Set up initial argument parsers. This requires knowing
         # self.extensions, so it can't happen before now.
@@ -287,6 +409,41 @@ class WestApp:
         # OK, we are all set. Run the command.
         self.run_command(argv, early_args)
 
+    def save_trace(self, path):
+        # Save the trace events recorded for 'west --trace'. Failing
+        # to do so is not worth an error exit status, since the
+        # command itself has already run.
+
+        try:
+            _trace.save(path)
+        except OSError as ose:
+            print(f'west: warning: could not save trace to {path}: {ose}', file=sys.stderr)
+
+    def needs_manifest(self, early_args):
+        # Returns True if the command we're about to run might use the
+        # manifest or extension commands, and False if it definitely
+        # won't.
+
+        if early_args.help:
+            # 'west -h <command>' might be asking about an extension.
+            return True
+
+        if early_args.command_name is None:
+            # 'west --version' exits before doing anything else. A plain
+            # 'west' prints help, which includes the extension commands.
+            return not early_args.version
+
+        # Follow aliases the same way run_command() does.
+        command_name = early_args.command_name
+        aliases = self.aliases.copy()
+        while command_name in aliases:
+            alias = aliases.pop(command_name)
+            if not alias.args:
+                break
+            command_name = alias.args[0]
+
+        return command_name not in NO_MANIFEST_COMMANDS
+
     def load_manifest(self):
         # Try to parse the manifest. We'll save it if that works, so
         # it doesn't have to be re-parsed.
@@ -295,7 +452,7 @@ class WestApp:
             return
 
         try:
-            self.manifest = Manifest.from_topdir(topdir=self.topdir, config=self.config)
+            self.manifest = _manifest_from_topdir_cached(self.topdir, self.config)
         except (
             ManifestVersionError,
             MalformedManifest,
@@ -552,6 +709,22 @@ class WestApp:
                     "zephyr".''',
         )
 
+        parser.add_argument(
+            '--trace',
+            metavar='FILE',
+            default=None,
+            help='''Save a timeline of what west did to FILE, in the
+                    Chrome trace event format. View it with
+                    https://ui.perfetto.dev or chrome://tracing.''',
+        )
+
+        parser.add_argument(
+            '--git-summary',
+            action='store_true',
+            help='''When west exits, print how many git commands it
+                    ran and how long they took, by git command.''',
+        )
+
         parser.add_argument(
             '-v',
             '--verbose',
@@ -1281,6 +1454,7 @@ BUILTIN_COMMAND_GROUPS = {
         Status,
         ForAll,
         Grep,
+        Cache,
     ],
     'other built-in commands': [
         Help,
@@ -1291,5 +1465,10 @@ BUILTIN_COMMAND_GROUPS = {
     None: [SelfUpdate],
 }
 
+# Built-in commands which never use the manifest or extension commands.
+# WestApp doesn't resolve the manifest before running these, so make
+# sure that stays true if you change them.
+NO_MANIFEST_COMMANDS = ['cache', 'config', 'init', 'topdir']
+
 if __name__ == "__main__":
     main()
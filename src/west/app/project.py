@@ -6,15 +6,22 @@
 '''West project commands'''
 
 import argparse
+import errno
 import hashlib
+import json
 import logging
 import os
 import shlex
 import shutil
+import string
 import subprocess
 import sys
 import textwrap
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from functools import partial
 from os.path import abspath, basename, relpath
 from pathlib import Path, PurePath
@@ -33,11 +40,19 @@ from west.manifest import (
     ManifestImportFailed,
     ManifestProject,
     Submodule,
+    _git_call_done,
+    _git_thread_state,
     _manifest_content_at,
+    _RefsUnsupported,
 )
 from west.manifest import is_group as is_project_group
 from west.util import expand_path
 
+if sys.platform == 'win32':
+    import msvcrt
+else:
+    import fcntl
+
 #
 # Project-related or multi-repo commands, like "init", "update",
 # "diff", etc.
@@ -107,6 +122,46 @@ class _ProjectCommand(WestCommand):
             self.err(f'{self.name} failed for multiple projects; see above')
         raise CommandError(1)
 
+    def _add_jobs_arg(self, parser, help, default='a number based on the CPU count'):
+        # Add the -j/--jobs option read by _jobs() to 'parser'. The
+        # 'help' text says what is done with N projects at once, and
+        # 'default' describes the default passed to _jobs().
+        parser.add_argument(
+            '-j',
+            '--jobs',
+            type=int,
+            metavar='N',
+            help=f'''{help} (default: {self.name}.jobs config
+                     option, or {default})''',
+        )
+
+    def _jobs(self, args, default=1):
+        # Get the number of projects to work on at once: the -j/--jobs
+        # command line option if given, then the '<command>.jobs'
+        # configuration option, then the default.
+
+        if args.jobs is not None:
+            jobs = args.jobs
+        else:
+            jobs = self.config.getint(f'{self.name}.jobs', default=default)
+        if jobs < 1:
+            self.die(f'invalid number of jobs {jobs}: must be at least 1')
+        return jobs
+
+    def _selected_projects(self, args, only_active=True):
+        # Like _cloned_projects(args, only_active=only_active), but
+        # checking which projects are cloned takes a git command per
+        # project, so unless projects were given explicitly, that's
+        # left to each project's job. Sets self.check_cloned to True
+        # if the returned projects may include uncloned ones.
+
+        if args.projects:
+            self.check_cloned = False
+            return self._cloned_projects(args, only_active=only_active)
+
+        self.check_cloned = True
+        return [p for p in self.manifest.projects if not only_active or self.manifest.is_active(p)]
+
     def _die_unknown(self, unknown):
         # Scream and die about unknown projects.
 
@@ -121,55 +176,254 @@ class _ProjectCommand(WestCommand):
         # Check if the project has any status output to print. We
         # manually use Popen in order to try to exit as quickly as
         # possible if 'git status' prints anything.
-
-        popen = subprocess.Popen(
-            ['git', 'status', '--porcelain'],
+        #
+        # 'git status --porcelain' prints nothing if there are no
+        # notable changes, so any output at all (including errors)
+        # means we should run 'git status' on the project. Block until
+        # the first byte arrives or git exits without printing
+        # anything, whichever happens first.
+
+        args = ['git', 'status', '--porcelain']
+        start = perf_counter()
+        with subprocess.Popen(
+            args,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
             cwd=project.abspath,
+        ) as popen:
+            output = popen.stdout.read(1)
+            if output:
+                popen.kill()
+        _git_call_done(
+            args, project.abspath, perf_counter() - start, popen.returncode, len(output), None
         )
+        return bool(output)
+
+    def _derived_values(self, project, keys):
+        # Compute the values of derived format keys which need git,
+        # for passing to _format_project() as 'values'. This lets
+        # callers compute them for many projects at once on a
+        # _ProjectJobs, instead of one at a time while formatting.
+        #
+        # 'keys' is the set of format keys that will be used. Errors
+        # for values which can't be computed, like the SHA of an
+        # uncloned project, are left to _format_project().
+        values = {}
+        if 'cloned' in keys or 'sha' in keys:
+            values['cloned'] = project.is_cloned()
+        if 'sha' in keys and values['cloned'] and not isinstance(project, ManifestProject):
+            values['sha'] = project.sha(QUAL_MANIFEST_REV)
+        return values
+
+    def _fetch_strategy(self, args):
+        cfg = self.config.get('update.fetch')
+        if cfg is not None and cfg not in ('always', 'smart'):
+            self.wrn(f'ignoring invalid config update.fetch={cfg}; choices: always, smart')
+            cfg = None
+        if args.fetch_strategy:
+            return args.fetch_strategy
+        elif cfg:
+            return cfg
+        else:
+            return 'smart'
+
+    def _auto_cache_dir(self, auto_cache, project):
+        # Get the location of the project within the auto-cache
+        # directory 'auto_cache'.
+        # Note: The url is hashed and used as a subfolder to accomodate
+        # changes in the manifest.
+        subdir_hash = hashlib.md5(project.url.encode('utf-8')).hexdigest()
+        return os.fspath(expand_path(auto_cache) / basename(project.url) / subdir_hash)
+
+    def _auto_cache_ttl(self):
+        # Get the update.auto-cache-ttl configuration option: how many
+        # seconds an auto-cache repository stays fresh after a fetch.
+        try:
+            ttl = self.config.getfloat('update.auto-cache-ttl', default=0.0)
+        except ValueError:
+            ttl = -1.0
+        if ttl < 0:
+            cfg = self.config.get('update.auto-cache-ttl')
+            self.wrn(f'ignoring invalid config update.auto-cache-ttl={cfg}; must be seconds >= 0')
+            ttl = 0.0
+        return ttl
+
+    def _auto_cache_wrn(self, kind, msg):
+        # Warn about a problem with a cache repository which doesn't
+        # stop us from using it, like a read-only shared cache. It's
+        # usually the same for every project, so only warn once per
+        # run about each kind of problem.
+        with _AUTO_CACHE_WRN_LOCK:
+            warned = self.__dict__.setdefault('_auto_cache_warned', set())
+            if kind in warned:
+                return
+            warned.add(kind)
+        self.wrn(msg)
+
+    def _check_auto_cache_lock(self, lock, cache_dir):
+        # Warn if an _AutoCacheLock only keeps other threads out.
+        if lock.error is not None:
+            self._auto_cache_wrn(
+                'lock', f'cannot lock {cache_dir}, continuing without the lock: {lock.error}'
+            )
+
+    def _record_auto_cache_info(self, cache_dir, info):
+        # _write_auto_cache_info(), for bookkeeping which mustn't stop
+        # the cache from being used. Only "west cache gc" relies on it.
+        try:
+            _write_auto_cache_info(cache_dir, info)
+        except OSError as e:
+            self._auto_cache_wrn('info', f'cannot update {cache_dir}.info: {e}')
+
+    def _sync_cache(self, project, cache_dir, fetch_strategy, ttl=0.0, auto_cache=True):
+        # Shared between "west update --auto-cache" and "west cache
+        # prefetch". Create the local cache repository 'cache_dir' for
+        # the project if it doesn't exist yet. Otherwise, sync it with
+        # the remote unless the fetch strategy says it's not needed,
+        # or it was fetched less than 'ttl' seconds ago.
+        #
+        # If 'auto_cache' is true, 'cache_dir' is in the auto-cache,
+        # and its .info file is read and updated too. That's where the
+        # last fetch is recorded for the 'ttl' check; name caches have
+        # no .info file, so 'ttl' doesn't apply to them.
+
+        # Ensure that the cache's parent directory exists before
+        # locking or cloning anything.
+        Path(cache_dir).parent.mkdir(parents=True, exist_ok=True)
+
+        # The cache may be shared by other west processes and other
+        # threads in this one, so only one of them may clone or fetch
+        # into it at a time. If someone else fetched into it while we
+        # were waiting for the lock, their fetch is as good as ours
+        # would have been.
+        requested = time.time()
+        with _AutoCacheLock(cache_dir) as lock:
+            self._check_auto_cache_lock(lock, cache_dir)
+            info = _read_auto_cache_info(cache_dir) if auto_cache else {}
+            fetched = self._sync_cache_locked(
+                project, cache_dir, fetch_strategy, ttl, info, lock, requested
+            )
+            if not auto_cache:
+                return
 
-        def has_output():
-            # 'git status --porcelain' prints nothing if there
-            # are no notable changes, so any output at all
-            # means we should run 'git status' on the project.
-            stdout, stderr = None, None
+            # Update the informal .info file, including when the cache
+            # was last used (for "west cache gc") and fetched into.
+            now = datetime.now(timezone.utc)
+            info['Local Cache'] = basename(cache_dir)
+            info['Project Url'] = project.url
+            info['Last Used'] = now.isoformat(timespec='seconds')
+            if fetched:
+                info['Last Fetched'] = now.isoformat(timespec='microseconds')
+            self._record_auto_cache_info(cache_dir, info)
+
+    def _sync_cache_locked(self, project, cache_dir, fetch_strategy, ttl, info, lock, requested):
+        # _sync_cache() helper. Clone or fetch into the cache
+        # repository, while holding its lock, if necessary. Returns
+        # True if it did.
+
+        if not Path(cache_dir).exists():
+            # The cache has not been created yet at the expected location.
+            # Clone the repository into a temporary directory and move it
+            # into place once it's complete, so nobody can see a partial
+            # clone. A leftover temporary directory is from a clone that
+            # was interrupted while holding the lock, so it's garbage.
+            partial = cache_dir + '.partial'
+            if os.path.exists(partial):
+                self.dbg(f'{project.name}: removing stale {partial}')
+                shutil.rmtree(partial)
+            self.dbg(f'{project.name}: create auto-cache for {project.url} in {cache_dir}')
             try:
-                stdout, stderr = popen.communicate(timeout=0.1)
-            except subprocess.TimeoutExpired:
-                pass
-            return stdout or stderr
+                project.git(
+                    ['clone', '--mirror', '--', project.url, partial],
+                    cwd=Path(cache_dir).parent,
+                )
+                os.rename(partial, cache_dir)
+            finally:
+                shutil.rmtree(partial, ignore_errors=True)
+            lock.mark_fetched()
+            return True
+
+        # check if the remote update can be skipped
+        rev_type = None
+        if fetch_strategy != 'always' or ttl:
+            # Determine the type of the project revision by checking if it is
+            # already contained in the auto-cache.
+            rev_type = _rev_type(project, cwd=cache_dir)
+        if fetch_strategy != 'always' and rev_type in ('tag', 'commit'):
+            # If it is an already available tag or a commit, the remote
+            # update can be skipped. Otherwise the auto-cache must be updated.
+            self.dbg(
+                f'{project.name}: auto-cache remote update is skipped '
+                f'as it already contains {rev_type} {project.revision}'
+            )
+            return False
 
-        while True:
-            if has_output():
-                popen.kill()
-                return True
-            if popen.poll() is not None:
-                break
+        last_fetched = lock.last_fetched()
+        if last_fetched is not None and last_fetched >= requested:
+            self.dbg(
+                f'{project.name}: auto-cache remote update is skipped '
+                'as it was updated while waiting for it'
+            )
+            return False
+
+        # A branch, or with --fetch=always any revision, that is already
+        # in the auto-cache is good enough if the last fetch is recent.
+        # Revisions missing from it are always fetched.
+        last_fetched = _auto_cache_info_time(info, 'Last Fetched')
+        if (
+            rev_type in ('branch', 'tag', 'commit')
+            and last_fetched is not None
+            and requested - last_fetched < ttl
+        ):
+            self.dbg(
+                f'{project.name}: auto-cache remote update is skipped '
+                f'as it was updated {requested - last_fetched:.0f} seconds ago '
+                f'(update.auto-cache-ttl is {ttl:g})'
+            )
+            return False
 
-        return has_output()
+        # The auto-cache needs to be updated. Sync with remote.
+        self.dbg(f'{project.name}: update auto-cache ({cache_dir}) with remote')
+        cp = project.git(['remote', 'update', '--prune'], cwd=cache_dir, check=False)
+        if cp.returncode:
+            return False
+        lock.mark_fetched()
+        return True
 
-    def _format_project(self, project, fmt, *, manifest_path_from_yaml=False):
+    def _format_project(self, project, fmt, *, manifest_path_from_yaml=False, values=None):
         # Shared between 'west list --format' and 'west compare --format'.
         # Does not catch subprocess.CalledProcessError; callers decide
         # whether such failures are fatal.
+        #
+        # If given, 'values' holds precomputed values from
+        # _derived_values().
+        if values is None:
+            values = {}
+
+        def is_cloned(project):
+            if 'cloned' in values:
+                return values['cloned']
+            return project.is_cloned()
+
         def sha_thunk(project):
             self.die_if_no_git()
 
-            if not project.is_cloned():
+            if not is_cloned(project):
                 self.die(
                     f'cannot get sha for uncloned project {project.name}; '
                     f'run "west update {project.name}" and retry'
                 )
             elif isinstance(project, ManifestProject):
                 return f'{"N/A":40}'
+            elif 'sha' in values:
+                return values['sha']
             else:
-                return project.sha(MANIFEST_REV)
+                return project.sha(QUAL_MANIFEST_REV)
 
         def cloned_thunk(project):
             self.die_if_no_git()
 
-            return "cloned" if project.is_cloned() else "not-cloned"
+            return "cloned" if is_cloned(project) else "not-cloned"
 
         def active_thunk(project):
             self.die_if_no_git()
@@ -616,6 +870,12 @@ The following arguments are available:
             help='''format string to use to list each
                     project; see FORMAT STRINGS below.''',
         )
+        self._add_jobs_arg(
+            parser,
+            '''if the format string uses keys which need
+               git, like {sha} or {cloned}, compute them for up to
+               N projects at once''',
+        )
 
         parser.add_argument(
             'projects',
@@ -631,6 +891,7 @@ The following arguments are available:
         if args.inactive and args.projects:
             self.parser.error('-i cannot be combined with an explicit project list')
 
+        projects = []
         for project in self._projects(args.projects):
             # Include the project based on the inactive flag. If the flag is
             # set, include only inactive projects. Otherwise, include only
@@ -641,15 +902,28 @@ The following arguments are available:
             if not (args.all or args.projects or include):
                 self.dbg(f'{project.name}: skipping project')
                 continue
+            projects.append(project)
 
-            try:
-                self._format_project(
-                    project,
-                    args.format,
-                    manifest_path_from_yaml=args.manifest_path_from_yaml,
-                )
-            except subprocess.CalledProcessError:
-                self.die(f'subprocess failed while listing {project.name}')
+        # If the format string needs git, run it for all projects
+        # up front, several at a time, then print the results in order.
+        keys = _format_keys(args.format)
+        if {'cloned', 'sha'} & keys:
+            self.die_if_no_git()
+            jobs = self._jobs(args, default=_default_jobs())
+        else:
+            jobs = 1
+
+        with _ProjectJobs(jobs) as project_jobs:
+            for job in project_jobs.map(partial(self._derived_values, keys=keys), projects):
+                try:
+                    self._format_project(
+                        job.project,
+                        args.format,
+                        manifest_path_from_yaml=args.manifest_path_from_yaml,
+                        values=job.result(),
+                    )
+                except subprocess.CalledProcessError:
+                    self.die(f'subprocess failed while listing {job.project.name}')
 
 
 class ManifestCommand(_ProjectCommand):
@@ -923,6 +1197,11 @@ PowerShell:
                     using this format string (stable, machine-readable
                     output); see FORMAT STRINGS below''',
         )
+        self._add_jobs_arg(
+            parser,
+            '''check up to N projects at once; output is
+               still printed in manifest order''',
+        )
         return parser
 
     def do_run(self, args, ignored):
@@ -936,28 +1215,38 @@ PowerShell:
         else:
             self.ignore_branches = self.config.getboolean('compare.ignore-branches', False)
 
+        self.format = args.format
+
+        projects = self._selected_projects(args, only_active=not args.all)
+
         failed = []
         printed_output = False
+        with _ProjectJobs(self._jobs(args, default=_default_jobs())) as jobs:
+            for job in jobs.map(self.compare_project, projects):
+                try:
+                    if job.result():
+                        printed_output = True
+                except subprocess.CalledProcessError:
+                    failed.append(job.project)
+        self._handle_failed(args, failed)
 
-        def compare_project(project, fmt):
-            if fmt is None:
-                self.compare(project)
-            else:
-                self._format_project(project, fmt)
+        if args.exit_code and printed_output:
+            raise CommandError(1)
 
-        for project in self._cloned_projects(args, only_active=not args.all):
-            if isinstance(project, ManifestProject):
-                # West doesn't track the relationship between the manifest
-                # repository and any remote, but users are still interested
-                # in printing output for comparisons that makes sense.
-                if self._has_nonempty_status(project):
-                    try:
-                        compare_project(project, args.format)
-                        printed_output = True
-                    except subprocess.CalledProcessError:
-                        failed.append(project)
-                continue
+    def compare_project(self, project):
+        # Print output for a project if it needs any. Returns True if
+        # output was printed.
 
+        if self.check_cloned and not project.is_cloned():
+            return False
+
+        if isinstance(project, ManifestProject):
+            # West doesn't track the relationship between the manifest
+            # repository and any remote, but users are still interested
+            # in printing output for comparisons that makes sense.
+            if not self._has_nonempty_status(project):
+                return False
+        elif not (self.verbosity >= Verbosity.DBG or self.differs_from_manifest_rev(project)):
             # 'git status' output for all projects is noisy when there
             # are lots of projects.
             #
@@ -970,34 +1259,74 @@ PowerShell:
             #      skip output for the project entirely.
             #
             # In verbose mode, we always print output.
+            return False
 
-            def has_checked_out_branch(project):
-                if self.ignore_branches:
-                    return False
+        if self.format is None:
+            self.compare(project)
+        else:
+            self._format_project(project, self.format)
+        return True
 
-                return bool(
-                    project.git(
-                        ['branch', '--show-current'], capture_stdout=True, capture_stderr=True
-                    ).stdout.strip()
+    def differs_from_manifest_rev(self, project):
+        # Check if a non-manifest project has a checked out branch,
+        # a HEAD that's different than manifest-rev, or nonempty
+        # status.
+        #
+        # Usually, HEAD and manifest-rev can be read without running
+        # git, so only 'git status --porcelain' is needed.
+        try:
+            branch, head = project._head_fast()
+            manifest_rev = project._read_ref_fast(QUAL_MANIFEST_REV)
+        except _RefsUnsupported:
+            return self.differs_from_manifest_rev_git(project)
+
+        if not self.ignore_branches and branch is not None:
+            # This includes unborn branches.
+            return True
+        if head is None or manifest_rev is None:
+            # Let git report the error.
+            return self.differs_from_manifest_rev_git(project)
+        return manifest_rev != head or self._has_nonempty_status(project)
+
+    def differs_from_manifest_rev_git(self, project):
+        # differs_from_manifest_rev(), running git. A single 'git
+        # rev-parse' gets manifest-rev, HEAD, and the name of the
+        # checked out branch, if any ('HEAD' if detached).
+        try:
+            manifest_rev, head, head_ref = (
+                project.git(
+                    [
+                        'rev-parse',
+                        f'{QUAL_MANIFEST_REV}^{{commit}}',
+                        'HEAD^{commit}',
+                        '--symbolic-full-name',
+                        'HEAD',
+                    ],
+                    capture_stdout=True,
+                    capture_stderr=True,
                 )
+                .stdout.decode('utf-8')
+                .split()
+            )
+        except subprocess.CalledProcessError:
+            # A checked out branch still counts as a difference if
+            # manifest-rev is missing or the branch is unborn.
+            if not self.ignore_branches and self.has_checked_out_branch(project):
+                return True
+            raise
 
-            try:
-                if not (
-                    self.verbosity >= Verbosity.DBG
-                    or has_checked_out_branch(project)
-                    or (project.sha(QUAL_MANIFEST_REV) != project.sha('HEAD'))
-                    or self._has_nonempty_status(project)
-                ):
-                    continue
-
-                compare_project(project, args.format)
-                printed_output = True
-            except subprocess.CalledProcessError:
-                failed.append(project)
-        self._handle_failed(args, failed)
+        return (
+            (not self.ignore_branches and head_ref != 'HEAD')
+            or manifest_rev != head
+            or self._has_nonempty_status(project)
+        )
 
-        if args.exit_code and printed_output:
-            raise CommandError(1)
+    def has_checked_out_branch(self, project):
+        return bool(
+            project.git(
+                ['branch', '--show-current'], capture_stdout=True, capture_stderr=True
+            ).stdout.strip()
+        )
 
     def compare(self, project):
         self.banner(f'{project.name_and_path}:')
@@ -1075,60 +1404,85 @@ class Diff(_ProjectCommand):
         parser.add_argument(
             '-m', '--manifest', action='store_true', help='show changes relative to "manifest-rev"'
         )
+        self._add_jobs_arg(
+            parser,
+            '''diff up to N projects at once; output is
+               still printed in manifest order''',
+        )
         return parser
 
     def do_run(self, args, user_args):
         self.die_if_no_git()
+        self.args = args
+        self.user_args = user_args
+
+        projects = self._selected_projects(args, only_active=not args.all)
 
         failed = []
         no_diff = 0
-        # We may need to force git to use colors if the user wants them,
-        # which it won't do ordinarily since stdout is not a terminal.
-        color = ['--color=always'] if self.color_ui else []
-        for project in self._cloned_projects(args, only_active=not args.all):
-            diff_commit = (
-                ['manifest-rev']  # see #719 and #747
-                # Special-case the manifest repository while it's
-                # still showing up in the 'projects' list. Yet
-                # more evidence we should tackle #327.
-                if args.manifest and not isinstance(project, ManifestProject)
-                else []
-            )
-            # Use paths that are relative to the base directory to make it
-            # easier to see where the changes are
-            cp = project.git(
-                [
-                    'diff',
-                    f'--src-prefix={project.path}/',
-                    f'--dst-prefix={project.path}/',
-                    '--exit-code',
-                ]
-                + color
-                + diff_commit,
-                extra_args=user_args,
-                capture_stdout=True,
-                capture_stderr=True,
-                check=False,
-            )
+        # Each project's diff is printed as soon as it and all the
+        # projects before it are done. _ProjectJobs.map() only runs a
+        # few jobs ahead of the one being printed, so we only hold a
+        # bounded number of diffs in memory at once.
+        with _ProjectJobs(self._jobs(args, default=_default_jobs())) as jobs:
+            for job in jobs.map(self.diff, projects):
+                project, cp = job.project, job.result()
+                if cp is None:
+                    continue
 
-            # We cannot trust --exit-code alone, for instance merge
-            # conflicts return 0 with (at least) git version 2.46.0. See
-            # west issue #731
-            some_diff = cp.returncode == 1 or (cp.returncode == 0 and len(cp.stdout) > 0)
-            if not some_diff:
-                no_diff += 1
-            if some_diff or self.verbosity >= Verbosity.DBG:
-                self.banner(f'diff for {project.name_and_path}:')
-                self.inf(cp.stdout.decode('utf-8'))
-                self.inf(cp.stderr.decode('utf-8'))
-            if cp.returncode > 1:
-                failed.append(project)
+                # We cannot trust --exit-code alone, for instance merge
+                # conflicts return 0 with (at least) git version 2.46.0. See
+                # west issue #731
+                some_diff = cp.returncode == 1 or (cp.returncode == 0 and len(cp.stdout) > 0)
+                if not some_diff:
+                    no_diff += 1
+                if some_diff or self.verbosity >= Verbosity.DBG:
+                    self.banner(f'diff for {project.name_and_path}:')
+                    self.inf(cp.stdout.decode('utf-8'))
+                    self.inf(cp.stderr.decode('utf-8'))
+                if cp.returncode > 1:
+                    failed.append(project)
 
         if failed:
             self._handle_failed(args, failed)
         elif self.verbosity <= Verbosity.INF:
             self.inf(f"Empty diff in {no_diff} projects.")
 
+    def diff(self, project):
+        # Run 'git diff' in a project and return the CompletedProcess,
+        # or None if the project isn't cloned.
+
+        if self.check_cloned and not project.is_cloned():
+            return None
+
+        # We may need to force git to use colors if the user wants them,
+        # which it won't do ordinarily since stdout is not a terminal.
+        color = ['--color=always'] if self.color_ui else []
+        diff_commit = (
+            ['manifest-rev']  # see #719 and #747
+            # Special-case the manifest repository while it's
+            # still showing up in the 'projects' list. Yet
+            # more evidence we should tackle #327.
+            if self.args.manifest and not isinstance(project, ManifestProject)
+            else []
+        )
+        # Use paths that are relative to the base directory to make it
+        # easier to see where the changes are
+        return project.git(
+            [
+                'diff',
+                f'--src-prefix={project.path}/',
+                f'--dst-prefix={project.path}/',
+                '--exit-code',
+            ]
+            + color
+            + diff_commit,
+            extra_args=self.user_args,
+            capture_stdout=True,
+            capture_stderr=True,
+            check=False,
+        )
+
 
 class Status(_ProjectCommand):
     def __init__(self):
@@ -1154,35 +1508,82 @@ class Status(_ProjectCommand):
         parser.add_argument(
             '-a', '--all', action='store_true', help='include output for inactive projects'
         )
+        self._add_jobs_arg(
+            parser,
+            '''check up to N projects at once; output is
+               still printed in manifest order''',
+        )
         return parser
 
     def do_run(self, args, user_args):
         self.die_if_no_git()
+        self.user_args = user_args
+
+        projects = self._selected_projects(args, only_active=not args.all)
 
         failed = []
-        for project in self._cloned_projects(args, only_active=not args.all):
-            # 'git status' output for all projects is noisy when there
-            # are lots of projects.
-            #
-            # We avoid this problem in 2 steps:
-            #
-            #   1. Check if we need to print any output for the
-            #      project.
-            #
-            #   2. If so, run 'git status' on the project. Otherwise,
-            #      skip output for the project entirely.
-            #
-            # In verbose mode, we always print output.
+        with _ProjectJobs(self._jobs(args, default=_default_jobs())) as jobs:
+            for job in jobs.map(self.status, projects):
+                try:
+                    job.result()
+                except subprocess.CalledProcessError:
+                    failed.append(job.project)
+        self._handle_failed(args, failed)
 
-            try:
-                if not (self.verbosity >= Verbosity.DBG or self._has_nonempty_status(project)):
-                    continue
+    def status(self, project):
+        # Print 'git status' output for a project, if there is any.
 
-                self.banner(f'status of {project.name_and_path}:')
-                project.git('status', extra_args=user_args)
-            except subprocess.CalledProcessError:
-                failed.append(project)
-        self._handle_failed(args, failed)
+        if self.check_cloned and not project.is_cloned():
+            return
+
+        # 'git status' output for all projects is noisy when there
+        # are lots of projects.
+        #
+        # We avoid this problem in 2 steps:
+        #
+        #   1. Check if we need to print any output for the
+        #      project.
+        #
+        #   2. If so, run 'git status' on the project. Otherwise,
+        #      skip output for the project entirely.
+        #
+        # In verbose mode, we always print output.
+
+        if not (self.verbosity >= Verbosity.DBG or self._has_nonempty_status(project)):
+            return
+
+        # When several jobs run at once, git's output goes to a pipe,
+        # so force colors if git would have used them on the terminal.
+        if (
+            getattr(_git_thread_state, 'buffer_output', False)
+            and self.color_ui
+            and sys.stdout.isatty()
+            and self.git_colors_status_auto(project)
+        ):
+            color = '-c color.status=always'
+        else:
+            color = ''
+        self.banner(f'status of {project.name_and_path}:')
+        project.git(f'{color} status', extra_args=self.user_args)
+
+    def git_colors_status_auto(self, project):
+        # Check if the user's git configuration leaves coloring 'git
+        # status' output up to git, which colors it on terminals. That's
+        # the case if color.status, or else color.ui, is unset, 'auto',
+        # or true (which means 'auto' for these options).
+        cp = project.git(
+            ['config', '--get-regexp', r'^color\.(status|ui)$'],
+            check=False,
+            capture_stdout=True,
+            capture_stderr=True,
+        )
+        values = {}
+        for line in cp.stdout.decode('utf-8', errors='replace').splitlines():
+            key, _, value = line.partition(' ')
+            # A key without a value is true.
+            values[key] = value or 'true'
+        value = values.get('color.status', values.get('color.ui', 'auto'))
+        return value.lower() in ('auto', 'true', 'yes', 'on', '1')
 
 
 class Update(_ProjectCommand):
@@ -1203,6 +1604,12 @@ class Update(_ProjectCommand):
 
             You must have already created a west workspace with "west init".
 
+            Projects whose revisions are SHAs, and which are still exactly
+            as the last "west update" left them, are skipped without running
+            git, unless fetching is forced with "--fetch always". Set the
+            update.skip-unchanged configuration option to false to always
+            update every project.
+
             This command does not alter the manifest repository's contents.'''),
         )
 
@@ -1215,6 +1622,26 @@ class Update(_ProjectCommand):
             help='''print performance statistics for
                             update operations''',
         )
+        parser.add_argument(
+            '--stats-format',
+            choices=['text', 'json'],
+            help='''format for --stats, which this implies: "text"
+                    (the default) for per-project statistics, or "json"
+                    for one JSON document with per-project and
+                    aggregate statistics at the end''',
+        )
+        parser.add_argument(
+            '--stats-file',
+            metavar='PATH',
+            help='''write the JSON statistics to PATH instead of
+                    (or as well as, with --stats) printing them''',
+        )
+        self._add_jobs_arg(
+            parser,
+            '''update up to N projects at once; output
+               from each project is printed when it is done''',
+            default='1',
+        )
 
         group = parser.add_argument_group(
             title='local project clone caches',
@@ -1266,6 +1693,25 @@ class Update(_ProjectCommand):
         caches first, which then serve as the source for pulling changes into
         the workspace. Thereby, the auto-cache only fetches updates from remote
         if the specified revision is not already present in the local cache.
+        By default, projects cloned from the auto-cache get their own copies
+        of its git objects. Set the update.cache-mode configuration option to
+        "alternates" to make them borrow the auto-cache's objects instead,
+        using git's objects/info/alternates mechanism ("git clone --shared").
+        This saves disk space and time when many workspaces share one
+        auto-cache, but those workspaces then need the auto-cache to keep
+        working, so it must not be deleted or moved.
+        An auto-cache may be shared by several workspaces on the same host,
+        even when they are updated at the same time: each local cache is
+        locked while it is cloned or synced, and a sync that finished while
+        waiting for the lock is not repeated. Branch revisions (and every
+        revision with --fetch=always) make the auto-cache sync with remote on
+        each update. Set the update.auto-cache-ttl configuration option to a
+        number of seconds to skip the sync if the local cache was synced less
+        than that long ago, e.g. by an update in another workspace. The time of
+        the last sync is kept in the local cache's .info file. Revisions
+        which are not in the local cache yet are always fetched.
+        See "west cache -h" for how to fill caches ahead of time and limit
+        their size.
 
         Example: Assume your manifest describes this workspace structure:
           (workspace)
@@ -1405,10 +1851,30 @@ class Update(_ProjectCommand):
         # We can't blindly call self._projects() here: manifests with
         # imports are limited to plain 'west update', and cannot use
         # 'west update PROJECT [...]'.
-        if not self.args.projects:
-            self.update_all()
-        else:
-            self.update_some()
+        try:
+            if not self.args.projects:
+                self.update_all()
+            else:
+                self.update_some()
+        finally:
+            if self.state is not None:
+                self.state.save()
+            if self.update_stats is not None:
+                self.report_stats()
+
+    def report_stats(self):
+        # Print and/or save the JSON statistics, if requested.
+
+        stats = self.update_stats.as_dict()
+        if self.stats_format == 'json':
+            self.inf(json.dumps(stats, indent=2), colorize=False)
+        if self.args.stats_file:
+            try:
+                with open(self.args.stats_file, 'w', encoding='utf-8') as f:
+                    json.dump(stats, f, indent=2)
+                    f.write('\n')
+            except OSError as e:
+                self.err(f"can't write statistics to {self.args.stats_file}: {e}")
 
     def init_state(self, args):
         # Helper for initializing instance state in response to
@@ -1418,12 +1884,26 @@ class Update(_ProjectCommand):
         if args.exclude_west:
             self.wrn('ignoring --exclude-west')
 
+        if args.stats or args.stats_format:
+            self.stats_format = args.stats_format or 'text'
+        else:
+            self.stats_format = None
+        if self.stats_format or args.stats_file:
+            self.update_stats = _UpdateStats()
+        else:
+            self.update_stats = None
+
         config = self.config
         self.narrow = args.narrow or config.getboolean('update.narrow')
         self.path_cache = args.path_cache or config.get('update.path-cache')
         self.name_cache = args.name_cache or config.get('update.name-cache')
         self.auto_cache = args.auto_cache or config.get('update.auto-cache')
         self.sync_submodules = config.getboolean('update.sync-submodules', default=True)
+        self.jobs = self._jobs(args)
+        if config.getboolean('update.skip-unchanged', default=True):
+            self.state = _UpdateState(self.topdir)
+        else:
+            self.state = None
 
         self.group_filter: List[str] = []
 
@@ -1444,7 +1924,9 @@ class Update(_ProjectCommand):
             else:
                 handle(item)
 
-        self.fs = self.fetch_strategy()
+        self.fs = self._fetch_strategy(args)
+        self.cache_mode = self.get_cache_mode()
+        self.auto_cache_ttl = self._auto_cache_ttl()
 
     def update_all(self):
         # Plain 'west update' is the 'easy' case: since the user just
@@ -1456,24 +1938,39 @@ class Update(_ProjectCommand):
         # call our importer whenever it encounters an import statement
         # in a project, allowing us to control the recursion so it
         # always uses the latest manifest data.
+        #
+        # With multiple jobs, projects with imports are updated
+        # concurrently as well: the importer's prefetch_imports() starts
+        # updating all the projects in a manifest file's "projects:"
+        # which have imports at once, and update_importer() just waits
+        # for each one's results. Each imported manifest's own imports
+        # are started as soon as its project is done, so only the import
+        # depth is serialized, not the number of projects with imports.
         self.updated = set()
+        self.import_jobs = {}
 
-        self.manifest = Manifest.from_file(
-            importer=self.update_importer, import_flags=ImportFlag.FORCE_PROJECTS
-        )
-
-        failed = []
-        for project in self.manifest.projects:
-            if isinstance(project, ManifestProject) or project.name in self.updated:
-                continue
-            try:
+        def to_update():
+            for project in self.manifest.projects:
+                if isinstance(project, ManifestProject) or project.name in self.updated:
+                    continue
                 if not self.project_is_active(project):
                     self.dbg(f'{project.name}: skipping inactive project')
                     continue
-                self.update(project)
-                self.updated.add(project.name)
-            except subprocess.CalledProcessError:
-                failed.append(project)
+                yield project
+
+        failed = []
+        with _ProjectJobs(self.jobs) as jobs:
+            self.pool = jobs
+            self.manifest = Manifest.from_file(
+                importer=_UpdateImporter(self), import_flags=ImportFlag.FORCE_PROJECTS
+            )
+
+            for job in jobs.map(self.update, to_update()):
+                try:
+                    job.result()
+                    self.updated.add(job.project.name)
+                except subprocess.CalledProcessError:
+                    failed.append(job.project)
         self._handle_failed(self.args, failed)
 
     def update_importer(self, project, path):
@@ -1489,7 +1986,11 @@ class Update(_ProjectCommand):
             # to specify in this case.
             assert not project.groups
 
-            self.update(project)
+            job = self.import_jobs.pop(project.name, None)
+            if job is not None:
+                job.result()
+            else:
+                self.update(project)
         self.updated.add(project.name)
 
         try:
@@ -1514,6 +2015,19 @@ class Update(_ProjectCommand):
                 '          - remove the "import:"' + suggest_vvv
             )
 
+    def prefetch_imports(self, projects):
+        # Start updating projects whose imports are about to be resolved
+        # while creating a Manifest in update_all(). With a single job,
+        # do nothing: updating each one when update_importer() is called
+        # keeps things in the usual order.
+
+        if self.jobs == 1:
+            return
+        for project in projects:
+            if project.name in self.updated or project.name in self.import_jobs:
+                continue
+            self.import_jobs[project.name] = self.pool.submit(self.update, project)
+
     def update_some(self):
         # The 'west update PROJECT [...]' style invocation is only
         # implemented for projects defined within the manifest
@@ -1535,13 +2049,14 @@ class Update(_ProjectCommand):
             projects = self._projects(self.args.projects)
 
         failed = []
-        for project in projects:
-            if isinstance(project, ManifestProject):
-                continue
-            try:
-                self.update(project)
-            except subprocess.CalledProcessError:
-                failed.append(project)
+        with _ProjectJobs(self.jobs) as jobs:
+            for job in jobs.map(
+                self.update, [p for p in projects if not isinstance(p, ManifestProject)]
+            ):
+                try:
+                    job.result()
+                except subprocess.CalledProcessError:
+                    failed.append(job.project)
         self._handle_failed(self.args, failed)
 
     def toplevel_projects(self):
@@ -1583,17 +2098,12 @@ class Update(_ProjectCommand):
                 '  Only plain "west update" can currently update them.'
             )
 
-    def fetch_strategy(self):
-        cfg = self.config.get('update.fetch')
-        if cfg is not None and cfg not in ('always', 'smart'):
-            self.wrn(f'ignoring invalid config update.fetch={cfg}; choices: always, smart')
+    def get_cache_mode(self):
+        cfg = self.config.get('update.cache-mode')
+        if cfg is not None and cfg not in ('clone', 'alternates'):
+            self.wrn(f'ignoring invalid config update.cache-mode={cfg}; choices: clone, alternates')
             cfg = None
-        if self.args.fetch_strategy:
-            return self.args.fetch_strategy
-        elif cfg:
-            return cfg
-        else:
-            return 'smart'
+        return cfg or 'clone'
 
     def update_submodules(self, project):
         # Updates given project submodules by using
@@ -1655,8 +2165,8 @@ class Update(_ProjectCommand):
             )
 
     def update(self, project):
-        if self.args.stats:
-            stats = dict()
+        if self.update_stats is not None:
+            stats = {}
             update_start = perf_counter()
         else:
             stats = None
@@ -1664,6 +2174,19 @@ class Update(_ProjectCommand):
 
         self.banner(f'updating {project.name_and_path}:')
 
+        if take_stats:
+            start = perf_counter()
+        unchanged = self.is_unchanged(project)
+        if take_stats:
+            stats['check if unchanged'] = perf_counter() - start
+        if unchanged:
+            self.dbg(f'{project.name}: unchanged since the last update; nothing to do')
+            if take_stats:
+                self.add_stats(project, stats, update_start)
+            return
+        if self.state is not None:
+            self.state.forget(project)
+
         # Make sure we've got a project to work with.
         self.ensure_cloned(project, stats, take_stats)
 
@@ -1703,7 +2226,7 @@ class Update(_ProjectCommand):
                 start = perf_counter()
             project.git('status')
             if take_stats:
-                stats['get current status'] = perf_counter - start
+                stats['get current status'] = perf_counter() - start
         elif try_rebase:
             # Attempt a rebase.
             self.inf(f'west update: rebasing to {MANIFEST_REV} {sha}')
@@ -1729,16 +2252,83 @@ class Update(_ProjectCommand):
         if take_stats:
             stats['update submodules'] = perf_counter() - start
 
-        # Print performance statistics.
+        self.record_state(project, sha)
+
         if take_stats:
-            update_total = perf_counter() - update_start
-            slop = update_total - sum(stats.values())
-            stats['other work'] = slop
+            self.add_stats(project, stats, update_start)
+
+    def add_stats(self, project, stats, update_start):
+        # update() helper. Finish the project's performance statistics,
+        # print them if asked to, and save them for report_stats().
+
+        update_total = perf_counter() - update_start
+        slop = update_total - sum(stats.values())
+        stats['other work'] = slop
+        self.update_stats.add(project, stats, update_total)
+        if self.stats_format == 'text':
             stats['TOTAL'] = update_total
             self.inf('performance statistics:')
             for stat, value in stats.items():
                 self.inf(f'  {stat}: {value} sec')
 
+    def state_entry(self, project, sha, head):
+        # The self.state entry for a project whose manifest-rev is at
+        # 'sha' and which has 'head' checked out as a detached HEAD.
+        return {
+            'url': project.url,
+            'path': project.path,
+            'revision': project.revision,
+            'manifest-rev': sha,
+            'head': head,
+        }
+
+    def is_unchanged(self, project):
+        # update() helper. Returns True if the last update left the
+        # project in a state which it provably still has, and
+        # updating it again would do nothing.
+        #
+        # That's the case if:
+        #
+        # - its revision is a full SHA, so it can't move, and fetching
+        #   isn't forced
+        # - it has no submodules, whose state we don't track
+        # - its manifest-rev and detached HEAD are both still where
+        #   the last update left them, for the same URL, path, and
+        #   revision
+        #
+        # Checking this only reads files in .west and the project's
+        # .git directory, without running git. If that's not
+        # possible, the project is updated normally.
+
+        if self.state is None or self.fs == 'always' or project.submodules:
+            return False
+        rev = project.revision
+        if not (_maybe_sha(rev) and len(rev) == 40):
+            return False
+        entry = self.state.get(project)
+        if entry is None or entry != self.state_entry(project, rev, rev):
+            return False
+        try:
+            manifest_rev = project._read_ref_fast(QUAL_MANIFEST_REV)
+            head = project._head_fast()
+        except _RefsUnsupported:
+            return False
+        return manifest_rev == rev and head == (None, rev)
+
+    def record_state(self, project, sha):
+        # update() helper. Record the project's state after a
+        # successful update, if is_unchanged() can use it next time.
+
+        rev = project.revision
+        if self.state is None or project.submodules or not (_maybe_sha(rev) and len(rev) == 40):
+            return
+        try:
+            branch, head = project._head_fast()
+        except _RefsUnsupported:
+            return
+        if branch is None:
+            self.state.record(project, self.state_entry(project, sha, head))
+
     def post_checkout_help(self, project, branch, sha, is_ancestor):
         # Print helpful information to the user about a project that
         # might have just left a branch behind.
@@ -1788,17 +2378,6 @@ class Update(_ProjectCommand):
             if take_stats:
                 stats['init'] = perf_counter() - start
 
-    def create_auto_cache_info(self, project, cache_dir):
-        # auto-cache helper: Create some short informal file with basic info
-        # about the local cache folder.
-        content = textwrap.dedent(f"""
-        The following local cache directory was automatically created by west:
-        - Local Cache:  {basename(cache_dir)}
-        - Project Url:  {project.url}
-        """)
-        with open(cache_dir + '.info', 'w') as f:
-            f.write(content)
-
     def handle_auto_cache(self, project):
         # update() helper. Initialize the specified cache directory if it has
         # not been cloned yet. If the cache directory is already existing, it
@@ -1814,35 +2393,7 @@ class Update(_ProjectCommand):
             # another cache was specified with higher priority.
             return
 
-        if not Path(cache_dir).exists():
-            # The cache has not been created yet at the expected location.
-            # Ensure that its parent directory exist before cloning anything.
-            # Then clone the repository into the local cache.
-            cache_dir_parent = Path(cache_dir).parent
-            cache_dir_parent.mkdir(parents=True, exist_ok=True)
-            self.dbg(f'{project.name}: create auto-cache for {project.url} in {cache_dir}')
-            project.git(
-                ['clone', '--mirror', '--', project.url, os.fspath(cache_dir)], cwd=cache_dir_parent
-            )
-            self.create_auto_cache_info(project, cache_dir)
-        else:
-            # check if the remote update can be skipped
-            if self.fs != 'always':
-                # Determine the type of the project revision by checking if it is
-                # already contained in the auto-cache.
-                # If it is an already available tag or a commit, the remote
-                # update can be skipped. Otherwise the auto-cache must be updated.
-                rev_type = _rev_type(project, cwd=cache_dir)
-                if rev_type in ('tag', 'commit'):
-                    self.dbg(
-                        f'{project.name}: auto-cache remote update is skipped '
-                        f'as it already contains {rev_type} {project.revision}'
-                    )
-                    return
-
-            # The auto-cache needs to be updated. Sync with remote.
-            self.dbg(f'{project.name}: update auto-cache ({cache_dir}) with remote')
-            project.git(['remote', 'update', '--prune'], cwd=cache_dir, check=False)
+        self._sync_cache(project, cache_dir, self.fs, ttl=self.auto_cache_ttl)
 
     def init_project(self, project):
         # update() helper. Initialize an uncloned project repository.
@@ -1876,10 +2427,33 @@ class Update(_ProjectCommand):
             # Clone the project from a local cache repository. Set the
             # remote name to the value that would be used without a
             # cache.
-            project.git(
-                ['clone', '--origin', project.remote_name, cache_dir, project.abspath],
-                cwd=self.topdir,
-            )
+            clone_cmd = ['clone', '--origin', project.remote_name]
+            if self.cache_mode == 'alternates' and cache_dir == self.project_auto_cache(project):
+                # Borrow the auto-cache's objects through
+                # objects/info/alternates instead of copying them.
+                # Later fetches are from project.url, but they don't
+                # download objects the auto-cache already has either.
+                #
+                # Syncing the auto-cache with "remote update --prune"
+                # can make borrowed objects unreachable there, so make
+                # sure "git gc" never prunes them.
+                #
+                # Record the borrower in the .info file, so "west cache
+                # gc" knows not to remove the auto-cache.
+                with _AutoCacheLock(cache_dir) as lock:
+                    self._check_auto_cache_lock(lock, cache_dir)
+                    share = self._protect_borrowed_objects(project, cache_dir)
+                    if share:
+                        info = _read_auto_cache_info(cache_dir)
+                        borrowers = _auto_cache_borrowers(cache_dir, info)
+                        if project.abspath not in borrowers:
+                            borrowers.append(project.abspath)
+                        info['Borrowers'] = os.pathsep.join(borrowers)
+                        self._record_auto_cache_info(cache_dir, info)
+                if share:
+                    self.dbg(f'{project.name}: sharing objects with {cache_dir}')
+                    clone_cmd.append('--shared')
+            project.git(clone_cmd + [cache_dir, project.abspath], cwd=self.topdir)
             # Reset the remote's URL to the project's fetch URL.
             project.git(['remote', 'set-url', '--', project.remote_name, project.url])
             # Make sure we have a detached HEAD so we can delete the
@@ -1906,14 +2480,41 @@ class Update(_ProjectCommand):
                 # f'refs/remotes/{project.remote_name}/{branch}'.
                 project.git(['update-ref', '-d', branch])
 
+    def _protect_borrowed_objects(self, project, cache_dir):
+        # Make sure "git gc" in the auto-cache never prunes objects
+        # that clones may borrow. Returns False if that can't be done,
+        # e.g. in a read-only shared cache whose owner didn't do it,
+        # in which case it's not safe to borrow them.
+
+        cp = project.git(
+            ['config', 'gc.pruneExpire', 'never'],
+            cwd=cache_dir,
+            check=False,
+            capture_stdout=True,
+            capture_stderr=True,
+        )
+        if cp.returncode == 0:
+            return True
+        cp = project.git(
+            ['config', '--get', 'gc.pruneExpire'],
+            cwd=cache_dir,
+            check=False,
+            capture_stdout=True,
+            capture_stderr=True,
+        )
+        if cp.stdout.strip() == b'never':
+            return True
+        self._auto_cache_wrn(
+            'alternates',
+            f'cannot set gc.pruneExpire in {cache_dir}, '
+            'so its objects are copied instead of shared',
+        )
+        return False
+
     def project_auto_cache(self, project):
         if self.auto_cache is None:
             return None
-        # get the location of the project within the auto-cache.
-        # Note: The url is hashed and used as a subfolder to accomodate
-        # changes in the manifest.
-        subdir_hash = hashlib.md5(project.url.encode('utf-8')).hexdigest()
-        return os.fspath(expand_path(self.auto_cache) / basename(project.url) / subdir_hash)
+        return self._auto_cache_dir(self.auto_cache, project)
 
     def project_cache(self, project):
         # Find the absolute path to a pre-existing local clone of a project
@@ -2096,9 +2697,10 @@ class Update(_ProjectCommand):
         try:
             if take_stats:
                 start = perf_counter()
-            return project.sha(QUAL_MANIFEST_REV)
+            sha = project.sha(QUAL_MANIFEST_REV)
             if take_stats:
                 stats['get new manifest-rev SHA'] = perf_counter() - start
+            return sha
         except subprocess.CalledProcessError:
             # This is a sign something's really wrong. Add more help.
             self.err(
@@ -2178,6 +2780,13 @@ class ForAll(_ProjectCommand):
             in long form:
 
                 west forall -c "ls -l" proj-1 proj-2
+
+            By default, the command is run in one project at a time.
+            Use -j N to run it in up to N projects at once. Each
+            project's output (standard output and error together) is
+            then collected, and printed below its banner in manifest
+            order once the command finishes. The command's standard
+            input is not available in that case.
             '''),
         )
 
@@ -2202,6 +2811,12 @@ class ForAll(_ProjectCommand):
                     the command will be run if the project is
                     in any of the groups''',
         )
+        self._add_jobs_arg(
+            parser,
+            '''run COMMAND in up to N projects at once,
+               collecting each project's output''',
+            default='1',
+        )
         parser.add_argument(
             'projects',
             metavar='PROJECT',
@@ -2212,27 +2827,56 @@ class ForAll(_ProjectCommand):
         return parser
 
     def do_run(self, args, user_args):
-        failed = []
+        self.args = args
         group_set = set(args.groups)
-        env = os.environ.copy()
-        for project in self._cloned_projects(args, only_active=not args.all):
-            if group_set and not group_set.intersection(set(project.groups)):
-                continue
+        projects = [
+            project
+            for project in self._cloned_projects(args, only_active=not args.all)
+            if not group_set or group_set.intersection(set(project.groups))
+        ]
 
-            env["WEST_PROJECT_NAME"] = project.name
-            env["WEST_PROJECT_PATH"] = project.path
-            env["WEST_PROJECT_ABSPATH"] = project.abspath if project.abspath else ''
-            env["WEST_PROJECT_REVISION"] = project.revision
-            env["WEST_PROJECT_URL"] = project.url
-            env["WEST_PROJECT_REMOTE"] = project.remote_name
+        failed = []
+        jobs = self._jobs(args)
+        self.capture_output = jobs > 1
+        with _ProjectJobs(jobs) as project_jobs:
+            for job in project_jobs.map(self.forall, projects):
+                if job.result():
+                    failed.append(job.project)
+        self._handle_failed(args, failed)
 
-            cwd = args.cwd if args.cwd else project.abspath
+    def forall(self, project):
+        # Run the command in a project and return its exit status.
 
-            self.banner(f'running "{args.subcommand}" in {project.name_and_path}:')
-            rc = subprocess.Popen(args.subcommand, shell=True, env=env, cwd=cwd).wait()
-            if rc:
-                failed.append(project)
-        self._handle_failed(args, failed)
+        args = self.args
+        env = os.environ.copy()
+        env["WEST_PROJECT_NAME"] = project.name
+        env["WEST_PROJECT_PATH"] = project.path
+        env["WEST_PROJECT_ABSPATH"] = project.abspath if project.abspath else ''
+        env["WEST_PROJECT_REVISION"] = project.revision
+        env["WEST_PROJECT_URL"] = project.url
+        env["WEST_PROJECT_REMOTE"] = project.remote_name
+
+        cwd = args.cwd if args.cwd else project.abspath
+
+        self.banner(f'running "{args.subcommand}" in {project.name_and_path}:')
+        if not self.capture_output:
+            return subprocess.Popen(args.subcommand, shell=True, env=env, cwd=cwd).wait()
+
+        # Other projects' commands are running at the same time, so
+        # collect this one's output to print it all together.
+        cp = subprocess.run(
+            args.subcommand,
+            shell=True,
+            env=env,
+            cwd=cwd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors='backslashreplace',
+        )
+        sys.stdout.write(cp.stdout)
+        return cp.returncode
 
 
 GREP_EPILOG = '''
@@ -2333,6 +2977,24 @@ override this behavior on the command line, for example with:
 To do this permanently, set "grep.color":
 
   west config grep.color never
+
+PARALLEL SEARCHES
+-----------------
+
+Projects are searched several at a time. Results are still printed
+in manifest order. Use "-j N" or set "grep.jobs" to change how many
+projects are searched at once; use "-j 1" to search one at a time.
+
+Since west grep uses "-j" itself, pass the tool's own "-j" option
+(like ripgrep's) after a "--":
+
+  west grep --tool ripgrep -- -j 2 foo
+
+To stop after the first project with a match, use --first-match.
+Together with the tool's --quiet option, this is a fast way to
+check if any project contains a match at all:
+
+  west grep --first-match --quiet foo
 '''
 # color.ui limitation:
 # https://github.com/zephyrproject-rtos/west/issues/651
@@ -2385,45 +3047,85 @@ class Grep(_ProjectCommand):
                             more than once); default is all cloned active
                             projects''',
         )
+        self._add_jobs_arg(
+            parser,
+            '''search up to N projects at once; output is
+               still printed in manifest order''',
+        )
+        parser.add_argument(
+            '--first-match',
+            action='store_true',
+            help='''stop after the first project, in manifest
+                    order, where the tool finds a match''',
+        )
         return parser
 
     def do_run(self, args, tool_cmdline_args):
         tool = self.tool(args)
-        command_list = [self.tool_path(tool, args)] + self.tool_args(tool, tool_cmdline_args)
-        failed = []
-        for project in self._cloned_projects(args, only_active=not args.projects):
-            completed_process = self.run_subprocess(
-                command_list, capture_output=True, text=True, cwd=project.abspath
-            )
+        self.command_list = [self.tool_path(tool, args)] + self.tool_args(tool, tool_cmdline_args)
 
-            # By default, supported tools generally exit 1 if
-            # nothing is found and 0 if something was found, with
-            # other return codes indicating an error.
-            #
-            # For git grep, this is experimentally true, even if
-            # the man page doesn't say so.
-            #
-            # Per grep's and ripgrep's man pages, this is true
-            # except that if an error occurred and --quiet was
-            # given and a match was found, then the exit status is
-            # still 0.
-            #
-            # Using --quiet can thus be used to print repositories
-            # with a match, while ignoring errors.
-            if completed_process.returncode == 1:
-                continue
-            self.banner(f'{project.name_and_path}:')
-            if completed_process.returncode != 0:
-                self.err(f'{util.quote_sh_list(command_list)}:\n{completed_process.stderr}', end='')
-                failed.append(project)
-            elif completed_process.stdout:
-                # With 'west grep --quiet PATTERN', we will just be
-                # printing a list of repositories that contain
-                # matches. We want to avoid printing the newline from
-                # self.inf() in that case.
-                self.inf(completed_process.stdout, end='')
+        projects = self._selected_projects(args)
+
+        failed = []
+        with _ProjectJobs(self._jobs(args, default=_default_jobs())) as jobs:
+            for job in jobs.map(self.grep, projects):
+                project, completed_process = job.project, job.result()
+                if completed_process is None:
+                    continue
+                if self.print_result(project, completed_process):
+                    failed.append(project)
+                elif completed_process.returncode == 0 and args.first_match:
+                    # Any searches that are still running finish in
+                    # the background, but we don't print their results.
+                    jobs.cancel()
+                    break
         self._handle_failed(args, failed)
 
+    def grep(self, project):
+        # Run the grep tool in a project and return the
+        # CompletedProcess, or None if the project isn't cloned.
+
+        if self.check_cloned and not project.is_cloned():
+            return None
+
+        return self.run_subprocess(
+            self.command_list, capture_output=True, text=True, cwd=project.abspath
+        )
+
+    def print_result(self, project, completed_process):
+        # Print the results of grep(project). Returns True if the
+        # tool failed.
+
+        # By default, supported tools generally exit 1 if
+        # nothing is found and 0 if something was found, with
+        # other return codes indicating an error.
+        #
+        # For git grep, this is experimentally true, even if
+        # the man page doesn't say so.
+        #
+        # Per grep's and ripgrep's man pages, this is true
+        # except that if an error occurred and --quiet was
+        # given and a match was found, then the exit status is
+        # still 0.
+        #
+        # Using --quiet can thus be used to print repositories
+        # with a match, while ignoring errors.
+        if completed_process.returncode == 1:
+            return False
+        self.banner(f'{project.name_and_path}:')
+        if completed_process.returncode != 0:
+            self.err(
+                f'{util.quote_sh_list(self.command_list)}:\n{completed_process.stderr}', end=''
+            )
+            return True
+        elif completed_process.stdout:
+            # With 'west grep --quiet PATTERN', we will just be
+            # printing a list of repositories that contain
+            # matches. We want to avoid printing the newline from
+            # self.inf() in that case.
+            self.inf(completed_process.stdout, end='')
+        return False
+
     def tool(self, args):
         if args.tool:
             return args.tool
@@ -2481,6 +3183,341 @@ class Grep(_ProjectCommand):
         return ret
 
 
+class Cache(_ProjectCommand):
+    def __init__(self):
+        super().__init__(
+            'cache',
+            'manage the "west update" auto-cache',
+            textwrap.dedent('''\
+            Manages the local cache repositories created by
+            "west update --auto-cache" (or the update.auto-cache
+            configuration option). See "west update -h" for details.
+
+            The following actions are available:
+
+            - prefetch: create or sync the cache repositories for all
+              active projects in the manifest, several at a time, so that
+              later "west update" runs using the cache don't need the
+              network. As in "west update", a cache repository is only
+              synced if it doesn't already contain the project's
+              revision, unless "--fetch always" is given. With
+              --name-cache, this fills a name cache (see "west update
+              -h") instead of, or as well as, the auto-cache.
+
+            - gc: remove cache repositories which have not been used
+              recently, and run "git gc" in the others.
+
+              Each time "west update" uses a cache repository, it
+              records the time in the repository's .info file. With
+              --max-age, cache repositories which have not been used
+              for longer than that are removed. With --max-size, the
+              least recently used cache repositories are removed until
+              the total size of the cache is small enough. Leftovers
+              from interrupted "west update" runs are always removed.
+
+              This is safe to run while "west update" is using the
+              cache. Projects cloned with update.cache-mode=alternates
+              stop working if the cache repository they borrow objects
+              from is removed, so such cache repositories are kept
+              unless --force is given. For the same reason, "git gc"
+              never prunes objects in cache repositories.'''),
+            requires_workspace=False,
+        )
+
+    def do_add_parser(self, parser_adder):
+        parser = self._parser(parser_adder)
+        parser.add_argument('action', choices=['prefetch', 'gc'], help='what to do; see above')
+        parser.add_argument(
+            '--auto-cache',
+            help='''the auto-cache directory; default: the
+                    update.auto-cache configuration option''',
+        )
+
+        group = parser.add_argument_group('options for prefetch')
+        group.add_argument(
+            '--name-cache',
+            help='''also fill this name cache directory; default:
+                    the update.name-cache configuration option''',
+        )
+        group.add_argument(
+            '--group-filter',
+            '--gf',
+            action='append',
+            default=[],
+            metavar='FILTER',
+            dest='group_filter',
+            help='''proceed as if FILTER was appended to
+                    manifest.group-filter; may be given multiple
+                    times''',
+        )
+        group.add_argument(
+            '--fetch',
+            dest='fetch_strategy',
+            choices=['always', 'smart'],
+            help='''"always" syncs every cache repository, while
+                    "smart" (default) skips those which already contain
+                    the project's revision as a SHA or tag''',
+        )
+        self._add_jobs_arg(
+            group,
+            'prefetch up to N projects at once',
+        )
+
+        group = parser.add_argument_group('options for gc')
+        group.add_argument(
+            '--max-age',
+            type=float,
+            metavar='DAYS',
+            help='remove cache repositories not used in the last DAYS days',
+        )
+        group.add_argument(
+            '--max-size',
+            metavar='SIZE',
+            help='''remove the least recently used cache repositories
+                    until the cache uses at most SIZE bytes; SIZE may end
+                    in K, M, G, or T''',
+        )
+        group.add_argument(
+            '--repack',
+            action='store_true',
+            help='''run a full "git gc" in the remaining cache
+                    repositories, instead of "git gc --auto"''',
+        )
+        group.add_argument(
+            '-f',
+            '--force',
+            action='store_true',
+            help='''also remove cache repositories which projects
+                    cloned with update.cache-mode=alternates still
+                    borrow objects from''',
+        )
+        group.add_argument(
+            '-n',
+            '--dry-run',
+            action='store_true',
+            help='print what would be removed, without doing anything',
+        )
+
+        return parser
+
+    def do_run(self, args, user_args):
+        self.die_if_no_git()
+        self.auto_cache = args.auto_cache or self.config.get('update.auto-cache')
+        if args.action == 'prefetch':
+            self.prefetch(args)
+            return
+
+        if not self.auto_cache:
+            self.die('no auto-cache; use --auto-cache or set update.auto-cache')
+        self.auto_cache = os.fspath(expand_path(self.auto_cache))
+        self.gc(args)
+
+    def prefetch(self, args):
+        # "west cache" is one of the NO_MANIFEST_COMMANDS, since gc
+        # doesn't need the manifest, so load it here.
+        if not self.topdir:
+            self.die('"west cache prefetch" must be run inside a workspace')
+        self.manifest = Manifest.from_topdir(topdir=self.topdir, config=self.config)
+        name_cache = args.name_cache or self.config.get('update.name-cache')
+        if not (self.auto_cache or name_cache):
+            self.die(
+                'no cache to prefetch into; use --auto-cache or --name-cache, '
+                'or set update.auto-cache or update.name-cache'
+            )
+
+        group_filter = []
+        for item in args.group_filter:
+            for elt in item.split(','):
+                elt = elt.strip()
+                if not (elt.startswith(('-', '+')) and is_project_group(elt[1:])):
+                    self.die(f'invalid --group-filter item {elt}')
+                group_filter.append(elt)
+
+        # Projects which share a URL share an auto-cache repository.
+        # Only the first one fills it, or jobs for the same repository
+        # would just wait for each other.
+        auto_cache_projects = set()
+        urls = set()
+        projects = []
+        for project in self.manifest.projects:
+            if isinstance(project, ManifestProject):
+                continue
+            if not self.manifest.is_active(project, extra_filter=group_filter):
+                continue
+            if self.auto_cache and project.url not in urls:
+                auto_cache_projects.add(project.name)
+                urls.add(project.url)
+            if name_cache or project.name in auto_cache_projects:
+                projects.append(project)
+
+        fs = self._fetch_strategy(args)
+        self.auto_cache_ttl = self._auto_cache_ttl()
+        prefetch = partial(self.prefetch_project, fs, name_cache, auto_cache_projects)
+        failed = []
+        with _ProjectJobs(self._jobs(args, default=_default_jobs())) as jobs:
+            for job in jobs.map(prefetch, projects):
+                try:
+                    job.result()
+                except subprocess.CalledProcessError:
+                    failed.append(job.project)
+        self._handle_failed(args, failed)
+
+    def prefetch_project(self, fs, name_cache, auto_cache_projects, project):
+        if project.name in auto_cache_projects:
+            cache_dir = self._auto_cache_dir(self.auto_cache, project)
+            self.small_banner(f'{project.name}: prefetching into {cache_dir}')
+            self._sync_cache(project, cache_dir, fs, ttl=self.auto_cache_ttl)
+        if name_cache:
+            cache_dir = os.fspath(expand_path(name_cache) / project.name)
+            self.small_banner(f'{project.name}: prefetching into {cache_dir}')
+            self._sync_cache(project, cache_dir, fs, auto_cache=False)
+
+    def cache_dirs(self):
+        # Returns the paths of the repositories in the auto-cache,
+        # which are laid out as <auto-cache>/<basename>/<url-hash>
+        # by Update.project_auto_cache(), and of any leftover
+        # temporary '.partial' clones.
+
+        cache_dirs, partials = [], []
+        if not os.path.isdir(self.auto_cache):
+            return cache_dirs, partials
+
+        for group in sorted(os.scandir(self.auto_cache), key=lambda entry: entry.name):
+            if not group.is_dir():
+                continue
+            for entry in sorted(os.scandir(group.path), key=lambda entry: entry.name):
+                if not entry.is_dir():
+                    continue
+                if entry.name.endswith('.partial'):
+                    partials.append(entry.path)
+                elif _maybe_sha(entry.name) and len(entry.name) == 32:
+                    cache_dirs.append(entry.path)
+        return cache_dirs, partials
+
+    def gc(self, args):
+        max_age = max_size = None
+        if args.max_age is not None:
+            max_age = args.max_age * 24 * 60 * 60
+        if args.max_size is not None:
+            try:
+                max_size = _parse_size(args.max_size)
+            except ValueError:
+                self.die(f'invalid --max-size: {args.max_size}')
+
+        cache_dirs, partials = self.cache_dirs()
+
+        for leftover in partials:
+            self.remove_partial(leftover, args.dry_run)
+
+        # Least recently used first.
+        caches = sorted(
+            (_auto_cache_last_used(cache_dir), _disk_usage(cache_dir), cache_dir)
+            for cache_dir in cache_dirs
+        )
+        total_size = sum(size for _, size, _ in caches)
+        now = time.time()
+        removed = removed_size = 0
+        kept = []
+        for last_used, size, cache_dir in caches:
+            too_old = max_age is not None and now - last_used > max_age
+            too_big = max_size is not None and total_size > max_size
+            if (too_old or too_big) and self.remove_cache(cache_dir, last_used, size, args):
+                total_size -= size
+                removed += 1
+                removed_size += size
+            else:
+                kept.append(cache_dir)
+
+        if not args.dry_run:
+            # Never prune: projects cloned with
+            # update.cache-mode=alternates may need unreachable objects.
+            gc_cmd = [self._git, 'gc', '--quiet', '--no-prune']
+            if not args.repack:
+                gc_cmd.append('--auto')
+            for cache_dir in kept:
+                self.dbg(f'running "git gc" in {cache_dir}')
+                start = perf_counter()
+                cp = self.run_subprocess(gc_cmd, cwd=cache_dir)
+                _git_call_done(gc_cmd, cache_dir, perf_counter() - start, cp.returncode, None, None)
+                if cp.returncode:
+                    self.wrn(f'"git gc" failed in {cache_dir}')
+
+        verb = 'would remove' if args.dry_run else 'removed'
+        self.inf(
+            f'{verb} {removed} cache repositories ({_format_size(removed_size)}), '
+            f'kept {len(kept)} ({_format_size(total_size)})'
+        )
+
+    def remove_cache(self, cache_dir, last_used, size, args):
+        # Remove a cache repository along with its .info and lock
+        # files, unless "west update" used it since we looked, or
+        # projects still borrow objects from it and there's no
+        # --force. Returns True if it was removed (or would have been).
+
+        when = datetime.fromtimestamp(last_used).isoformat(sep=' ', timespec='seconds')
+        if args.dry_run:
+            if self.is_borrowed(cache_dir, args.force):
+                return False
+            self.inf(f'would remove {cache_dir} ({_format_size(size)}, last used {when})')
+            return True
+
+        with _AutoCacheLock(cache_dir) as lock:
+            if lock.error is not None:
+                # Someone may be using it right now.
+                self.wrn(f'keeping {cache_dir}: cannot lock it: {lock.error}')
+                return False
+            if _auto_cache_last_used(cache_dir) != last_used:
+                self.dbg(f'keeping {cache_dir}: it was used just now')
+                return False
+            if self.is_borrowed(cache_dir, args.force):
+                return False
+            self.inf(f'removing {cache_dir} ({_format_size(size)}, last used {when})')
+            shutil.rmtree(cache_dir)
+            try:
+                os.remove(cache_dir + '.info')
+            except FileNotFoundError:
+                pass
+            lock.remove()
+
+        # Remove the <basename> directory too, if it's now empty.
+        try:
+            os.rmdir(os.path.dirname(cache_dir))
+        except OSError:
+            pass
+        return True
+
+    def is_borrowed(self, cache_dir, force):
+        # remove_cache() helper. Returns True if projects borrow
+        # objects from the cache repository and there's no --force.
+
+        borrowers = _auto_cache_borrowers(cache_dir, _read_auto_cache_info(cache_dir))
+        if not borrowers:
+            return False
+        if force:
+            self.wrn(f'{cache_dir} is still used by: {", ".join(borrowers)}')
+            return False
+        self.inf(
+            f'keeping {cache_dir}: still used by {", ".join(borrowers)} '
+            '(update.cache-mode=alternates); use --force to remove it anyway'
+        )
+        return True
+
+    def remove_partial(self, leftover, dry_run):
+        # Remove a leftover '.partial' clone. Holding the lock for its
+        # cache repository means no clone into it is in progress.
+
+        if dry_run:
+            self.inf(f'would remove {leftover}')
+            return
+
+        with _AutoCacheLock(leftover.removesuffix('.partial')) as lock:
+            if lock.error is not None:
+                self.wrn(f'keeping {leftover}: cannot lock it: {lock.error}')
+            elif os.path.isdir(leftover):
+                self.inf(f'removing {leftover}')
+                shutil.rmtree(leftover)
+
+
 class Topdir(_ProjectCommand):
     def __init__(self):
         super().__init__(
@@ -2521,6 +3558,18 @@ class SelfUpdate(_ProjectCommand):
 #
 
 
+def _format_keys(fmt):
+    # Get the set of keys used by a format string, e.g. {'name', 'sha'}
+    # for '{name} {sha:.12}'. Invalid format strings have no keys;
+    # the error is reported when the string is actually used.
+
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(fmt) if field]
+    except ValueError:
+        return set()
+    return {field.split('.')[0].split('[')[0] for field in fields}
+
+
 def _clean_west_refspace(project):
     # Clean the refs/west space to ensure they do not show up in 'git log'.
 
@@ -2628,6 +3677,12 @@ def _head_ok(project):
     # will return:
     # - 0 if HEAD is present
     # - 1 otherwise
+    #
+    # Usually, we can just read HEAD ourselves instead.
+    try:
+        return project._read_ref_fast('HEAD') is not None
+    except _RefsUnsupported:
+        pass
     return project.git('show-ref --quiet --head /', check=False).returncode == 0
 
 
@@ -2658,6 +3713,9 @@ def projects_unknown(manifest, projects):
 # Top-level west directory, containing west itself and the manifest.
 WEST_DIR = util.WEST_DIR
 
+# File in WEST_DIR where "west update" saves what it did to each project.
+UPDATE_STATE_FILE = 'update-state.json'
+
 # Default manifest repository URL.
 MANIFEST_URL_DEFAULT = 'https://github.com/zephyrproject-rtos/zephyr'
 
@@ -2714,6 +3772,582 @@ class DelayFormat:
         return ('{:' + format_spec + '}').format(self.as_str)
 
 
+#
+# Helpers for working on multiple projects at once.
+#
+
+# Per-thread state used by _ThreadOutput.
+_thread_output_state = threading.local()
+
+
+class _ThreadOutput:
+    # Stand-in for sys.stdout or sys.stderr while a _ProjectJobs is
+    # running work in worker threads. Writes from a thread which is
+    # running a job are saved in that job's output buffer; everything
+    # else passes straight through to the wrapped stream.
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, s):
+        chunks = getattr(_thread_output_state, 'chunks', None)
+        if chunks is None:
+            return self._stream.write(s)
+        chunks.append((self._stream, s))
+        return len(s)
+
+    def flush(self):
+        if getattr(_thread_output_state, 'chunks', None) is None:
+            self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _default_jobs():
+    # Default number of jobs for commands which run quick, read-only
+    # git commands in every project. Those spend most of their time
+    # waiting for git, so use more threads than CPUs, like
+    # ThreadPoolExecutor does by default.
+
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+class _ProjectJob:
+    # A unit of work submitted to a _ProjectJobs. Call result() from
+    # the main thread to wait for it, print anything it printed, and
+    # get its return value (or exception).
+
+    def __init__(self, project):
+        self.project = project
+        self.future = None
+        self.chunks = []
+        self.value = None
+        self.exception = None
+        self.reported = False
+
+    def result(self):
+        if self.future is not None:
+            try:
+                self.value = self.future.result()
+            except BaseException as e:
+                self.exception = e
+        self.report()
+        if self.exception is not None:
+            raise self.exception
+        return self.value
+
+    def report(self):
+        if self.reported:
+            return
+        self.reported = True
+        for stream, s in self.chunks:
+            stream.write(s)
+        for stream in {stream for stream, _ in self.chunks}:
+            stream.flush()
+
+
+class _ProjectJobs:
+    # Runs a function on projects using a bounded pool of worker
+    # threads, e.g. "west update -j N".
+    #
+    # Each job's output is saved while it runs and printed all at once
+    # when its result() is requested, so output from different
+    # projects never interleaves. With a single job, work happens
+    # synchronously in the calling thread instead and output is
+    # printed normally; this is the same as not using this class.
+    #
+    # Use it as a context manager.
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self._executor = None
+        self._saved_streams = None
+        self._outstanding = []
+
+    def __enter__(self):
+        if self.jobs > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.jobs)
+            self._saved_streams = sys.stdout, sys.stderr
+            sys.stdout = _ThreadOutput(sys.stdout)
+            sys.stderr = _ThreadOutput(sys.stderr)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=True, cancel_futures=exc_type is not None)
+        sys.stdout, sys.stderr = self._saved_streams
+        # Don't lose the output from any jobs whose results nobody
+        # asked for, e.g. because we're exiting due to an error.
+        for job in self._outstanding:
+            if not job.future.cancelled():
+                job.report()
+        self._outstanding = []
+
+    def submit(self, func, project):
+        # Run func(project) and return a _ProjectJob for it.
+
+        job = _ProjectJob(project)
+        if self._executor is None:
+            try:
+                job.value = func(project)
+            except Exception as e:
+                job.exception = e
+        else:
+            job.future = self._executor.submit(self._run, func, project, job.chunks)
+            self._outstanding.append(job)
+            self._outstanding = [j for j in self._outstanding if not j.reported]
+        return job
+
+    def cancel(self):
+        # Cancel any jobs which haven't started yet, and throw away
+        # the output of all jobs whose results haven't been requested.
+        # Jobs which are already running still run to completion.
+
+        for job in self._outstanding:
+            job.future.cancel()
+            job.reported = True
+        self._outstanding = []
+
+    def map(self, func, projects):
+        # Generator which submits func(project) for each project,
+        # yielding the jobs in the same order as projects.
+        #
+        # Only a limited number of jobs are submitted ahead of the one
+        # the caller is waiting for. This keeps the amount of saved
+        # output bounded, and makes a single job behave exactly like
+        # a plain loop over projects.
+
+        limit = 2 * self.jobs if self.jobs > 1 else 1
+        pending = deque()
+        for project in projects:
+            pending.append(self.submit(func, project))
+            if len(pending) >= limit:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+    @staticmethod
+    def _run(func, project, chunks):
+        # Worker thread entry point.
+
+        _thread_output_state.chunks = chunks
+        _git_thread_state.buffer_output = True
+        try:
+            return func(project)
+        finally:
+            _thread_output_state.chunks = None
+            _git_thread_state.buffer_output = False
+
+
+class _UpdateImporter:
+    # The importer passed to Manifest by "west update". This is a class
+    # instead of a plain method so it can have a prefetch attribute.
+
+    def __init__(self, update):
+        self.update = update
+
+    def __call__(self, project, path):
+        return self.update.update_importer(project, path)
+
+    def prefetch(self, projects):
+        self.update.prefetch_imports(projects)
+
+
+class _UpdateStats:
+    # Performance statistics for "west update --stats" and
+    # --stats-file, collected from all projects. as_dict() returns
+    # them in a JSON-friendly form:
+    #
+    # - 'projects': a list with the name, path, total time in seconds,
+    #   and time in seconds of each phase ('fetch', etc.) for each
+    #   project, in the order the projects were done
+    # - 'phases': aggregate statistics for each phase over all
+    #   projects where it happened
+    # - 'projects-total': aggregate statistics for the total time
+    #   spent on each project
+    # - 'elapsed': wall clock time in seconds for the whole update
+    #
+    # Aggregate statistics are the count, total, min, max, and the
+    # 50th, 90th, and 99th percentiles.
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.projects = []
+        self.lock = threading.Lock()
+
+    def add(self, project, phases, total):
+        with self.lock:
+            self.projects.append({
+                'name': project.name,
+                'path': project.path,
+                'total': total,
+                'phases': dict(phases),
+            })
+
+    def as_dict(self):
+        with self.lock:
+            projects = list(self.projects)
+
+        phase_times = {}
+        for p in projects:
+            for phase, value in p['phases'].items():
+                phase_times.setdefault(phase, []).append(value)
+
+        return {
+            'version': 1,
+            'elapsed': perf_counter() - self.start,
+            'projects': projects,
+            'phases': {phase: self._aggregate(values) for phase, values in phase_times.items()},
+            'projects-total': self._aggregate([p['total'] for p in projects]),
+        }
+
+    @staticmethod
+    def _aggregate(values):
+        values = sorted(values)
+        if not values:
+            return {'count': 0, 'total': 0.0}
+
+        def percentile(p):
+            # Nearest-rank method.
+            return values[max(0, -(-len(values) * p // 100) - 1)]
+
+        return {
+            'count': len(values),
+            'total': sum(values),
+            'min': values[0],
+            'max': values[-1],
+            'p50': percentile(50),
+            'p90': percentile(90),
+            'p99': percentile(99),
+        }
+
+
+class _UpdateState:
+    # What "west update" last did to each project, saved in
+    # .west/update-state.json, so it can skip projects which provably
+    # don't need any work. See Update.is_unchanged().
+    #
+    # An entry is forgotten (and the file is saved right away) before
+    # a project is updated, and recorded again only once the update
+    # is done. That way, an interrupted update can't leave behind an
+    # entry for a project it left in an unknown state.
+    #
+    # Like other caches in .west, errors reading or writing the file
+    # are ignored; they just mean that projects get updated normally.
+
+    def __init__(self, topdir):
+        self.path = Path(topdir) / WEST_DIR / UPDATE_STATE_FILE
+        self.projects = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data['version'] == 1 and isinstance(data['projects'], dict):
+                self.projects = data['projects']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def get(self, project):
+        return self.projects.get(project.name)
+
+    def forget(self, project):
+        with self.lock:
+            if self.projects.pop(project.name, None) is not None:
+                self.dirty = True
+                self._save()
+
+    def record(self, project, entry):
+        with self.lock:
+            if self.projects.get(project.name) != entry:
+                self.projects[project.name] = entry
+                self.dirty = True
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        if not self.dirty:
+            return
+
+        tmp = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'projects': self.projects}, f)
+            os.replace(tmp, self.path)
+            self.dirty = False
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+# Protects _ProjectCommand._auto_cache_wrn()'s record of what it
+# warned about.
+_AUTO_CACHE_WRN_LOCK = threading.Lock()
+
+
+class _AutoCacheLock:
+    # Context manager which locks an --auto-cache mirror, so only one
+    # "west update" at a time clones or fetches into it, whether it's
+    # in this process or another one on the same host.
+    #
+    # Other processes are kept out with an advisory lock on the file
+    # '<mirror>.lock'. The OS releases that lock when its holder
+    # exits, even if it crashes, so locks can't go stale. Threads in
+    # this process also share a threading.Lock per mirror, since
+    # advisory locks don't reliably exclude threads.
+    #
+    # The lock file also records when the mirror was last fetched,
+    # so anyone who waited for the lock can tell if the fetch they
+    # wanted already happened.
+    #
+    # If the lock file can't be opened, e.g. because the cache is a
+    # read-only shared one, only other threads are kept out. The
+    # OSError is saved in 'error' for the caller to report.
+
+    _thread_locks: dict[str, threading.Lock] = {}  # lock file path -> lock
+    _thread_locks_lock = threading.Lock()
+
+    def __init__(self, cache_dir):
+        self.path = os.fspath(cache_dir) + '.lock'
+        with self._thread_locks_lock:
+            self.thread_lock = self._thread_locks.setdefault(self.path, threading.Lock())
+        self.file = None
+        self.error = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        try:
+            while True:
+                try:
+                    self.file = open(self.path, 'a+b')
+                except OSError as e:
+                    self.file = None
+                    self.error = e
+                    break
+                try:
+                    self._lock()
+                    # "west cache gc" removes the lock files of the
+                    # caches it removes, while holding their locks. If
+                    # that happened while we were waiting, we locked a
+                    # file nobody else will, so try again.
+                    if os.path.samestat(os.fstat(self.file.fileno()), os.stat(self.path)):
+                        break
+                except FileNotFoundError:
+                    pass
+                except BaseException:
+                    self.file.close()
+                    raise
+                self.file.close()
+        except BaseException:
+            self.thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *args):
+        try:
+            if self.file is not None:
+                try:
+                    self._unlock()
+                finally:
+                    self.file.close()
+        finally:
+            self.thread_lock.release()
+
+    def last_fetched(self):
+        # Time the mirror was last fetched, as returned by
+        # time.time(), or None if unknown.
+        if self.file is None:
+            return None
+        self.file.seek(0)
+        try:
+            return float(self.file.read().decode('ascii'))
+        except ValueError:
+            return None
+
+    def mark_fetched(self):
+        # Record that the mirror was just fetched.
+        if self.file is None:
+            return
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.write(f'{time.time()}\n'.encode('ascii'))
+        self.file.flush()
+
+    def remove(self):
+        # Remove the lock file, if possible. It stays locked until
+        # we're done with it. Windows won't remove open files, so this
+        # does nothing there.
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    if sys.platform == 'win32':
+
+        def _lock(self):
+            # msvcrt.locking() gives up after 10 tries, 1 second
+            # apart, so keep trying while someone else holds the lock.
+            # Any other error is real. It locks from the current
+            # position, and on Windows, the region need not exist.
+            self.file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                    return
+                except OSError as e:
+                    if e.errno not in (errno.EDEADLOCK, errno.EACCES):
+                        raise
+                time.sleep(1)
+
+        def _unlock(self):
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    else:
+
+        def _lock(self):
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+
+        def _unlock(self):
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+
+def _read_auto_cache_info(cache_dir):
+    # Returns the "- Key: value" lines in an auto-cache's informal
+    # '<cache>.info' file as a dict. This is empty if there is no such
+    # file, e.g. because the cache was made by an older west.
+
+    info = {}
+    try:
+        with open(cache_dir + '.info', encoding='utf-8') as f:
+            for line in f:
+                key, sep, value = line.partition(':')
+                if line.startswith('- ') and sep:
+                    info[key[2:]] = value.strip()
+    except OSError:
+        pass
+    return info
+
+
+def _write_auto_cache_info(cache_dir, info):
+    # Replaces an auto-cache's '<cache>.info' file with the contents of
+    # a dict, in the format _read_auto_cache_info() understands.
+
+    path = cache_dir + '.info'
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write('\nThe following local cache directory was automatically created by west:\n')
+            for key, value in info.items():
+                f.write(f'{f"- {key}:":<15} {value}\n')
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _auto_cache_borrowers(cache_dir, info):
+    # Returns the repositories recorded in an auto-cache's .info file
+    # which still borrow its objects through objects/info/alternates,
+    # as set up by update.cache-mode=alternates.
+
+    objects = os.path.realpath(os.path.join(cache_dir, 'objects'))
+    borrowers = []
+    for borrower in info.get('Borrowers', '').split(os.pathsep):
+        if not borrower:
+            continue
+        alternates = os.path.join(borrower, '.git', 'objects', 'info', 'alternates')
+        try:
+            with open(alternates, encoding='utf-8') as f:
+                if any(os.path.realpath(line.strip()) == objects for line in f):
+                    borrowers.append(borrower)
+        except OSError:
+            pass
+    return borrowers
+
+
+def _auto_cache_info_time(info, key):
+    # Returns a time recorded in an auto-cache's .info file, as
+    # returned by time.time(), or None if it's missing or invalid.
+
+    try:
+        return datetime.fromisoformat(info[key]).timestamp()
+    except (KeyError, ValueError):
+        return None
+
+
+def _auto_cache_last_used(cache_dir):
+    # Returns when an auto-cache was last used by "west update", as
+    # returned by time.time(). Caches made by older versions of west
+    # don't record this, so fall back on when they were last fetched
+    # into or created.
+
+    last_used = _auto_cache_info_time(_read_auto_cache_info(cache_dir), 'Last Used')
+    if last_used is not None:
+        return last_used
+
+    mtimes = []
+    for path in [os.path.join(cache_dir, 'FETCH_HEAD'), cache_dir + '.info', cache_dir]:
+        try:
+            mtimes.append(os.stat(path).st_mtime)
+        except OSError:
+            pass
+    return max(mtimes, default=0.0)
+
+
+def _disk_usage(path):
+    # Total size in bytes of the files in a directory tree.
+
+    ret = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                ret += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return ret
+
+
+_SIZE_SUFFIXES = ['B', 'K', 'M', 'G', 'T']
+
+
+def _parse_size(size):
+    # Parses a size like '500M' or '2G' (powers of 1024) into bytes.
+    # Raises ValueError if it's invalid.
+
+    size = size.strip().upper().removesuffix('IB').removesuffix('B') or 'invalid'
+    multiplier = 1
+    if size[-1] in _SIZE_SUFFIXES:
+        multiplier = 1024 ** _SIZE_SUFFIXES.index(size[-1])
+        size = size[:-1]
+    ret = float(size) * multiplier
+    if ret < 0:
+        raise ValueError(size)
+    return int(ret)
+
+
+def _format_size(size):
+    # The inverse of _parse_size(), more or less.
+
+    if size < 1024:
+        return f'{size}B'
+    for suffix in _SIZE_SUFFIXES[1:-1]:
+        size /= 1024
+        if size < 1024:
+            return f'{size:.1f}{suffix}'
+    return f'{size / 1024:.1f}{_SIZE_SUFFIXES[-1]}'
+
+
 #
 # Logging helpers
 #
@@ -5,8 +5,10 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import argparse
+import hashlib
 import importlib.util
 import itertools
+import json
 import os
 import re
 import shutil
@@ -19,7 +21,7 @@ from dataclasses import dataclass
 from enum import IntEnum
 from pathlib import Path
 from types import ModuleType
-from typing import NoReturn
+from typing import Any, NoReturn
 
 import colorama
 import pykwalify
@@ -31,9 +33,11 @@ except ImportError:
 
 import yaml
 
+from west import _trace
 from west.configuration import Configuration
 from west.manifest import Manifest, Project
-from west.util import PathType, escapes_directory, quote_sh_list
+from west.util import WEST_DIR, PathType, escapes_directory, quote_sh_list
+from west.version import __version__
 
 '''\
 This package provides WestCommand, which is the common abstraction all
@@ -50,6 +54,9 @@ _EXT_SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'west-commands-schema
 _EXT_MODULES_CACHE: dict[str, ModuleType] = {}
 # Infinite iterator of "fresh" extension command module names.
 _EXT_MODULES_NAME_IT = (f'west.commands.ext.cmd_{i}' for i in itertools.count(1))
+# File in the .west directory which caches validated west-commands
+# files. See _ExtSpecCache.
+_EXT_SPEC_CACHE = 'extension-commands-cache.json'
 
 
 class CommandError(RuntimeError):
@@ -217,7 +224,8 @@ class WestCommand(ABC):
         self.manifest = manifest
         for hook in self._hooks:
             hook(self)
-        self.do_run(args, unknown)
+        with _trace.span(f'{self.name}.do_run', cat='command'):
+            self.do_run(args, unknown)
 
     def add_parser(self, parser_adder) -> argparse.ArgumentParser:
         '''Registers a parser for this command, and returns it.
@@ -659,16 +667,19 @@ def extension_commands(config: Configuration, manifest: Manifest | None = None):
     if manifest is None:
         manifest = Manifest.from_file()
 
+    cache = _ExtSpecCache(manifest.topdir)
     specs = OrderedDict()
     for project in manifest.projects:
         if project.west_commands:
-            specs[project.path] = _ext_specs(project)
+            specs[project.path] = _ext_specs(project, cache)
+    cache.save()
     return specs
 
 
-def _ext_specs(project):
+def _ext_specs(project, cache=None):
     # Get a list of WestExtCommandSpec objects for the given
-    # west.manifest.Project.
+    # west.manifest.Project. If 'cache' is given, it's an
+    # _ExtSpecCache for loading west-commands files.
 
     ret = []
 
@@ -688,24 +699,100 @@ def _ext_specs(project):
         if not os.path.exists(spec_file):
             continue
 
-        # Load the spec file and check the schema.
-        with open(spec_file) as f:
-            try:
-                commands_spec = yaml.load(f.read(), Loader=SafeLoader)
-            except yaml.YAMLError as e:
-                raise ExtensionCommandError from e
-        try:
-            pykwalify.core.Core(
-                source_data=commands_spec, schema_files=[_EXT_SCHEMA_PATH]
-            ).validate()
-        except pykwalify.errors.SchemaError as e:
-            raise ExtensionCommandError from e
+        if cache is not None:
+            commands_spec = cache.load(spec_file)
+        else:
+            commands_spec = _load_ext_spec(spec_file)
 
         for commands_desc in commands_spec['west-commands']:
             ret.extend(_ext_specs_from_desc(project, commands_desc))
     return ret
 
 
+def _load_ext_spec(spec_file, content=None):
+    # Load a west-commands file and check the schema. If 'content' is
+    # given, it's the already read file contents.
+
+    if content is None:
+        with open(spec_file) as f:
+            content = f.read()
+    try:
+        commands_spec = yaml.load(content, Loader=SafeLoader)
+    except yaml.YAMLError as e:
+        raise ExtensionCommandError from e
+    try:
+        pykwalify.core.Core(source_data=commands_spec, schema_files=[_EXT_SCHEMA_PATH]).validate()
+    except pykwalify.errors.SchemaError as e:
+        raise ExtensionCommandError from e
+
+    return commands_spec
+
+
+class _ExtSpecCache:
+    # Persistent cache of validated west-commands file contents.
+    #
+    # Parsing and validating every west-commands file in the workspace
+    # on each west invocation adds up in big workspaces, so we keep
+    # the results in the .west directory, keyed by file path. An entry
+    # is only used if the file's contents haven't changed. (Reading a
+    # file and hashing it is cheap compared to validating it.)
+    #
+    # The cache is a performance optimization only. Errors reading or
+    # writing it are ignored.
+
+    def __init__(self, topdir: PathType | None):
+        self.path = Path(topdir) / WEST_DIR / _EXT_SPEC_CACHE if topdir else None
+        # Spec file path -> {'sha256': ..., 'spec': ...}, as loaded
+        # from the cache file, so the values aren't checked yet.
+        self.entries: dict[str, Any] = {}
+        # Entries for the files we looked at. Others are dropped on save().
+        self.used: dict[str, dict[str, Any]] = {}
+        self.dirty = False
+
+        if self.path is None:
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data['west-version'] == __version__ and isinstance(data['files'], dict):
+                self.entries = data['files']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def load(self, spec_file: str):
+        # Like _load_ext_spec(spec_file), but using the cache.
+
+        with open(spec_file) as f:
+            content = f.read()
+        key = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        entry = self.entries.get(spec_file)
+        if isinstance(entry, dict) and entry.get('sha256') == key:
+            commands_spec = entry['spec']
+        else:
+            commands_spec = _load_ext_spec(spec_file, content)
+            entry = {'sha256': key, 'spec': commands_spec}
+            self.dirty = True
+        self.used[spec_file] = entry
+        return commands_spec
+
+    def save(self):
+        if self.path is None or not (self.dirty or self.used.keys() != self.entries.keys()):
+            return
+
+        tmp = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'west-version': __version__, 'files': self.used}, f)
+            os.replace(tmp, self.path)
+        except (OSError, TypeError, ValueError):
+            # TypeError and ValueError: the YAML contained something
+            # JSON can't represent. Just don't cache it.
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
 def _ext_specs_from_desc(project, commands_desc):
     py_file = os.path.join(project.abspath, commands_desc['file'])
 
@@ -7,16 +7,23 @@
 Parser and abstract data types for west manifests.
 '''
 
+import contextlib
 import enum
 import errno
+import hashlib
 import logging
 import os
+import pickle
 import re
 import shlex
+import stat
 import subprocess
 import sys
+import threading
+import time
 from collections import deque
-from collections.abc import Callable, Iterable
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path, PurePosixPath
 from typing import TYPE_CHECKING, Any, NamedTuple, NoReturn
 
@@ -24,13 +31,16 @@ import pykwalify.core
 import yaml
 
 try:
+    from yaml import CSafeDumper
     from yaml import CSafeLoader as SafeLoader
 except ImportError:
     from yaml import SafeLoader  # type: ignore
 
+    CSafeDumper = None  # type: ignore
+
 from packaging.version import parse as parse_version
 
-from west import util
+from west import _trace, util
 from west.configuration import ConfigFile, Configuration, MalformedConfig
 from west.util import PathType
 
@@ -181,6 +191,117 @@ ManifestDataType = str | dict
 
 _logger = logging.getLogger(__name__)
 
+# Per-thread state for Project.git(). If a thread sets this object's
+# 'buffer_output' attribute to True, git output which would otherwise
+# go straight to west's own standard output and error is captured,
+# then written to sys.stdout and sys.stderr when the command is done.
+# This lets callers which work on several projects at once keep each
+# project's output together.
+_git_thread_state = threading.local()
+
+
+class GitCall(NamedTuple):
+    '''A finished git command, such as a `Project.git` call, as passed
+    to the functions registered with `add_git_call_hook`.'''
+
+    #: The git command line, starting with ``'git'``.
+    args: list[str]
+
+    #: The directory git ran in.
+    cwd: str
+
+    #: How long git took to run, in seconds.
+    duration: float
+
+    #: git's exit code.
+    returncode: int
+
+    #: The number of bytes git wrote to its standard output, or
+    #: None if it was not captured.
+    stdout_bytes: int | None
+
+    #: Like `stdout_bytes`, for git's standard error.
+    stderr_bytes: int | None
+
+
+# Functions to call with a GitCall after each git command. This is
+# replaced rather than modified, so _git_call_done() can read it
+# without holding _git_call_hooks_lock.
+_git_call_hooks: tuple[Callable[[GitCall], None], ...] = ()
+_git_call_hooks_lock = threading.Lock()
+
+
+def add_git_call_hook(hook: Callable[[GitCall], None]) -> None:
+    '''Register a function to call after each git command west runs.
+
+    The function is called with a `GitCall` describing the finished
+    git command, including when git fails. This can be used to count
+    or time the git commands that west runs.
+
+    This covers `Project.git` calls, `GitObjectReader` processes, and
+    the git commands run by west's own project commands to check
+    status and maintain caches. Commands which let git talk to the
+    user directly, like "west init" cloning the manifest repository
+    or "west grep", are not included.
+
+    Hooks are called from whichever thread ran git, so they must be
+    thread safe. They should also be quick, since git's caller waits
+    for them.
+
+    :param hook: function to call
+    '''
+    global _git_call_hooks
+
+    with _git_call_hooks_lock:
+        _git_call_hooks = _git_call_hooks + (hook,)
+
+
+def remove_git_call_hook(hook: Callable[[GitCall], None]) -> None:
+    '''Unregister a function registered with `add_git_call_hook`.
+
+    :param hook: function to unregister
+    :raises ValueError: if *hook* is not registered
+    '''
+    global _git_call_hooks
+
+    with _git_call_hooks_lock:
+        hooks = list(_git_call_hooks)
+        hooks.remove(hook)
+        _git_call_hooks = tuple(hooks)
+
+
+def _git_call_done(
+    args: list[str],
+    cwd: PathType,
+    duration: float,
+    returncode: int,
+    stdout_bytes: int | None,
+    stderr_bytes: int | None,
+) -> None:
+    # Call the git call hooks for a finished git command. Project.git()
+    # does this for its commands; anything else in west which runs git
+    # by hand should too.
+
+    hooks = _git_call_hooks
+    if hooks:
+        call = GitCall(args, os.fspath(cwd), duration, returncode, stdout_bytes, stderr_bytes)
+        for hook in hooks:
+            hook(call)
+
+
+@contextlib.contextmanager
+def git_call_hook(hook: Callable[[GitCall], None]) -> Iterator[None]:
+    '''Context manager which registers *hook* with
+    `add_git_call_hook` for the duration of its body.
+
+    :param hook: function to call
+    '''
+    add_git_call_hook(hook)
+    try:
+        yield
+    finally:
+        remove_git_call_hook(hook)
+
 
 # Type for the submodule value passed through the manifest file.
 class Submodule(NamedTuple):
@@ -287,38 +408,52 @@ def _manifest_content_at(
     path = os.fspath(path)
     _logger.debug(f'{project.name}: looking up path {path} type at {rev}')
 
-    # Returns 'blob', 'tree', etc. for path at revision, if it exists.
-    out = project.git(['ls-tree', rev, path], capture_stdout=True, capture_stderr=True).stdout
-
-    if not out:
-        # It's a bit inaccurate to raise FileNotFoundError for
-        # something that isn't actually file, but this is internal
-        # API, and git is a content addressable file system, so close
-        # enough!
-        raise OSError(errno.ENOENT, os.strerror(errno.ENOENT), path)
-
     # TODO: does git always output utf-8? Test git config 'core.precomposeunicode' etc.
     git_filenames_encoding = 'utf-8'
-    ptype = out.decode(git_filenames_encoding).split()[1]
-
-    if ptype == 'blob':
-        # Importing a file: just return its content.
-        return project.read_at(path, rev=rev).decode(mf_encoding)
-    elif ptype == 'tree':
-        # Importing a tree: return the content of the YAML files inside it.
-        ret = []
-        # Use a PurePosixPath because that's the form git seems to
-        # store internally, even on Windows.
-        pathobj = PurePosixPath(path)
-        for f in filter(
-            _is_yml, project.listdir_at(path, rev=rev, encoding=git_filenames_encoding)
-        ):
-            ret.append(project.read_at(pathobj / f, rev=rev).decode(mf_encoding))
-        return ret
-    else:
-        raise MalformedManifest(
-            f"can't decipher project {project.name} path {path} revision {rev} (git type: {ptype})"
-        )
+
+    # Read everything we need over a single 'git cat-file --batch'
+    # session instead of running git once per file.
+    with project.object_reader() as reader:
+        obj = reader.read(f'{rev}:{path}')
+        if obj is not None:
+            ptype = obj.type
+        else:
+            # Returns 'blob', 'tree', etc. for path at revision, if it
+            # exists. Unlike 'git cat-file', this fails if rev doesn't
+            # exist, which callers rely on.
+            out = project.git(
+                ['ls-tree', rev, path], capture_stdout=True, capture_stderr=True
+            ).stdout
+
+            if not out:
+                # It's a bit inaccurate to raise FileNotFoundError for
+                # something that isn't actually file, but this is internal
+                # API, and git is a content addressable file system, so close
+                # enough!
+                raise OSError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+
+            ptype = out.decode(git_filenames_encoding).split()[1]
+
+        if ptype == 'blob':
+            # Importing a file: just return its content.
+            data = obj.data if obj is not None else project.read_at(path, rev=rev)
+            return data.decode(mf_encoding)
+        elif ptype == 'tree':
+            # Importing a tree: return the content of the YAML files inside it.
+            ret = []
+            # Use a PurePosixPath because that's the form git seems to
+            # store internally, even on Windows.
+            pathobj = PurePosixPath(path)
+            for f in filter(
+                _is_yml, project.listdir_at(path, rev=rev, encoding=git_filenames_encoding)
+            ):
+                ret.append(project.read_at(pathobj / f, rev=rev).decode(mf_encoding))
+            return ret
+        else:
+            raise MalformedManifest(
+                f"can't decipher project {project.name} path {path} revision {rev} "
+                f"(git type: {ptype})"
+            )
 
 
 class _import_map(NamedTuple):
@@ -383,6 +518,38 @@ def _is_imap_ok(imap: _import_map, project: 'Project') -> bool:
         return allowed or no_allowlists
 
 
+class _ManifestInputs:
+    # Records what resolving a top-level manifest read: manifest
+    # files from the file system, directories listed to find them,
+    # and projects whose manifest-rev imports were read from. If
+    # none of these change, neither does the result.
+    #
+    # This is used by the on-disk manifest cache; see
+    # _manifest_from_topdir_cached().
+
+    def __init__(self) -> None:
+        # Map from file path to SHA-256 of the contents.
+        self.files: dict[str, str] = {}
+        # Map from directory path to the YAML files found in it.
+        self.dirs: dict[str, list[str]] = {}
+        # Projects imported from at their manifest-rev.
+        self.projects: list[Project] = []
+
+    def add_file(self, path: PathType, content: str) -> None:
+        self.files[os.fspath(path)] = _content_hash(content)
+
+    def add_dir(self, path: PathType, ymls: list[Path]) -> None:
+        self.dirs[os.fspath(path)] = [yml.name for yml in ymls]
+
+    def add_project(self, project: 'Project') -> None:
+        if project not in self.projects:
+            self.projects.append(project)
+
+
+def _content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8', errors='surrogateescape')).hexdigest()
+
+
 class _import_ctx(NamedTuple):
     # Holds shared state that we want to pass around as we
     # resolve imports.
@@ -456,6 +623,10 @@ class _import_ctx(NamedTuple):
     # Bit vector of flags that modify import behavior.
     import_flags: 'ImportFlag'
 
+    # Where we record what we read while resolving the manifest. This
+    # is shared, mutable state like 'projects'.
+    inputs: _ManifestInputs
+
 
 def _imap_filter_allows(imap_filter: ImapFilterFnType, project: 'Project') -> bool:
     # imap_filter(project) if imap_filter is not None; True otherwise.
@@ -633,10 +804,15 @@ def validate(data: Any) -> dict[str, Any]:
                 msg += '. Do you need to quote the value (e.g. "0.10" instead of 0.10)?'
             raise MalformedManifest(msg)
 
-    try:
-        pykwalify.core.Core(source_data=data, schema_files=[_SCHEMA_PATH]).validate()
-    except pykwalify.errors.SchemaError as se:
-        raise MalformedManifest(se.msg) from se
+    # Most manifest data is valid, and checking that with the compiled
+    # schema is much faster than with pykwalify. If the fast check
+    # fails, let pykwalify decide, so errors are reported exactly as
+    # they always have been.
+    if not _schema_check(data):
+        try:
+            pykwalify.core.Core(source_data=data, schema_files=[_SCHEMA_PATH]).validate()
+        except pykwalify.errors.SchemaError as se:
+            raise MalformedManifest(se.msg) from se
 
     # Normalize all odd cases to an empty, iterable list (#823)
     for k in ['projects']:
@@ -646,6 +822,122 @@ def validate(data: Any) -> dict[str, Any]:
     return as_dict
 
 
+# validate() helpers for checking manifest data against the schema.
+#
+# Creating a pykwalify Core loads the schema file from disk and parses
+# its rules every time, and the validation itself is fairly slow, so
+# validating manifests with a lot of imports used to dominate the time
+# spent loading them. Instead, the schema is loaded once and compiled
+# into a tree of plain Python functions.
+#
+# The compiled schema is only a fast path. It implements a subset of
+# pykwalify's semantics, and any rule it doesn't understand makes it
+# return False. It must never return True for data that pykwalify
+# would reject.
+
+_SCHEMA_CHECK: Callable[[Any], bool] | None = None
+
+_SCHEMA_SCALAR_TYPES: dict[str, Callable[[Any], bool]] = {
+    'str': lambda v: isinstance(v, (str, bytes)),
+    'int': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'float': lambda v: isinstance(v, float),
+    'text': lambda v: isinstance(v, (str, bytes, int, float)) and not isinstance(v, bool),
+    'any': lambda v: True,
+}
+
+
+def _schema_check(data: Any) -> bool:
+    # Returns True if 'data' is definitely valid according to the
+    # manifest schema, and False if it might not be.
+
+    global _SCHEMA_CHECK
+
+    if _SCHEMA_CHECK is None:
+        with open(_SCHEMA_PATH, encoding='utf-8') as f:
+            schema = yaml.load(f, Loader=SafeLoader)
+        partials = {k[len('schema;') :]: v for k, v in schema.items() if k.startswith('schema;')}
+        root = {k: v for k, v in schema.items() if not k.startswith('schema;')}
+        _SCHEMA_CHECK = _schema_compile(root, partials)
+
+    return _SCHEMA_CHECK(data)
+
+
+def _schema_compile(rule: dict[str, Any], partials: dict[str, Any]) -> Callable[[Any], bool]:
+    # Compile a pykwalify rule into a function which checks a value
+    # against it. The function also handles None values the way
+    # pykwalify does: they're errors for required values and maps,
+    # and fine otherwise.
+
+    def unsupported(value: Any) -> bool:
+        return False
+
+    rule = dict(rule)
+    required = rule.pop('required', False)
+
+    if 'include' in rule:
+        include = rule.pop('include')
+        if rule or include not in partials:
+            return unsupported
+        check = _schema_compile(partials[include], partials)
+        nullable = True
+    else:
+        rule_type = rule.pop('type', 'str')
+        if rule_type == 'map':
+            check = _schema_compile_map(rule, partials)
+            nullable = False
+        elif rule_type == 'seq':
+            check = _schema_compile_seq(rule, partials)
+            nullable = True
+        elif rule_type in _SCHEMA_SCALAR_TYPES and not rule:
+            check = _SCHEMA_SCALAR_TYPES[rule_type]
+            nullable = True
+        else:
+            return unsupported
+
+    if required or not nullable:
+        return lambda value: value is not None and check(value)
+    return lambda value: value is None or check(value)
+
+
+def _schema_compile_map(rule: dict[str, Any], partials: dict[str, Any]) -> Callable[[Any], bool]:
+    # _schema_compile() helper for maps.
+
+    mapping = rule.pop('mapping', None)
+    if rule or not isinstance(mapping, dict):
+        return lambda value: False
+
+    checks = {key: _schema_compile(sub, partials) for key, sub in mapping.items()}
+    required = [key for key, sub in mapping.items() if sub.get('required')]
+
+    def check(value: Any) -> bool:
+        return (
+            isinstance(value, dict)
+            and all(key in value for key in required)
+            and all(key in checks and checks[key](v) for key, v in value.items())
+        )
+
+    return check
+
+
+def _schema_compile_seq(rule: dict[str, Any], partials: dict[str, Any]) -> Callable[[Any], bool]:
+    # _schema_compile() helper for sequences.
+
+    sequence = rule.pop('sequence', None)
+    matching = rule.pop('matching', 'any')
+    if rule or not sequence or matching not in ('any', 'all'):
+        return lambda value: False
+
+    checks = [_schema_compile(sub, partials) for sub in sequence]
+    match = any if matching == 'any' else all
+
+    def check(value: Any) -> bool:
+        return isinstance(value, list) and all(
+            match(item_check(item) for item_check in checks) for item in value
+        )
+
+    return check
+
+
 # A 'raw' element in a project 'groups:' or manifest 'group-filter:' list,
 # as it is parsed from YAML, before conversion to string.
 RawGroupType = str | int | float
@@ -806,6 +1098,160 @@ class _MLS(str):
     pass
 
 
+def _mls_representer(dumper, data):
+    # libyaml's emitter only accepts exact str instances.
+    data = str(data)
+    if '\n' in data:
+        tag = 'tag:yaml.org,2002:str'
+        return dumper.represent_scalar(tag, data, style="|")
+    else:
+        return dumper.represent_str(data)
+
+
+class _ManifestDumper(yaml.SafeDumper):
+    # The YAML dumper for manifest data: yaml.safe_dump()'s, plus _MLS.
+    pass
+
+
+_ManifestDumper.add_representer(_MLS, _mls_representer)
+
+if CSafeDumper is not None:
+
+    class _CManifestDumper(CSafeDumper):
+        # Like _ManifestDumper, but using libyaml's emitter, which is
+        # much faster for big manifests.
+        pass
+
+    _CManifestDumper.add_representer(_MLS, _mls_representer)
+else:
+    _CManifestDumper = None  # type: ignore
+
+# Matches strings which the YAML emitters write double-quoted, which
+# includes any with a line that starts or ends with whitespace. The
+# pure Python and libyaml emitters fold long double-quoted strings
+# (and flow style collections) differently, so _dump_yaml() only uses
+# libyaml for block style output without any. This is conservative: it
+# also matches some strings that would be written in other styles.
+_YAML_DOUBLE_QUOTED_RE = re.compile(r'[^\n\x20-\x7e]|^[ \t]|[ \t]$', re.MULTILINE)
+
+
+def _yaml_c_dumpable(data: Any) -> bool:
+    # Returns True if libyaml's emitter writes 'data' exactly like the
+    # pure Python one does.
+
+    if isinstance(data, str):
+        return not _YAML_DOUBLE_QUOTED_RE.search(data)
+    if isinstance(data, dict):
+        return all(
+            # The emitters also disagree on empty and multi-line keys.
+            (not isinstance(k, str) or (k and '\n' not in k))
+            and _yaml_c_dumpable(k)
+            and _yaml_c_dumpable(v)
+            for k, v in data.items()
+        )
+    if isinstance(data, (list, tuple)):
+        return all(_yaml_c_dumpable(item) for item in data)
+    return True
+
+
+# Reading git refs without running git.
+#
+# Looking up HEAD or a branch like manifest-rev is usually just a
+# matter of reading a file or two in the .git directory, which is
+# much cheaper than starting a git process. This is only done for
+# plain repositories using the default "files" ref storage, where
+# .git is a directory owned by the current user. Anything else, like
+# worktrees, submodules with a .git file, reftable, or git environment
+# variables which change where the repository is, raises
+# _RefsUnsupported so the caller can run git instead.
+
+_FAST_REF_RE = re.compile(r'HEAD|refs/heads/[\w.-]+(?:/[\w.-]+)*')
+_HEX_SHA_RE = re.compile(rb'[0-9a-f]{40}(?:[0-9a-f]{24})?')
+_GIT_LOCATION_VARS = ('GIT_DIR', 'GIT_WORK_TREE', 'GIT_COMMON_DIR')
+
+
+class _RefsUnsupported(Exception):
+    '''Git is needed to read refs in a repository.'''
+
+
+def _git_dir_fast(abspath: str) -> str | None:
+    # Get the .git directory of a repository whose top level
+    # directory is abspath, or None if there is no .git there.
+
+    if any(var in os.environ for var in _GIT_LOCATION_VARS):
+        raise _RefsUnsupported
+    gitdir = os.path.join(abspath, '.git')
+    try:
+        st = os.stat(gitdir)
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        raise _RefsUnsupported from e
+    if not stat.S_ISDIR(st.st_mode):
+        raise _RefsUnsupported
+    # Git refuses to use repositories owned by other users unless
+    # safe.directory says otherwise, so let it decide in that case.
+    if not hasattr(os, 'geteuid') or st.st_uid != os.geteuid():
+        raise _RefsUnsupported
+    for name in ('commondir', 'reftable'):
+        if os.path.lexists(os.path.join(gitdir, name)):
+            raise _RefsUnsupported
+    return gitdir
+
+
+def _read_ref_fast(gitdir: str, refname: str, depth: int = 0) -> str | None:
+    # Resolve refname, which is 'HEAD' or a branch, to a SHA.
+    # Returns None if the ref doesn't exist. Like git, give up on
+    # symbolic ref chains more than 5 levels deep.
+
+    if depth > 5 or not _FAST_REF_RE.fullmatch(refname):
+        raise _RefsUnsupported
+    try:
+        with open(os.path.join(gitdir, *refname.split('/')), 'rb') as f:
+            data = f.read().strip()
+    except (FileNotFoundError, NotADirectoryError):
+        if refname == 'HEAD':
+            raise _RefsUnsupported from None
+        return _read_packed_ref_fast(gitdir, refname)
+    except OSError as e:
+        raise _RefsUnsupported from e
+
+    if data.startswith(b'ref: '):
+        try:
+            target = data[len(b'ref: ') :].decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise _RefsUnsupported from e
+        return _read_ref_fast(gitdir, target, depth + 1)
+    if not _HEX_SHA_RE.fullmatch(data):
+        raise _RefsUnsupported
+    return data.decode('ascii')
+
+
+def _read_packed_ref_fast(gitdir: str, refname: str) -> str | None:
+    # Look up a ref in packed-refs. Each line is '<sha> <refname>',
+    # except for the header and the '^<sha>' lines after annotated
+    # tags; refnames can't contain spaces, so searching for
+    # ' <refname>\n' finds the right line.
+
+    try:
+        with open(os.path.join(gitdir, 'packed-refs'), 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        raise _RefsUnsupported from e
+
+    if not data.endswith(b'\n'):
+        data += b'\n'
+    end = data.find(b' ' + refname.encode('utf-8') + b'\n')
+    if end == -1:
+        return None
+    sha = data[data.rfind(b'\n', 0, end) + 1 : end]
+    if not _HEX_SHA_RE.fullmatch(sha):
+        raise _RefsUnsupported
+    return sha.decode('ascii')
+
+
 class Project:
     '''Represents a project defined in a west manifest.
 
@@ -1019,15 +1465,41 @@ class Project:
         args = ['git'] + cmd_list + extra_args
         cmd_str = util.quote_sh_list(args)
 
+        buffer_output = getattr(_git_thread_state, 'buffer_output', False)
+
         _logger.debug(f"running '{cmd_str}' in {cwd}")
-        popen = subprocess.Popen(
+        with _trace.span('git', cat='git', argv=args, cwd=os.fspath(cwd)):
+            start = time.perf_counter()
+            popen = subprocess.Popen(
+                args,
+                cwd=cwd,
+                stdout=subprocess.PIPE if capture_stdout or buffer_output else None,
+                stderr=subprocess.PIPE if capture_stderr or buffer_output else None,
+            )
+
+            stdout: bytes | None
+            stderr: bytes | None
+            stdout, stderr = popen.communicate()
+            duration = time.perf_counter() - start
+
+        _git_call_done(
             args,
-            cwd=cwd,
-            stdout=subprocess.PIPE if capture_stdout else None,
-            stderr=subprocess.PIPE if capture_stderr else None,
+            cwd,
+            duration,
+            popen.returncode,
+            None if stdout is None else len(stdout),
+            None if stderr is None else len(stderr),
         )
 
-        stdout, stderr = popen.communicate()
+        if buffer_output:
+            if not capture_stdout:
+                if stdout:
+                    sys.stdout.write(stdout.decode(errors='backslashreplace'))
+                stdout = None
+            if not capture_stderr:
+                if stderr:
+                    sys.stderr.write(stderr.decode(errors='backslashreplace'))
+                stderr = None
 
         # We use logger style % formatting here to avoid the
         # potentially expensive overhead of formatting long
@@ -1051,6 +1523,17 @@ class Project:
         :param cwd: directory to run command in (default:
             self.abspath)
         '''
+        # HEAD and branches (always commits) can usually be read
+        # without running git. Anything else, including errors, is
+        # left to 'git rev-parse'.
+        if cwd is None and _FAST_REF_RE.fullmatch(rev):
+            try:
+                sha = self._read_ref_fast(rev)
+            except _RefsUnsupported:
+                sha = None
+            if sha is not None:
+                return sha
+
         # Though we capture stderr, it will be available as the stderr
         # attribute in the CalledProcessError raised by git() in
         # Python 3.5 and above if this call fails.
@@ -1119,6 +1602,12 @@ class Project:
         if not self.abspath or not os.path.isdir(self.abspath):
             return False
 
+        if cwd is None:
+            try:
+                return self._is_cloned_fast()
+            except _RefsUnsupported:
+                pass
+
         # --is-inside-work-tree doesn't require that the directory is
         # the top-level directory of a Git repository. Use --show-cdup
         # instead, which prints an empty string (i.e., just a newline,
@@ -1134,6 +1623,56 @@ class Project:
 
         return not (res.returncode or res.stdout.strip())
 
+    def _read_ref_fast(self, refname: str) -> str | None:
+        # Resolve 'HEAD' or a branch in the project to a SHA without
+        # running git, or return None if it doesn't exist. Raises
+        # _RefsUnsupported if git is needed.
+
+        gitdir = _git_dir_fast(self.abspath) if self.abspath else None
+        if gitdir is None:
+            raise _RefsUnsupported
+        return _read_ref_fast(gitdir, refname)
+
+    def _head_fast(self) -> tuple[str | None, str | None]:
+        # Get (branch, sha) for the project's HEAD without running
+        # git. The branch is None if HEAD is detached, and the sha is
+        # None if the branch is unborn. Raises _RefsUnsupported if
+        # git is needed.
+
+        gitdir = _git_dir_fast(self.abspath) if self.abspath else None
+        if gitdir is None:
+            raise _RefsUnsupported
+        try:
+            with open(os.path.join(gitdir, 'HEAD'), 'rb') as f:
+                data = f.read().strip()
+        except OSError as e:
+            raise _RefsUnsupported from e
+        if not data.startswith(b'ref: '):
+            return None, _read_ref_fast(gitdir, 'HEAD')
+        try:
+            branch = data[len(b'ref: ') :].decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise _RefsUnsupported from e
+        return branch, _read_ref_fast(gitdir, branch)
+
+    def _is_cloned_fast(self) -> bool:
+        # is_cloned() without running git. Raises _RefsUnsupported
+        # if git is needed to be sure.
+
+        if self.abspath is None:
+            return False
+        gitdir = _git_dir_fast(self.abspath)
+        if gitdir is None:
+            # Not the top level directory of a git repository, though
+            # it may be inside another one.
+            return False
+        # This is what git checks to see if a .git directory is a
+        # repository. HEAD may be an unborn branch.
+        _read_ref_fast(gitdir, 'HEAD')
+        if not all(os.path.isdir(os.path.join(gitdir, d)) for d in ('objects', 'refs')):
+            raise _RefsUnsupported
+        return True
+
     def read_at(self, path: PathType, rev: str | None = None, cwd: PathType | None = None) -> bytes:
         '''Read file contents in the project at a specific revision.
 
@@ -1143,6 +1682,13 @@ class Project:
         '''
         if rev is None:
             rev = self.revision
+
+        with self.object_reader(cwd=cwd) as reader:
+            obj = reader.read(f'{rev}:{os.fspath(path)}')
+        if obj is not None and obj.type == 'blob':
+            return obj.data
+
+        # Let 'git show' deal with anything else, including errors.
         cp = self.git(
             ['show', f'{rev}:{os.fspath(path)}'], capture_stdout=True, capture_stderr=True, cwd=cwd
         )
@@ -1170,6 +1716,13 @@ class Project:
         if encoding is None:
             encoding = 'utf-8'
 
+        with self.object_reader(cwd=cwd) as reader:
+            obj = reader.read(f'{rev}:{os.fspath(path)}')
+        if obj is not None and obj.type == 'tree':
+            return [name.decode(encoding) for name in _tree_entry_names(obj)]
+
+        # Let 'git ls-tree' deal with anything else, including errors.
+        #
         # git-ls-tree -z means we get NUL-separated output with no quoting
         # of the file names. Using 'git-show' or 'git-cat-file -p'
         # wouldn't work for files with special characters in their names.
@@ -1184,6 +1737,183 @@ class Project:
         # NUL-separated entry.
         return [f.decode(encoding).split('\t', 1)[1] for f in out.split(b'\x00') if f]
 
+    @contextlib.contextmanager
+    def object_reader(self, cwd: PathType | None = None) -> Iterator['GitObjectReader']:
+        '''Context manager for reading git objects from the project.
+
+        The value of the ``with`` statement is a `GitObjectReader`
+        which reads objects over a single ``git cat-file --batch``
+        process. It is closed when the ``with`` block exits.
+
+        While the block runs, read_at() and listdir_at() also use it
+        (unless they are given a different *cwd*), and nested calls
+        to this method return it again. This makes repeated reads from
+        the same repository much cheaper than running git each time.
+
+        :param cwd: directory to run git in (default: ``self.abspath``)
+        '''
+        current = getattr(self, '_object_reader', None)
+        if cwd is None and current is not None:
+            yield current
+            return
+
+        reader = GitObjectReader(self, cwd=cwd)
+        if cwd is None:
+            self._object_reader: GitObjectReader | None = reader
+        try:
+            yield reader
+        finally:
+            if cwd is None:
+                self._object_reader = None
+            reader.close()
+
+
+class GitObject(NamedTuple):
+    '''A git object read by a `GitObjectReader`.'''
+
+    #: The object's SHA, as a hexadecimal string.
+    sha: str
+
+    #: The object's type: 'blob', 'tree', 'commit', or 'tag'.
+    type: str
+
+    #: The object's raw contents.
+    data: bytes
+
+
+class GitObjectReader:
+    '''Reads objects from a project's git repository.
+
+    All reads happen over a single long-lived ``git cat-file --batch``
+    process, which is started the first time it's needed. Get one
+    from `Project.object_reader`.
+
+    This class is thread safe.
+    '''
+
+    def __init__(self, project: Project, cwd: PathType | None = None):
+        '''Create a reader; this doesn't start git yet.
+
+        :param project: project whose repository to read from
+        :param cwd: directory to run git in (default: ``project.abspath``)
+        '''
+        if cwd is None:
+            if project.abspath is None:
+                raise ValueError('no abspath; cwd must be given')
+            cwd = project.abspath
+
+        self.project = project
+        self.cwd = os.fspath(cwd)
+        self._popen: subprocess.Popen | None = None
+        self._lock = threading.Lock()
+        self._args: list[str] = []
+        self._start_time = 0.0
+        self._stdout_bytes = 0
+
+    def read(self, name: str) -> GitObject | None:
+        '''Read a git object.
+
+        Returns None if there is no such object.
+
+        :param name: object name, like ``'HEAD:west.yml'`` or a SHA
+        '''
+        if '\n' in name:
+            raise ValueError(f'invalid object name {name!r}')
+
+        with self._lock:
+            popen = self._start()
+            assert popen.stdin is not None and popen.stdout is not None
+
+            try:
+                popen.stdin.write(name.encode('utf-8') + b'\n')
+                popen.stdin.flush()
+                header = popen.stdout.readline()
+            except OSError:
+                header = b''
+            if not header:
+                self._stop()
+                raise subprocess.CalledProcessError(popen.returncode, popen.args)
+
+            fields = header.split()
+            if len(fields) != 3 or header.endswith((b' missing\n', b' ambiguous\n')):
+                _logger.debug(f'{self.project.name}: no object {name}')
+                return None
+
+            sha, objtype, size = fields
+            data = popen.stdout.read(int(size))
+            popen.stdout.read(1)  # trailing newline
+            self._stdout_bytes += len(header) + len(data) + 1
+            return GitObject(sha.decode('ascii'), objtype.decode('ascii'), data)
+
+    def close(self) -> None:
+        '''Stop the git process, if it's running.'''
+
+        with self._lock:
+            self._stop()
+
+    def __enter__(self) -> 'GitObjectReader':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _start(self) -> subprocess.Popen:
+        if self._popen is None:
+            args = ['git', 'cat-file', '--batch']
+            _logger.debug(f"running '{util.quote_sh_list(args)}' in {self.cwd}")
+            self._args = args
+            self._start_time = time.perf_counter()
+            self._stdout_bytes = 0
+            self._popen = subprocess.Popen(
+                args,
+                cwd=self.cwd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        return self._popen
+
+    def _stop(self) -> None:
+        if self._popen is None:
+            return
+        popen, self._popen = self._popen, None
+        assert popen.stdin is not None and popen.stdout is not None
+        try:
+            popen.stdin.close()
+        except OSError:
+            pass
+        popen.wait()
+        popen.stdout.close()
+        # The whole process counts as one git command.
+        _git_call_done(
+            self._args,
+            self.cwd,
+            time.perf_counter() - self._start_time,
+            popen.returncode,
+            self._stdout_bytes,
+            None,
+        )
+
+
+def _tree_entry_names(tree: GitObject) -> list[bytes]:
+    # Parse the entry names out of a tree object read by a
+    # GitObjectReader. Each entry is:
+    #
+    #     <mode> SP <name> NUL <binary SHA>
+    #
+    # The binary SHA's length depends on the repository's hash
+    # algorithm, so we get it from the tree's own SHA.
+
+    sha_len = len(tree.sha) // 2
+    data = tree.data
+    ret = []
+    i = 0
+    while i < len(data):
+        nul = data.index(b'\x00', i)
+        ret.append(data[data.index(b' ', i) + 1 : nul])
+        i = nul + 1 + sha_len
+    return ret
+
 
 # FIXME: this whole class should just go away. See #327.
 class ManifestProject(Project):
@@ -1410,6 +2140,7 @@ class Manifest:
             raise MalformedManifest('manifest contains no data')
         return Manifest(source_data=source_data, importer=importer, import_flags=import_flags)
 
+    @_trace.traced('Manifest')
     def __init__(
         self,
         *,  # All arguments are keyword-only.
@@ -1513,6 +2244,16 @@ class Manifest:
         containing YAML files. A return value of None will cause the import
         to be ignored.
 
+        If *import_flags* contains ``ImportFlag.FORCE_PROJECTS`` and
+        *importer* has a ``prefetch`` attribute, it is also called as:
+
+            ``importer.prefetch(projects)``
+
+        before *importer* is called for any project in ``projects``, a
+        list of the projects in a manifest's ``projects:`` whose imports
+        are about to be resolved. This lets the importer start any slow
+        work, like fetching, for all of them at once.
+
         Exceptions raised:
 
             - `MalformedManifest`: if the manifest data is invalid
@@ -1735,23 +2476,24 @@ class Manifest:
 
         :param active_only: Do not freeze inactive projects
         '''
+        pfilter = self.is_active if active_only else None
+
+        # Getting each SHA means running git in the project, so do it
+        # for all of them at once. Mapping over the projects in order
+        # means errors are raised for the first bad project in the
+        # manifest, just as if we'd done this one at a time.
+        projects = self.projects[MANIFEST_PROJECT_INDEX + 1 :]
+        projects = [p for p in projects if pfilter is None or pfilter(p)]
+        with ThreadPoolExecutor() as executor:
+            shas = list(executor.map(_frozen_sha, projects))
+        name2sha = {p.name: sha for p, sha in zip(projects, shas, strict=True)}
 
         def pdict(p):
-            if not p.is_cloned():
-                raise RuntimeError(f'cannot freeze; project {p.name} is uncloned')
-            try:
-                sha = p.sha(QUAL_MANIFEST_REV_BRANCH)
-            except subprocess.CalledProcessError as e:
-                raise RuntimeError(
-                    f'cannot freeze; project {p.name} '
-                    f'ref {QUAL_MANIFEST_REV_BRANCH} '
-                    'cannot be resolved to a SHA'
-                ) from e
             d = p.as_dict()
-            d['revision'] = sha
+            d['revision'] = name2sha[p.name]
             return d
 
-        return self._as_dict_helper(pdict=pdict, pfilter=self.is_active if active_only else None)
+        return self._as_dict_helper(pdict=pdict, pfilter=pfilter)
 
     def _dump_yaml(self, to_dump: dict, **kwargs) -> str:
         '''Dumps dictionary to YAML using the multi-line string representer.
@@ -1759,16 +2501,15 @@ class Manifest:
         :param dict: dictionary to be dumped
         :param kwargs: passed to yaml.safe_dump()
         '''
-
-        def mls_representer(dumper, data):
-            if '\n' in data:
-                tag = 'tag:yaml.org,2002:str'
-                return dumper.represent_scalar(tag, data, style="|")
-            else:
-                return dumper.represent_str(data)
-
-        yaml.add_representer(_MLS, mls_representer, Dumper=yaml.SafeDumper)
-        return yaml.safe_dump(to_dump, **kwargs)
+        dumper: Any = _ManifestDumper
+        if (
+            _CManifestDumper is not None
+            and not kwargs.get('default_flow_style')
+            and kwargs.keys() <= {'default_flow_style', 'sort_keys', 'indent', 'width'}
+            and _yaml_c_dumpable(to_dump)
+        ):
+            dumper = _CManifestDumper
+        return yaml.dump(to_dump, Dumper=dumper, **kwargs)
 
     def as_yaml(self, active_only: bool = False, **kwargs) -> str:
         '''Returns a YAML representation for self, fully resolved.
@@ -1996,6 +2737,7 @@ class Manifest:
         current_data = source_data
         current_repo_abspath = None
         project_filter: ProjectFilterType = []
+        inputs = _ManifestInputs()
 
         if topdir_abspath:
             config = config or Configuration(topdir=topdir_abspath)
@@ -2027,6 +2769,7 @@ class Manifest:
                     f'manifest.path="{manifest_path_option}", '
                     f'manifest.file="{manifest_file}")'
                 ) from err
+            inputs.add_file(current_abspath, current_data)
 
             current_repo_abspath = topdir_abspath / manifest_path
 
@@ -2051,6 +2794,7 @@ class Manifest:
             current_repo_abspath=current_repo_abspath,
             project_importer=project_importer,
             import_flags=import_flags,
+            inputs=inputs,
         )
 
     def _recursive_init(self, ctx: _import_ctx):
@@ -2299,7 +3043,9 @@ class Manifest:
             self._import_pathobj_from_self(pathobj_abs, pathobj)
         elif pathobj_abs.is_dir():
             _logger.debug('found submanifest directory: %s', imp)
-            for yml in filter(_is_yml, sorted(pathobj_abs.iterdir())):
+            ymls = list(filter(_is_yml, sorted(pathobj_abs.iterdir())))
+            self._ctx.inputs.add_dir(pathobj_abs, ymls)
+            for yml in ymls:
                 _logger.debug('found submanifest file: %s', yml)
                 self._import_pathobj_from_self(yml, pathobj / yml.name)
         else:
@@ -2317,10 +3063,10 @@ class Manifest:
         # Destructively merge imported content into self._ctx. The
         # intermediate manifest is thrown away; we're just
         # using __init__ as a function here.
+        content = pathobj_abs.read_text(encoding=Manifest.encoding)
+        self._ctx.inputs.add_file(pathobj_abs, content)
         child_ctx = self._ctx._replace(
-            current_abspath=pathobj_abs,
-            current_relpath=pathobj,
-            current_data=pathobj_abs.read_text(encoding=Manifest.encoding),
+            current_abspath=pathobj_abs, current_relpath=pathobj, current_data=content
         )
         try:
             Manifest(topdir=self.topdir, internal_import_ctx=child_ctx)
@@ -2345,18 +3091,20 @@ class Manifest:
             assert self.repo_abspath is not None
         pathobj_abs = self.repo_abspath / pathobj
         if pathobj_abs.is_dir():
-            # Use an iterator in case there are a lot of files in there.
-            to_import: Any = (f for f in sorted(pathobj_abs.iterdir()) if _is_yml(f))
+            to_import = [f for f in sorted(pathobj_abs.iterdir()) if _is_yml(f)]
+            self._ctx.inputs.add_dir(pathobj_abs, to_import)
         else:
-            to_import = iter([pathobj_abs])
+            to_import = [pathobj_abs]
 
         for import_abs in to_import:
+            content = import_abs.read_text(encoding=Manifest.encoding)
+            self._ctx.inputs.add_file(import_abs, content)
             child_ctx = self._ctx._replace(
                 imap_filter=imap_filter,
                 path_prefix=path_prefix,
                 current_abspath=import_abs,
                 current_relpath=pathobj / import_abs.name,
-                current_data=import_abs.read_text(encoding=Manifest.encoding),
+                current_data=content,
             )
             try:
                 Manifest(topdir=self.topdir, internal_import_ctx=child_ctx)
@@ -2412,6 +3160,7 @@ class Manifest:
                         have_imports.append((project, imp))
 
         # Handle imports from new projects in our "projects:" section.
+        self._prefetch_imports([project for project, _ in have_imports])
         for project, imp in have_imports:
             self._import_from_project(project, imp)
 
@@ -2599,6 +3348,19 @@ class Manifest:
             'expected a list or boolean'
         )
 
+    def _prefetch_imports(self, projects: list[Project]) -> None:
+        # Let the importer know which projects we're about to import
+        # from, if it wants to know. See the Manifest docstring.
+
+        prefetch = getattr(self._ctx.project_importer, 'prefetch', None)
+        if prefetch is None or not self._ctx.import_flags & ImportFlag.FORCE_PROJECTS:
+            return
+
+        projects = [p for p in projects if self._pfr(p) != PFR.INACTIVE]
+        if projects:
+            prefetch(projects)
+
+    @_trace.traced('import', args=lambda self, project, imp: {'project': project.name})
     def _import_from_project(self, project: Project, imp: Any):
         # Recursively resolve a manifest import from 'project'.
         #
@@ -2701,6 +3463,7 @@ class Manifest:
         if not (self._ctx.import_flags & ImportFlag.FORCE_PROJECTS) and project.is_cloned():
             try:
                 content = _manifest_content_at(project, path, Manifest.encoding)
+                self._ctx.inputs.add_project(project)
             except MalformedManifest as mm:
                 self._malformed(mm.args[0])
             except FileNotFoundError:
@@ -2859,6 +3622,229 @@ class Manifest:
             return ret
 
 
+#
+# On-disk manifest cache
+#
+
+# Resolving a manifest means reading and validating YAML files and
+# running git in every project with imports. To avoid doing this on
+# every west command, WestApp keeps a pickled copy of the resolved
+# Manifest in the .west directory, along with everything needed to
+# tell if it's still valid:
+#
+# - the west version which wrote it, and a hash of this module's
+#   source, since development versions of west don't bump the
+#   version when the pickled classes change
+# - the manifest's topdir and relevant configuration options
+# - hashes of all the manifest files read from the file system,
+#   and the YAML files found in any imported directories
+# - the manifest-rev SHA of every project imported from
+#
+# The cache is only used for plain Manifest.from_topdir() calls
+# (default importer and import flags). It can be disabled by setting
+# the manifest.cache configuration option to false.
+
+_MANIFEST_CACHE = 'manifest-cache.pickle'
+
+# Hash of this module's source, or None if it's not known yet.
+_module_source_hash: str | None = None
+
+
+def _manifest_module_hash() -> str:
+    # Hash of the source file defining the classes in the cached
+    # pickle. If it can't be read, use a key that never matches
+    # anything cached, which means no caching.
+
+    global _module_source_hash
+
+    if _module_source_hash is None:
+        try:
+            with open(__file__, 'rb') as f:
+                _module_source_hash = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return f'unknown-{os.getpid()}-{time.time()}'
+    return _module_source_hash
+
+
+def _manifest_cache_key(topdir: PathType, config: Configuration) -> dict[str, Any]:
+    # Everything except _ManifestInputs that the resolved manifest
+    # depends on.
+    #
+    # Manifest.from_topdir() reads most of the manifest.* options from
+    # the local configuration file only, but manifest_path() and others
+    # use the merged values, so key on both.
+
+    from west.version import __version__
+
+    key = {
+        'west-version': __version__,
+        'west-manifest-source': _manifest_module_hash(),
+        'topdir': os.fspath(topdir),
+        'manifest.project-filter': config.get('manifest.project-filter'),
+    }
+    for option in ['manifest.path', 'manifest.file', 'manifest.group-filter']:
+        key[option] = (config.get(option, configfile=ConfigFile.LOCAL), config.get(option))
+    return key
+
+
+def _manifest_cache_valid(entry: dict[str, Any], key: dict[str, Any]) -> bool:
+    # Check if the inputs recorded in a cache entry are unchanged.
+
+    if entry.get('key') != key:
+        return False
+
+    for path, content_hash in entry['files'].items():
+        try:
+            content = Path(path).read_text(encoding=Manifest.encoding)
+        except (OSError, UnicodeDecodeError):
+            return False
+        if _content_hash(content) != content_hash:
+            return False
+
+    for path, names in entry['dirs'].items():
+        try:
+            ymls = list(filter(_is_yml, sorted(Path(path).iterdir())))
+        except OSError:
+            return False
+        if [yml.name for yml in ymls] != names:
+            return False
+
+    manifest: Manifest = entry['manifest']
+    for project in manifest._ctx.inputs.projects:
+        sha = entry['revs'][project.name]
+        try:
+            if not project.is_cloned() or project.sha(QUAL_MANIFEST_REV_BRANCH) != sha:
+                return False
+        except subprocess.CalledProcessError:
+            return False
+
+    return True
+
+
+def _manifest_from_topdir_cached(topdir: PathType, config: Configuration) -> 'Manifest':
+    # Like Manifest.from_topdir(topdir=topdir, config=config), but
+    # using the on-disk manifest cache if possible. See above.
+
+    if not config.getboolean('manifest.cache', default=True):
+        return Manifest.from_topdir(topdir=topdir, config=config)
+
+    cache_file = Path(topdir) / util.WEST_DIR / _MANIFEST_CACHE
+    key = _manifest_cache_key(topdir, config)
+
+    try:
+        with open(cache_file, 'rb') as f:
+            entry = pickle.load(f)
+        if _manifest_cache_valid(entry, key):
+            _logger.debug(f'using cached manifest from {cache_file}')
+            return entry['manifest']
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # The cache is just an optimization. Don't let a corrupt or
+        # incompatible cache file keep west from working. This also
+        # covers errors unpickling it or using the objects inside, so
+        # those just mean resolving the manifest again.
+        _logger.debug(f'ignoring manifest cache {cache_file}: {e!r}')
+
+    # Resolve the manifest as usual, keeping track of any warnings.
+    # Those would not be repeated if we used a cached result, so
+    # don't cache manifests which cause them.
+    warnings = _WarningCounter()
+    _logger.addHandler(warnings)
+    try:
+        manifest = Manifest.from_topdir(topdir=topdir, config=config)
+    finally:
+        _logger.removeHandler(warnings)
+    if warnings.count:
+        return manifest
+
+    # Write to a temporary file and rename it, so concurrent west
+    # processes never see a partially written cache.
+    tmp = cache_file.with_name(f'{cache_file.name}.{os.getpid()}.tmp')
+    try:
+        revs = {p.name: p.sha(QUAL_MANIFEST_REV_BRANCH) for p in manifest._ctx.inputs.projects}
+        entry = {
+            'key': key,
+            'files': manifest._ctx.inputs.files,
+            'dirs': manifest._ctx.inputs.dirs,
+            'revs': revs,
+            'manifest': manifest,
+        }
+        with open(tmp, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)
+    except (
+        OSError,
+        pickle.PicklingError,
+        AttributeError,
+        TypeError,
+        subprocess.CalledProcessError,
+    ) as e:
+        # Unpicklable objects raise AttributeError or TypeError, not
+        # just PicklingError.
+        _logger.debug(f'not caching manifest in {cache_file}: {e!r}')
+        try:
+            tmp.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    return manifest
+
+
+class _WarningCounter(logging.Handler):
+    # Counts warnings and errors logged while it's attached.
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def _frozen_sha(project: Project) -> str:
+    # Manifest.as_frozen_dict() helper. Returns the SHA that project's
+    # manifest-rev points to, or raises RuntimeError.
+    #
+    # This usually reads the SHA without running git. Otherwise, it
+    # checks the project is cloned and gets the SHA with a single git
+    # command. If that doesn't work either, it tries again one step at
+    # a time to find out what went wrong.
+
+    if project.abspath:
+        try:
+            if project._is_cloned_fast():
+                sha = project._read_ref_fast(QUAL_MANIFEST_REV_BRANCH)
+                if sha is not None:
+                    return sha
+        except _RefsUnsupported:
+            pass
+
+    if project.abspath and os.path.isdir(project.abspath):
+        res = project.git(
+            ['rev-parse', '--show-cdup', f'{QUAL_MANIFEST_REV_BRANCH}^{{commit}}'],
+            check=False,
+            capture_stdout=True,
+            capture_stderr=True,
+        )
+        # The output is an empty line for the top-level directory,
+        # then the SHA.
+        lines = res.stdout.decode('ascii', errors='replace').splitlines()
+        if res.returncode == 0 and len(lines) == 2 and not lines[0].strip():
+            return lines[1].strip()
+
+    if not project.is_cloned():
+        raise RuntimeError(f'cannot freeze; project {project.name} is uncloned')
+    try:
+        return project.sha(QUAL_MANIFEST_REV_BRANCH)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(
+            f'cannot freeze; project {project.name} '
+            f'ref {QUAL_MANIFEST_REV_BRANCH} '
+            'cannot be resolved to a SHA'
+        ) from e
+
+
 class _PatchedConfiguration(Configuration):
     # Internal helper class that fakes out manifest.path and manifest.file
     # to point at another location. Used by Manifest.from_file().
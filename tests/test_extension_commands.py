@@ -5,6 +5,7 @@
 import subprocess
 import textwrap
 from pathlib import Path
+from unittest.mock import patch
 
 import yaml
 from conftest import GIT, WINDOWS, add_commit, cmd, cmd_raises, yaml_editor
@@ -266,6 +267,28 @@ def test_extension_command_multiple_commands_same_file(west_update_tmpdir):
     assert 'second command' in ext_output
 
 
+def test_extension_command_spec_cache(west_update_tmpdir):
+    # Validated west-commands files are cached in the .west directory,
+    # and the cache entry is only used while the file is unchanged.
+    cache_file = west_update_tmpdir / '.west' / 'extension-commands-cache.json'
+    spec_file = west_update_tmpdir / 'net-tools' / 'scripts' / 'west-commands.yml'
+
+    assert 'Testing test command 1' in cmd('test-extension')
+    assert str(spec_file) in cache_file.read_text(encoding='utf-8')
+
+    with patch('pykwalify.core.Core') as core:
+        assert 'Testing test command 1' in cmd('test-extension')
+        core.assert_not_called()
+
+    with yaml_editor(spec_file) as cmds:
+        cmds['west-commands'][0]['commands'][0]['help'] = 'changed help'
+    with patch('pykwalify.core.Core') as core:
+        cmd('help')
+        core.assert_called_once()
+    assert 'changed help' in cmd('help')
+    assert 'changed help' in cache_file.read_text(encoding='utf-8')
+
+
 def test_extension_special_chars(west_update_tmpdir):
     # Detect any unexpected changes in the way we've been handling backslashes and other
     # special characters. Changes in how we handle such edge cases may or may not be desired
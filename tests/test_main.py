@@ -1,11 +1,19 @@
+import io
+import json
+import os
+import re
 import runpy
 import sys
+import time
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 from conftest import cmd, cmd_subprocess
 
 import west.version
+from west import _trace
+from west.app import main
 
 
 def test_main():
@@ -48,3 +56,128 @@ def test_module_run(tmp_path, monkeypatch):
     # check that that the sys.path was correctly inserted
     expected_path = Path(__file__).parents[1] / 'src'
     assert actual_path == [f'{expected_path}', 'initial-path']
+
+
+def test_lazy_manifest(west_init_tmpdir):
+    # Commands which don't need the manifest should not cause it to be
+    # resolved, even when they're run through an alias.
+
+    load = main._manifest_from_topdir_cached
+    cmd('config alias.where topdir')
+
+    with patch.object(main, '_manifest_from_topdir_cached', wraps=load) as mock:
+        cmd('--version')
+        cmd('topdir')
+        cmd('where')
+        cmd('config manifest.path')
+        mock.assert_not_called()
+
+        cmd('list')
+        mock.assert_called_once()
+
+
+@pytest.mark.skipif(not os.environ.get('WEST_BENCHMARK'), reason='set WEST_BENCHMARK=1 to run')
+def test_lazy_manifest_benchmark(west_update_tmpdir, capsys):
+    # Startup benchmark for commands which don't need the manifest.
+    # Run it with "WEST_BENCHMARK=1 pytest -k benchmark tests/test_main.py"
+    # to see how long "west topdir" and "west config" take, compared
+    # to resolving the manifest first like other commands do.
+
+    def per_run(args, iterations=50):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            cmd(args)
+        return (time.perf_counter() - start) / iterations
+
+    def report(workspace):
+        for args in [['topdir'], ['config', 'manifest.path']]:
+            lazy = per_run(args)
+            with patch.object(main.WestApp, 'needs_manifest', return_value=True):
+                eager = per_run(args)
+            print(
+                f'\n{workspace}: west {" ".join(args)}: '
+                f'{lazy * 1e3:.1f} ms, {eager * 1e3:.1f} ms with the manifest'
+            )
+
+    with capsys.disabled():
+        report('cached manifest')
+        cmd('config manifest.cache false')
+        report('resolvable manifest')
+        (west_update_tmpdir / 'zephyr' / 'west.yml').write_text(
+            'manifest: {projects: 1}', encoding='utf-8'
+        )
+        report('unresolvable manifest')
+
+
+def test_trace(west_update_tmpdir, tmp_path):
+    # "west --trace FILE" should save a Chrome trace event file with
+    # spans for manifest loading, imports, git commands, and the
+    # command itself.
+
+    # Make sure the manifest is actually resolved, and that
+    # 'git status' runs even in clean projects.
+    cmd('config manifest.cache false')
+    trace_file = tmp_path / 'trace.json'
+    cmd(['--trace', str(trace_file), '-v', 'status'])
+
+    with open(trace_file) as f:
+        events = json.load(f)['traceEvents']
+    spans = [event for event in events if event['ph'] == 'X']
+    names = {event['name'] for event in spans}
+    assert {'load_manifest', 'Manifest', 'git', 'status.do_run'} <= names
+    assert all(event['dur'] >= 0 for event in spans)
+
+    git_spans = [event for event in spans if event['name'] == 'git']
+    assert any(
+        event['args']['argv'][:2] == ['git', 'status']
+        and Path(event['args']['cwd']) == Path(west_update_tmpdir) / 'subdir' / 'Kconfiglib'
+        for event in git_spans
+    )
+
+    # Tracing is off again after the command finishes.
+    assert not _trace.enabled()
+
+    # The --trace=FILE form works too, and doesn't get mistaken for
+    # the command name.
+    trace_file.unlink()
+    cmd([f'--trace={trace_file}', 'list'])
+    with open(trace_file) as f:
+        names = {event['name'] for event in json.load(f)['traceEvents']}
+    assert 'list.do_run' in names
+
+
+def test_git_summary(west_update_tmpdir):
+    # "west --git-summary" reports the git commands west ran, by
+    # subcommand, on standard error.
+
+    cmd('config manifest.cache false')
+    stderr = io.StringIO()
+    cmd(['--git-summary', '-v', 'status'], stderr=stderr)
+    lines = stderr.getvalue().splitlines()
+    summary = next(i for i, line in enumerate(lines) if line.startswith('west: git summary: '))
+    assert re.fullmatch(
+        r'west: git summary: \d+ command\(s\) in \d+\.\d{3} s, 0 failed', lines[summary]
+    )
+    assert lines[summary + 1].split() == ['count', 'total', '(s)', 'mean', '(ms)', 'command']
+    rows = {line.split()[-1]: int(line.split()[0]) for line in lines[summary + 2 :]}
+    assert rows['status'] == len(cmd('list -f {name}').split())
+
+    # Without -v, status checks each project with its own 'git status
+    # --porcelain' first, and those are counted too.
+    stderr = io.StringIO()
+    cmd(['--git-summary', 'status'], stderr=stderr)
+    lines = stderr.getvalue().splitlines()
+    summary = next(i for i, line in enumerate(lines) if line.startswith('west: git summary: '))
+    rows = {line.split()[-1]: int(line.split()[0]) for line in lines[summary + 2 :]}
+    assert rows['status'] == len(cmd('list -f {name}').split())
+
+    # Without the option, there is no summary.
+    stderr = io.StringIO()
+    cmd('-v status', stderr=stderr)
+    assert 'git summary' not in stderr.getvalue()
+
+
+def test_git_subcommand():
+    assert main.git_subcommand(['git', 'fetch', '-f', '--', 'url']) == 'fetch'
+    assert main.git_subcommand(['git', '-c', 'a.b=c', '-C', 'dir', 'status']) == 'status'
+    assert main.git_subcommand(['git', '--version']) == '<none>'
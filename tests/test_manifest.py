@@ -15,11 +15,13 @@ import platform
 import subprocess
 import sys
 import textwrap
+import time
 from copy import deepcopy
 from glob import glob
 from pathlib import Path, PurePath
 from unittest.mock import patch
 
+import pykwalify.core
 import pytest
 import yaml
 from conftest import (
@@ -40,6 +42,7 @@ from west.configuration import ConfigFile, Configuration, MalformedConfig
 
 # White box checks for the schema version.
 from west.manifest import (
+    _SCHEMA_PATH,
     _VALID_SCHEMA_VERS,
     MANIFEST_PROJECT_INDEX,
     SCHEMA_VERSION,
@@ -50,9 +53,19 @@ from west.manifest import (
     ManifestProject,
     ManifestVersionError,
     Project,
+    _frozen_sha,
+    _manifest_cache_key,
+    _manifest_content_at,
+    _manifest_from_topdir_cached,
+    _ManifestDumper,
     _ManifestImportDepth,
+    _RefsUnsupported,
+    _schema_check,
+    add_git_call_hook,
+    git_call_hook,
     is_group,
     manifest_path,
+    remove_git_call_hook,
     validate,
 )
 
@@ -222,6 +235,113 @@ def test_validate():
     ''') == {'manifest': {'projects': [{'name': 'p', 'url': 'u'}]}}
 
 
+@pytest.mark.parametrize(
+    'data',
+    [
+        {},
+        {'projects': None, 'self': {'path': 'mp'}},
+        {'projects': [{'name': 'p', 'url': 'u', 'revision': 1234, 'groups': ['g', 1, 2.5]}]},
+        {'defaults': {'remote': 'r'}, 'remotes': [{'name': 'r', 'url-base': 'u'}]},
+        {'group-filter': ['+g', None], 'self': {'import': {'name-allowlist': ['p']}}},
+        # Invalid, or at least not obviously valid:
+        {'defaults': None},
+        {'projects': [None]},
+        {'projects': [{'url': 'u'}]},
+        {'projects': [{'name': 'p', 'clone-depth': True}]},
+        {'projects': [{'name': 'p', 'revision': True}]},
+        {'projects': [{'name': 'p', 'groups': [['g']]}]},
+        {'projects': [{'name': 'p', 'unknown-key': 'v'}]},
+        {'remotes': {'name': 'r', 'url-base': 'u'}},
+        {'self': {'path': None, 'unknown-key': 'v'}},
+        {'unknown-key': 'v'},
+    ],
+)
+def test_validate_fast_path(data):
+    # validate() checks data with a compiled version of the schema
+    # before falling back on pykwalify. That must never accept data
+    # pykwalify rejects.
+
+    try:
+        pykwalify.core.Core(source_data=deepcopy(data), schema_files=[_SCHEMA_PATH]).validate()
+        valid = True
+    except pykwalify.errors.SchemaError:
+        valid = False
+
+    assert not _schema_check(data) or valid
+    if valid:
+        assert validate({'manifest': data})
+    else:
+        with pytest.raises(MalformedManifest):
+            validate({'manifest': data})
+
+
+@pytest.mark.parametrize('path', glob(os.path.join(THIS_DIRECTORY, 'manifests', '*.yml')))
+def test_validate_fast_path_test_manifests(path):
+    # Same as test_validate_fast_path(), for the test manifests. The
+    # fast path should accept the ones which pass the schema check.
+
+    with open(path) as f:
+        data = yaml.safe_load(f.read())
+    if not isinstance(data, dict) or not isinstance(data.get('manifest'), dict):
+        return
+    data = data['manifest']
+
+    try:
+        pykwalify.core.Core(source_data=deepcopy(data), schema_files=[_SCHEMA_PATH]).validate()
+        valid = True
+    except pykwalify.errors.SchemaError:
+        valid = False
+
+    assert _schema_check(data) == valid
+
+
+@pytest.mark.skipif(not os.environ.get('WEST_BENCHMARK'), reason='set WEST_BENCHMARK=1 to run')
+def test_validate_fast_path_benchmark(capsys):
+    # Microbenchmark for the compiled schema check. Run it with
+    # "WEST_BENCHMARK=1 pytest -k benchmark tests/test_manifest.py"
+    # to see how long checking the test manifests takes each way.
+
+    def per_file(check, datas, iterations=50):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for data in datas:
+                check(deepcopy(data))
+        return (time.perf_counter() - start) / iterations / len(datas)
+
+    def pykwalify_check(data):
+        try:
+            pykwalify.core.Core(source_data=data, schema_files=[_SCHEMA_PATH]).validate()
+        except pykwalify.errors.SchemaError:
+            pass
+
+    def validate_check(data):
+        try:
+            validate({'manifest': data})
+        except MalformedManifest:
+            pass
+
+    valid, invalid = [], []
+    for path in glob(os.path.join(THIS_DIRECTORY, 'manifests', '*.yml')):
+        with open(path) as f:
+            data = yaml.safe_load(f.read())
+        if isinstance(data, dict) and isinstance(data.get('manifest'), dict):
+            data = data['manifest']
+            (valid if _schema_check(data) else invalid).append(data)
+
+    with capsys.disabled():
+        for name, datas in [('schema-valid', valid), ('schema-invalid', invalid)]:
+            if not datas:
+                continue
+            slow = per_file(pykwalify_check, datas)
+            fast = per_file(validate_check, datas)
+            print(
+                f'\n{name} ({len(datas)} files): '
+                f'pykwalify {slow * 1e3:.1f} ms, validate() {fast * 1e3:.3f} ms per file'
+            )
+            if name == 'schema-valid':
+                assert fast < slow
+
+
 def test_constructor_arg_validation():
     with pytest.raises(ValueError) as e:
         Manifest(source_data='x', topdir='y')
@@ -600,6 +720,168 @@ def test_project_git_methods(tmpdir):
     assert not p.is_up_to_date()
 
 
+@pytest.mark.skipif(not hasattr(os, 'geteuid'), reason='refs are always read by git here')
+def test_project_refs_without_git(tmpdir):
+    # Project.is_cloned() and sha() read HEAD and branches directly
+    # when they can, and get the same answers as git.
+
+    path = tmpdir / 'project'
+    p = Project('project', 'ignore-this-url', topdir=tmpdir)
+    create_repo(path)
+    create_branch(path, 'nested/branch')
+
+    def check(expect_git_calls):
+        expected = {rev: rev_parse(path, rev) for rev in ['HEAD', 'refs/heads/nested/branch']}
+        git = Project.git
+        with patch.object(Project, 'git', autospec=True, side_effect=git) as mock_git:
+            assert p.is_cloned()
+            assert {rev: p.sha(rev) for rev in expected} == expected
+        assert bool(mock_git.call_count) == expect_git_calls
+
+    # Loose refs, with HEAD attached and detached, then packed refs.
+    check(False)
+    checkout_branch(path, 'nested/branch', detach=True)
+    check(False)
+    subprocess.check_call([GIT, 'pack-refs', '--all'], cwd=path)
+    assert not (path / '.git' / 'refs' / 'heads' / 'nested' / 'branch').exists()
+    check(False)
+
+    # Missing refs and unborn branches are left to git.
+    with pytest.raises(subprocess.CalledProcessError):
+        p.sha('refs/heads/missing')
+    unborn_path = tmpdir / 'unborn'
+    subprocess.check_call([GIT, 'init', unborn_path])
+    unborn = Project('unborn', 'ignore-this-url', topdir=tmpdir)
+    assert unborn.is_cloned()
+    with pytest.raises(subprocess.CalledProcessError):
+        unborn.sha('HEAD')
+
+    # Directories which aren't the top of a repository aren't cloned.
+    (path / 'subdir').mkdir()
+    subdir = Project('subdir', 'ignore-this-url', path='project/subdir', topdir=tmpdir)
+    assert not subdir.is_cloned()
+
+    # Worktrees have a .git file, so git is used.
+    subprocess.check_call([GIT, 'worktree', 'add', '--detach', tmpdir / 'worktree'], cwd=path)
+    p = Project('worktree', 'ignore-this-url', topdir=tmpdir)
+    path = tmpdir / 'worktree'
+    check(True)
+
+
+def test_git_call_hooks(tmpdir):
+    # Functions registered with add_git_call_hook() or git_call_hook()
+    # see every Project.git() call, including failing ones.
+
+    path = tmpdir / 'project'
+    p = Project('project', 'ignore-this-url', topdir=tmpdir)
+    create_repo(path)
+
+    calls = []
+    with git_call_hook(calls.append):
+        p.git('rev-parse HEAD', capture_stdout=True)
+        with pytest.raises(subprocess.CalledProcessError):
+            p.git('rev-parse --verify refs/heads/missing', capture_stderr=True)
+        p.git('status', cwd=tmpdir / 'project')
+    p.git('status')
+
+    assert [call.args for call in calls] == [
+        ['git', 'rev-parse', 'HEAD'],
+        ['git', 'rev-parse', '--verify', 'refs/heads/missing'],
+        ['git', 'status'],
+    ]
+    assert all(call.cwd == os.fspath(path) for call in calls)
+    assert all(call.duration >= 0 for call in calls)
+    assert [call.returncode for call in calls] == [0, 128, 0]
+    assert calls[0].stdout_bytes == len(rev_parse(path, 'HEAD')) + 1
+    assert calls[0].stderr_bytes is None
+    assert calls[1].stdout_bytes is None
+    assert calls[1].stderr_bytes > 0
+    assert calls[2].stdout_bytes is None
+
+    # Hooks can also be added and removed directly, and removing one
+    # that isn't registered is an error.
+    add_git_call_hook(calls.append)
+    p.git('status')
+    remove_git_call_hook(calls.append)
+    p.git('status')
+    assert len(calls) == 4
+    with pytest.raises(ValueError):
+        remove_git_call_hook(calls.append)
+
+    # A GitObjectReader's 'git cat-file --batch' process counts as one
+    # call, reported when it exits.
+    calls = []
+    with git_call_hook(calls.append):
+        with p.object_reader() as reader:
+            head = reader.read('HEAD')
+            assert calls == []
+    assert [call.args for call in calls] == [['git', 'cat-file', '--batch']]
+    assert calls[0].cwd == os.fspath(path)
+    assert calls[0].returncode == 0
+    assert calls[0].stdout_bytes > len(head.data)
+
+
+def test_frozen_sha(tmpdir):
+    # Freezing a project reads its manifest-rev without running git
+    # when it can, and with git otherwise.
+
+    path = tmpdir / 'project'
+    p = Project('project', 'ignore-this-url', topdir=tmpdir)
+    create_repo(path)
+    create_branch(path, 'manifest-rev')
+    sha = rev_parse(path, 'HEAD')
+
+    if hasattr(os, 'geteuid'):
+        with patch.object(Project, 'git', side_effect=AssertionError('git was run')):
+            assert _frozen_sha(p) == sha
+    with patch('west.manifest._read_ref_fast', side_effect=_RefsUnsupported):
+        assert _frozen_sha(p) == sha
+
+    subprocess.check_call([GIT, 'update-ref', '-d', 'refs/heads/manifest-rev'], cwd=path)
+    with pytest.raises(RuntimeError, match='cannot be resolved to a SHA'):
+        _frozen_sha(p)
+
+
+def test_project_object_reader(tmpdir):
+    # Test Project.object_reader() and how read_at() and listdir_at()
+    # use it.
+
+    path = tmpdir / 'project'
+    p = Project('project', 'ignore-this-url', topdir=tmpdir)
+    create_repo(path)
+    add_commit(path, 'add files', files={'a.txt': 'a', 'dir/b.yml': 'b', 'dir/c.yml': 'c'})
+    head = p.sha('HEAD')
+
+    with p.object_reader() as reader:
+        blob = reader.read('HEAD:a.txt')
+        assert blob.type == 'blob'
+        assert blob.data == b'a'
+        assert reader.read('HEAD').sha == head
+        assert reader.read('HEAD:dir').type == 'tree'
+        assert reader.read('HEAD:missing.txt') is None
+        assert reader.read('missing-rev:a.txt') is None
+
+        # Nested calls, read_at(), and listdir_at() all reuse the
+        # same reader until the outermost 'with' exits.
+        with p.object_reader() as nested:
+            assert nested is reader
+        with patch('west.manifest.GitObjectReader') as mock_reader:
+            assert p.read_at('dir/b.yml', rev='HEAD') == b'b'
+            assert p.listdir_at('dir', rev='HEAD') == ['b.yml', 'c.yml']
+            mock_reader.assert_not_called()
+
+    # Errors are still reported the same way as before.
+    with pytest.raises(subprocess.CalledProcessError):
+        p.read_at('missing.txt', rev='HEAD')
+    with pytest.raises(subprocess.CalledProcessError):
+        p.listdir_at('a.txt', rev='HEAD')
+    with pytest.raises(subprocess.CalledProcessError):
+        _manifest_content_at(p, 'a.txt', 'utf-8', rev='missing-rev')
+    with pytest.raises(FileNotFoundError):
+        _manifest_content_at(p, 'missing.txt', 'utf-8', rev='HEAD')
+    assert _manifest_content_at(p, 'dir', 'utf-8', rev='HEAD') == ['b', 'c']
+
+
 def test_project_repr():
     m = M('''\
     projects:
@@ -1346,6 +1628,44 @@ manifest:
             assert 'cannot be resolved to a SHA' in str(e.value)
 
 
+@pytest.mark.parametrize(
+    'description, extra_userdata',
+    [
+        ('short', {}),
+        ('a long multi-line description\nwhich is written as a block literal\n', {}),
+        ('trailing spaces  \nand unicode: \u00fcn\u00efc\u00f6d\u00e9 ' + 'x' * 80 + '\n', {}),
+        # Whitespace at the end of a line, next to where it's folded.
+        ('a' * 70 + '\nline two ', {}),
+        (' leading space\n' + 'b' * 70, {}),
+        ('short', {'': 'empty key'}),
+    ],
+)
+def test_as_yaml_c_dumper(description, extra_userdata):
+    # Manifests are dumped with libyaml when possible, and the output
+    # must be byte for byte what the pure Python dumper produces.
+
+    manifest = M(
+        f'''\
+    projects:
+    - name: p
+      url: u
+      groups: [g, 1]
+      userdata:
+        long: {'a very long string which will need to be folded ' * 3}
+        list: [1, 2.5, null, true, 'yes', '#hash']
+    self:
+      path: mp
+    '''
+    )
+    manifest.projects[1].description = description
+    manifest.projects[1].userdata.update(extra_userdata)
+
+    for kwargs in [{}, {'default_flow_style': False, 'sort_keys': False}, {'width': 40}]:
+        expected = yaml.dump(manifest.as_dict(), Dumper=_ManifestDumper, **kwargs)
+        assert manifest.as_yaml(**kwargs) == expected
+        assert yaml.safe_load(expected)['manifest']['projects'][0]['description'] == description
+
+
 def test_as_dict_groups():
     # Make sure groups and group-filter round-trip properly.
 
@@ -1903,6 +2223,107 @@ def test_import_project_list(manifest_repo):
         check_proj_consistency(a, e)
 
 
+def test_manifest_cache(manifest_repo):
+    # The resolved manifest is cached in the .west directory, and the
+    # cache is invalidated when any of its inputs change.
+
+    with open(manifest_repo / 'west.yml', 'w') as f:
+        f.write('''\
+        manifest:
+          projects:
+          - name: p1
+            url: p1-url
+            import: m1.yml
+          self:
+            path: mp
+            import: sub.yml
+        ''')
+    with open(manifest_repo / 'sub.yml', 'w') as f:
+        f.write('''\
+        manifest:
+          projects:
+          - name: p2
+            url: p2-url
+        ''')
+
+    topdir = manifest_repo.topdir
+    p1 = topdir / 'p1'
+    create_repo(p1)
+    create_branch(p1, 'manifest-rev', checkout=True)
+    add_commit(p1, 'add m1.yml', files={'m1.yml': 'manifest:\n  projects: []\n'})
+    config = Configuration(topdir=topdir)
+    cache_file = topdir / '.west' / 'manifest-cache.pickle'
+
+    def load(expect_hit):
+        with patch.object(Manifest, 'from_topdir', wraps=Manifest.from_topdir) as mock:
+            manifest = _manifest_from_topdir_cached(topdir, config)
+        assert mock.called != expect_hit
+        return [p.name for p in manifest.projects]
+
+    assert load(expect_hit=False) == ['manifest', 'p2', 'p1']
+    assert cache_file.is_file()
+    assert load(expect_hit=True) == ['manifest', 'p2', 'p1']
+
+    # Editing a manifest file on the file system invalidates the cache.
+    with open(manifest_repo / 'sub.yml', 'w') as f:
+        f.write('''\
+        manifest:
+          projects:
+          - name: p2
+            url: p2-url
+          - name: p3
+            url: p3-url
+        ''')
+    assert load(expect_hit=False) == ['manifest', 'p2', 'p3', 'p1']
+    assert load(expect_hit=True) == ['manifest', 'p2', 'p3', 'p1']
+
+    # So does moving manifest-rev in a project we imported from.
+    add_commit(
+        p1, 'add p4', files={'m1.yml': 'manifest:\n  projects:\n  - name: p4\n    url: p4-url\n'}
+    )
+    assert load(expect_hit=False) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+    assert load(expect_hit=True) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+
+    # And changing relevant configuration options.
+    config.set('manifest.project-filter', '-p3')
+    assert load(expect_hit=False) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+    assert load(expect_hit=True) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+
+    # Including ones in other configuration files.
+    config.set('manifest.file', 'other.yml', configfile=ConfigFile.GLOBAL)
+    assert load(expect_hit=False) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+    assert load(expect_hit=True) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+
+    # So does changing west's manifest module, even if the west
+    # version stays the same.
+    with patch('west.manifest._module_source_hash', 'some-other-source'):
+        assert load(expect_hit=False) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+    assert load(expect_hit=False) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+    assert load(expect_hit=True) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+
+    # A cache entry whose objects don't look like this west's is
+    # ignored.
+    stale = {'key': _manifest_cache_key(topdir, config), 'files': {}, 'dirs': {}}
+    stale['manifest'] = object()
+    with patch('west.manifest.pickle.load', return_value=stale):
+        assert load(expect_hit=False) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+
+    # Manifests which can't be pickled are just not cached.
+    cache_file.unlink()
+    with patch('west.manifest.pickle.dump', side_effect=TypeError("cannot pickle 'x'")):
+        assert load(expect_hit=False) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+    assert list(cache_file.parent.glob('manifest-cache.pickle*')) == []
+
+    # A corrupt cache file is ignored and replaced.
+    cache_file.write_bytes(b'garbage')
+    assert load(expect_hit=False) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+    assert load(expect_hit=True) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+
+    # The cache can be disabled.
+    config.set('manifest.cache', 'false')
+    assert load(expect_hit=False) == ['manifest', 'p2', 'p3', 'p1', 'p4']
+
+
 def test_import_project_directory(manifest_repo):
     # We should be able to import manifest files in a directory from a
     # revision. The files should come from git, not the file system.
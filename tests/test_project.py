@@ -1,6 +1,7 @@
 # Copyright (c) 2020, Nordic Semiconductor ASA
 
 import collections
+import json
 import os
 import re
 import shutil
@@ -8,6 +9,7 @@ import subprocess
 import sys
 import textwrap
 from pathlib import Path, PurePath
+from unittest.mock import patch
 
 import pytest
 import yaml
@@ -28,8 +30,16 @@ from conftest import (
     yaml_editor,
 )
 
+from west.app import main
 from west.manifest import ImportFlag as MIF
-from west.manifest import Manifest, ManifestImportFailed, ManifestProject, Project
+from west.manifest import (
+    Manifest,
+    ManifestImportFailed,
+    ManifestProject,
+    Project,
+    _RefsUnsupported,
+    git_call_hook,
+)
 
 #
 # Helpers
@@ -287,6 +297,46 @@ def test_list_sha(west_update_tmpdir):
     assert cmd('list -f {sha}').startswith("N/A")
 
 
+def test_list_jobs(west_update_tmpdir):
+    # {sha} and {cloned} are computed for all projects up front, but
+    # results and errors are still printed in manifest order.
+
+    manifest = Manifest.from_file()
+    expected = [f'manifest {"N/A":40} cloned'] + [
+        f'{p.name} {p.sha("refs/heads/manifest-rev")} cloned' for p in manifest.projects[1:]
+    ]
+    for jobs in ['1', '4']:
+        assert cmd(['list', '-j', jobs, '-f', '{name} {sha:.40} {cloned}']).splitlines() == (
+            expected
+        )
+
+    # In plain repositories, they're read without running git.
+    calls = []
+    with git_call_hook(calls.append):
+        cmd('list -j 4 -f {sha}{cloned}')
+    assert calls == []
+
+    # Format strings which don't need git don't run it.
+    with patch.object(Project, 'git', autospec=True) as mock_git:
+        assert cmd('list -f {name}').splitlines() == [
+            'manifest',
+            'Kconfiglib',
+            'tagged_repo',
+            'net-tools',
+        ]
+    mock_git.assert_not_called()
+
+    shutil.rmtree('tagged_repo')
+    assert cmd('list -j 4 -f {name}:{cloned}').splitlines() == [
+        'manifest:cloned',
+        'Kconfiglib:cloned',
+        'tagged_repo:not-cloned',
+        'net-tools:cloned',
+    ]
+    _, err = cmd_raises('list -j 4 -f {name}:{sha}', SystemExit)
+    assert 'cannot get sha for uncloned project tagged_repo' in err
+
+
 def test_manifest_untracked(west_update_tmpdir):
     def check(expected, cwd=None):
         out_lines = cmd("manifest --untracked", cwd=cwd).splitlines()
@@ -483,6 +533,36 @@ def test_manifest_freeze(west_update_tmpdir):
     _match_multiline_regex(expected_res, actual)
 
 
+def test_manifest_freeze_git_calls(west_update_tmpdir):
+    # Freezing should read manifest-rev without git if it can, or
+    # else run git once per project, and still give the usual errors
+    # when that's not enough.
+    manifest = Manifest.from_file()
+    expected = {p.name: p.sha('refs/heads/manifest-rev') for p in manifest.projects[1:]}
+
+    git = Project.git
+    with patch.object(Project, 'git', autospec=True, side_effect=git) as mock_git:
+        frozen = manifest.as_frozen_dict()
+    assert mock_git.call_count == (0 if hasattr(os, 'geteuid') else len(expected))
+    assert {p['name']: p['revision'] for p in frozen['manifest']['projects']} == expected
+
+    with (
+        patch('west.manifest._read_ref_fast', side_effect=_RefsUnsupported),
+        patch.object(Project, 'git', autospec=True, side_effect=git) as mock_git,
+    ):
+        frozen = manifest.as_frozen_dict()
+    assert mock_git.call_count == len(expected)
+    assert {p['name']: p['revision'] for p in frozen['manifest']['projects']} == expected
+
+    subprocess.check_call([GIT, '-C', 'net-tools', 'update-ref', '-d', 'refs/heads/manifest-rev'])
+    with pytest.raises(RuntimeError, match='project net-tools ref .* cannot be resolved'):
+        manifest.as_frozen_dict()
+
+    shutil.rmtree('tagged_repo')
+    with pytest.raises(RuntimeError, match='project tagged_repo is uncloned'):
+        manifest.as_frozen_dict()
+
+
 def test_manifest_freeze_active(west_update_tmpdir):
     # We should be able to freeze manifests with inactive projects.
     cmd('config manifest.group-filter -- -Kconfiglib-group')
@@ -628,6 +708,33 @@ def test_compare(config_tmpdir, west_init_tmpdir):
     assert 'mybranch' in cmd('compare --no-ignore-branches')
 
 
+def test_compare_jobs(config_tmpdir, west_update_tmpdir):
+    # Projects are checked concurrently and printed in manifest
+    # order. HEAD and manifest-rev are read without running git, so
+    # a clean project only needs one 'git status --porcelain'.
+
+    calls = []
+    with git_call_hook(calls.append):
+        assert cmd('compare -j 4') == ''
+    assert sorted(call.args[1:3] for call in calls) == 4 * [['status', '--porcelain']]
+
+    check_output(['git', 'checkout', '-b', 'mybranch'], cwd=west_update_tmpdir / 'net-tools')
+    (west_update_tmpdir / 'subdir' / 'Kconfiglib' / 'bar').write_text('', encoding='utf-8')
+    assert cmd('compare -j 4 --format {name}').splitlines() == ['Kconfiglib', 'net-tools']
+
+    subprocess.check_call([GIT, '-C', 'tagged_repo', 'update-ref', '-d', 'refs/heads/manifest-rev'])
+    _, err = cmd_raises('compare -j 4 --format {name}', SystemExit)
+    assert 'compare failed for project tagged_repo' in err
+
+    # A checked out branch is still reported without manifest-rev,
+    # whether or not git is needed to read the refs.
+    check_output(['git', 'checkout', '-b', 'mybranch'], cwd=west_update_tmpdir / 'tagged_repo')
+    expected = ['Kconfiglib', 'tagged_repo', 'net-tools']
+    assert cmd('compare -j 4 --format {name}').splitlines() == expected
+    with patch.object(Project, '_head_fast', side_effect=_RefsUnsupported):
+        assert cmd('compare -j 4 --format {name}').splitlines() == expected
+
+
 def test_compare_format_manifest(config_tmpdir, west_init_tmpdir):
     # ManifestProject special-casing: empty output, single-line
     # machine-readable output without any banner, and the path/sha/url
@@ -763,6 +870,37 @@ def test_diff(west_init_tmpdir):
     cmd('update Kconfiglib')
 
 
+def test_diff_jobs(west_update_tmpdir):
+    # Diffs are printed in manifest order however many jobs there
+    # are, and projects without changes are only counted.
+
+    (west_update_tmpdir / 'net-tools' / 'qemu-script.sh').write_text('x\n', encoding='utf-8')
+    (west_update_tmpdir / 'subdir' / 'Kconfiglib' / 'kconfiglib.py').write_text(
+        'x\n', encoding='utf-8'
+    )
+
+    for jobs in ['1', '4']:
+        actual = cmd_subprocess(['diff', '-j', jobs, '--name-only'])
+        assert [line for line in actual.splitlines() if line] == [
+            '=== diff for Kconfiglib (subdir/Kconfiglib):',
+            'kconfiglib.py',
+            '=== diff for net-tools (net-tools):',
+            'qemu-script.sh',
+            'Empty diff in 2 projects.',
+        ]
+
+    subprocess.check_call(['git', 'checkout', '--', '.'], cwd=west_update_tmpdir / 'net-tools')
+    subprocess.check_call(
+        ['git', 'checkout', '--', '.'], cwd=west_update_tmpdir / 'subdir' / 'Kconfiglib'
+    )
+    assert 'Empty diff in 4 projects.' in cmd_subprocess('diff -j 4')
+
+    # Failures are collected and reported at the end.
+    _, err = cmd_raises(['diff', '-j', '4', '--diff-filter=Q'], SystemExit)
+    assert 'diff failed for projects' in err
+    assert 'Kconfiglib' in err and 'net-tools' in err
+
+
 def test_status(west_init_tmpdir):
     # FIXME: Check output
 
@@ -780,6 +918,82 @@ def test_status(west_init_tmpdir):
     cmd('update Kconfiglib')
 
 
+def test_status_jobs(west_update_tmpdir):
+    # Only projects with something to report are printed, in manifest
+    # order, however many jobs there are.
+
+    for path in ['net-tools', 'subdir/Kconfiglib']:
+        (west_update_tmpdir / path / 'untracked.txt').write_text('x', encoding='utf-8')
+
+    for jobs in ['1', '4']:
+        actual = cmd_subprocess(['status', '-j', jobs, '--short'])
+        assert actual.splitlines() == [
+            '=== status of Kconfiglib (subdir/Kconfiglib):',
+            '?? untracked.txt',
+            '=== status of net-tools (net-tools):',
+            '?? untracked.txt',
+        ]
+
+    # Uncloned projects are skipped, unless asked for explicitly.
+    shutil.rmtree(west_update_tmpdir / 'subdir' / 'Kconfiglib')
+    assert cmd_subprocess('status -j 4 --short').splitlines() == [
+        '=== status of net-tools (net-tools):',
+        '?? untracked.txt',
+    ]
+    _, err = cmd_raises('status -j 4 Kconfiglib', SystemExit)
+    assert 'uncloned project: Kconfiglib' in err
+
+    # Failures are collected and reported at the end.
+    _, err = cmd_raises(['status', '-j', '4', '--not-a-git-status-option'], SystemExit)
+    assert "unknown option `not-a-git-status-option'" in err
+    assert 'status failed for project net-tools' in err
+
+
+@pytest.mark.skipif(WINDOWS, reason="pseudo terminals are POSIX only")
+def test_status_jobs_color(west_update_tmpdir):
+    # Output collected from several jobs is colored like git would
+    # color it on the terminal, unless git is configured not to.
+
+    import pty  # not available on Windows
+
+    def status_on_tty():
+        leader, follower = pty.openpty()
+        try:
+            proc = subprocess.Popen(
+                [sys.executable, main.__file__, 'status', '-j', '4', '--short'],
+                stdout=follower,
+                stderr=follower,
+            )
+            os.close(follower)
+            output = b''
+            while True:
+                try:
+                    data = os.read(leader, 4096)
+                except OSError:  # EIO: the terminal was closed
+                    break
+                if not data:
+                    break
+                output += data
+            assert proc.wait() == 0
+        finally:
+            os.close(leader)
+        return output.decode()
+
+    net_tools = west_update_tmpdir / 'net-tools'
+    (net_tools / 'untracked.txt').write_text('x', encoding='utf-8')
+    colored = '\x1b[31m??'
+
+    assert colored in status_on_tty()
+    check_output([GIT, 'config', 'color.status', 'auto'], cwd=net_tools)
+    assert colored in status_on_tty()
+    check_output([GIT, 'config', 'color.ui', 'never'], cwd=net_tools)
+    assert colored in status_on_tty()
+    check_output([GIT, 'config', 'color.status', 'false'], cwd=net_tools)
+    assert colored not in status_on_tty()
+    check_output([GIT, 'config', '--unset', 'color.status'], cwd=net_tools)
+    assert colored not in status_on_tty()
+
+
 def test_forall(west_init_tmpdir):
     # Note that the 'echo' command is available in both Unix shells
     # and Windows .bat files.
@@ -861,6 +1075,30 @@ def test_forall_env_vars(west_init_tmpdir, test_case):
     ]
 
 
+def test_forall_jobs(west_update_tmpdir):
+    # With -j, each project's output is printed below its banner in
+    # manifest order, each project gets its own WEST_PROJECT_*
+    # environment, and failures are collected.
+
+    env_var = '%WEST_PROJECT_NAME%' if WINDOWS else '$WEST_PROJECT_NAME'
+    stdout = cmd_subprocess(['forall', '-j', '4', '-c', f'echo {env_var}'])
+    assert stdout.splitlines() == [
+        f'=== running "echo {env_var}" in manifest (zephyr):',
+        'manifest',
+        f'=== running "echo {env_var}" in Kconfiglib (subdir/Kconfiglib):',
+        'Kconfiglib',
+        f'=== running "echo {env_var}" in tagged_repo (tagged_repo):',
+        'tagged_repo',
+        f'=== running "echo {env_var}" in net-tools (net-tools):',
+        'net-tools',
+    ]
+
+    _, err = cmd_raises(
+        ['forall', '-j', '4', '-c', 'git rev-parse --quiet --verify v1.0'], SystemExit
+    )
+    assert 'forall failed for projects: manifest, Kconfiglib, net-tools' in err
+
+
 def test_grep(west_init_tmpdir):
     # Make sure we don't find things we don't expect, and do find
     # things we do.
@@ -882,6 +1120,31 @@ def test_grep(west_init_tmpdir):
     assert re.search('west-commands', cmd('grep -- -- -commands'))
 
 
+def test_grep_jobs(west_update_tmpdir):
+    # Results are printed in manifest order however many projects
+    # are searched at once, and --first-match stops at the first
+    # project with a match.
+
+    for path in ['subdir/Kconfiglib', 'tagged_repo', 'net-tools']:
+        (west_update_tmpdir / path / 'needle.txt').write_text('a needle\n', encoding='utf-8')
+
+    for jobs in ['1', '4']:
+        actual = cmd(['grep', '-j', jobs, '--untracked', 'needle'])
+        assert actual.splitlines() == [
+            '=== Kconfiglib (subdir/Kconfiglib):',
+            'needle.txt:a needle',
+            '=== tagged_repo (tagged_repo):',
+            'needle.txt:a needle',
+            '=== net-tools (net-tools):',
+            'needle.txt:a needle',
+        ]
+
+        actual = cmd(['grep', '-j', jobs, '--first-match', '--untracked', '--quiet', 'needle'])
+        assert actual.splitlines() == ['=== Kconfiglib (subdir/Kconfiglib):']
+
+    assert cmd('grep -j 4 --first-match --untracked no-such-needle') == ''
+
+
 def test_update_projects(west_init_tmpdir):
     # Test the 'west update' command. It calls through to the same backend
     # functions that are used for automatic updates and 'west init'
@@ -959,6 +1222,123 @@ def test_update_projects_local_branch_commits(west_init_tmpdir):
     assert tagged_repo_prev == head_subject('tagged_repo')
 
 
+def test_update_jobs(west_init_tmpdir):
+    # Test 'west update -j N' and the update.jobs configuration option.
+
+    def sections(output):
+        # Split output into {project_name: output lines} by banner.
+        ret = {}
+        lines = None
+        for line in output.splitlines():
+            match = re.fullmatch(r'=== updating (\S+) \(.*\):', line)
+            if match:
+                lines = ret[match.group(1)] = []
+            elif lines is not None:
+                lines.append(line)
+        return ret
+
+    # Projects are updated concurrently, but the output from each
+    # project, including git's own output, must be printed together
+    # and in manifest order.
+    updated = sections(cmd('update -j 3'))
+    assert list(updated) == ['Kconfiglib', 'tagged_repo', 'net-tools']
+    for name, lines in updated.items():
+        assert f'--- {name}: fetching, need revision' in '\n'.join(lines)
+        from_lines = [line for line in lines if line.startswith('From ')]
+        assert len(from_lines) == 1
+        assert from_lines[0].endswith(f'repos/{name}')
+    for path in ['subdir/Kconfiglib', 'tagged_repo', 'net-tools']:
+        assert rev_parse(path, 'HEAD') == rev_parse(path, 'refs/heads/manifest-rev')
+
+    # Failures are still collected and reported once all projects
+    # are done.
+    cmd('config update.jobs 2')
+    with yaml_editor(west_init_tmpdir / 'zephyr' / 'west.yml') as mf:
+        mf['manifest']['projects'][1]['revision'] = 'unknown_revision'
+    _, stderr = cmd_raises('update', SystemExit)
+    assert 'update failed for project tagged_repo' in stderr
+
+
+def test_update_skip_unchanged(west_update_tmpdir):
+    # Projects whose revisions are SHAs are skipped without running
+    # git if they are still exactly as the last update left them.
+    # Kconfiglib has submodules, so it's always updated.
+
+    cmd('manifest --freeze -o zephyr/frozen.yml')
+    cmd('config manifest.file frozen.yml')
+    cmd('update')
+    assert (west_update_tmpdir / '.west' / 'update-state.json').check(file=1)
+
+    def update_git_calls(args='update'):
+        git = Project.git
+        with patch.object(Project, 'git', autospec=True, side_effect=git) as mock_git:
+            cmd(args)
+        return {call.args[0].name for call in mock_git.call_args_list}
+
+    assert update_git_calls() == {'Kconfiglib'}
+
+    # Projects that changed in any way are updated again.
+    net_tools = west_update_tmpdir / 'net-tools'
+    tagged_repo = west_update_tmpdir / 'tagged_repo'
+    head = rev_parse(tagged_repo, 'HEAD')
+    check_output([GIT, 'checkout', '-b', 'mybranch'], cwd=net_tools)
+    check_output([GIT, 'checkout', '--detach', 'HEAD^'], cwd=tagged_repo)
+    assert update_git_calls() == {'Kconfiglib', 'tagged_repo', 'net-tools'}
+    assert rev_parse(tagged_repo, 'HEAD') == head
+    assert rev_parse(net_tools, 'HEAD') == rev_parse(net_tools, 'refs/heads/manifest-rev')
+    assert update_git_calls() == {'Kconfiglib'}
+
+    # Forced fetches and the update.skip-unchanged option disable this.
+    assert update_git_calls('update --fetch always tagged_repo') == {'tagged_repo'}
+    cmd('config update.skip-unchanged false')
+    assert update_git_calls() == {'Kconfiglib', 'tagged_repo', 'net-tools'}
+
+
+def test_update_stats(west_update_tmpdir):
+    # Test 'west update --stats' in its various forms.
+
+    # Plain --stats prints per-project text, and still works when
+    # followed by a project name.
+    for args in ['update --stats', 'update --stats net-tools']:
+        actual = cmd(args)
+        assert 'performance statistics:' in actual
+        assert '  TOTAL: ' in actual
+
+    # The format is a separate option, which rejects unknown formats.
+    _, err = cmd_raises('update --stats-format=xml', SystemExit)
+    assert "invalid choice: 'xml'" in err
+
+    # JSON statistics can be printed and written to a file.
+    stats_file = west_update_tmpdir / 'stats.json'
+    actual = cmd([
+        'update',
+        '--stats-format=json',
+        '--stats-file',
+        str(stats_file),
+        '--fetch=always',
+    ])
+    assert 'performance statistics:' not in actual
+    printed = json.loads(actual[actual.rindex('\n{') + 1 :])
+    saved = json.loads(stats_file.read_text(encoding='utf-8'))
+    for stats in [printed, saved]:
+        assert [p['name'] for p in stats['projects']] == ['Kconfiglib', 'tagged_repo', 'net-tools']
+        for p in stats['projects']:
+            assert 'fetch' in p['phases']
+            assert p['total'] >= sum(p['phases'].values()) - 1e-6
+        fetch = stats['phases']['fetch']
+        assert fetch['count'] == 3
+        assert fetch['min'] <= fetch['p50'] <= fetch['p90'] <= fetch['p99'] == fetch['max']
+        assert stats['projects-total']['count'] == 3
+        assert stats['elapsed'] >= stats['projects-total']['max']
+
+    # --stats-file alone doesn't print anything extra.
+    actual = cmd(['update', '--stats-file', str(stats_file), 'tagged_repo'])
+    assert 'performance statistics:' not in actual
+    assert '"projects"' not in actual
+    saved = json.loads(stats_file.read_text(encoding='utf-8'))
+    assert [p['name'] for p in saved['projects']] == ['tagged_repo']
+
+
 def test_update_tag_to_tag(west_init_tmpdir):
     # Verify we can update the tagged_repo repo to a new tag.
 
@@ -1148,6 +1528,94 @@ def test_update_some_with_imports(repos_tmpdir):
     assert manifest.get_projects(['Kconfiglib'])[0].is_cloned()
 
 
+def test_update_jobs_with_imports(repos_tmpdir):
+    # 'west update -j N' should update projects with imports
+    # concurrently, and end up with the same results in the same
+    # order as a single job.
+
+    remotes = repos_tmpdir / 'repos'
+    for name, files in [
+        (
+            'a',
+            {
+                'west.yml': f'''
+                manifest:
+                  projects:
+                  - name: c
+                    url: {remotes / 'c'}
+                    import: true
+                  - name: net-tools
+                    url: {remotes / 'net-tools'}
+                '''
+            },
+        ),
+        (
+            'b',
+            {
+                'west.yml': f'''
+                manifest:
+                  projects:
+                  - name: Kconfiglib
+                    url: {remotes / 'Kconfiglib'}
+                    revision: zephyr
+                '''
+            },
+        ),
+        (
+            'c',
+            {
+                'west.yml': f'''
+                manifest:
+                  projects:
+                  - name: tagged_repo
+                    url: {remotes / 'tagged_repo'}
+                    revision: v1.0
+                '''
+            },
+        ),
+    ]:
+        create_repo(remotes / name)
+        add_commit(remotes / name, f'{name} manifest', files=files)
+
+    def update(ws, *args):
+        create_workspace(ws)
+        create_repo(ws / 'mp')
+        add_commit(
+            ws / 'mp',
+            'manifest repo commit',
+            files={
+                'west.yml': f'''
+                manifest:
+                  projects:
+                  - name: a
+                    url: {remotes / 'a'}
+                    import: true
+                  - name: b
+                    url: {remotes / 'b'}
+                    import: true
+                '''
+            },
+        )
+        output = cmd(['update'] + list(args), cwd=ws)
+        return [line for line in output.splitlines() if line.startswith('=== ')]
+
+    banners = update(repos_tmpdir / 'ws1')
+    assert update(repos_tmpdir / 'ws2', '-j', '4') == banners
+    assert banners == [
+        '=== updating a (a):',
+        '=== updating c (c):',
+        '=== updating b (b):',
+        '=== updating net-tools (net-tools):',
+        '=== updating tagged_repo (tagged_repo):',
+        '=== updating Kconfiglib (Kconfiglib):',
+    ]
+
+    manifest = Manifest.from_topdir(topdir=repos_tmpdir / 'ws2')
+    for project in manifest.projects[1:]:
+        assert project.is_cloned()
+        assert project.sha('HEAD') == project.sha('refs/heads/manifest-rev')
+
+
 def test_update_submodules_list(repos_tmpdir):
     # The west update command should not only update projects,
     # but also its submodules. Test uses two pairs of project
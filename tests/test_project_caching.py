@@ -1,16 +1,27 @@
 # Copyright (c) 2020, Nordic Semiconductor ASA
 
+import hashlib
+import io
 import os
+import re
 import shutil
 import subprocess
+import sys
 import textwrap
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
 
+import pytest
 from conftest import (
     GIT,
+    WINDOWS,
     add_commit,
     chdir,
+    check_output,
     cmd,
+    cmd_raises,
     create_branch,
     create_repo,
     create_workspace,
@@ -19,6 +30,9 @@ from conftest import (
     rev_parse,
 )
 
+import west
+from west.app.project import _AutoCacheLock
+
 #
 # Helpers
 #
@@ -231,22 +245,31 @@ def test_update_auto_cache(tmpdir):
 
     # Check that some info file was created with basic info
     # e.g. /path/to/auto/cache/foo/<hash>.info
+    # (The time it was last used varies, so it's checked separately.)
     foo_hash = sorted(os.listdir(auto_cache_dir / 'foo'))[0]
     bar_hash = sorted(os.listdir(auto_cache_dir / 'bar'))[0]
+
+    def read_info(path):
+        with open(path) as f:
+            content = f.read()
+        for key in ['Last Used', 'Last Fetched']:
+            match = re.search(rf'^- {key}: +(.*)\n', content, re.MULTILINE)
+            assert abs(datetime.fromisoformat(match[1]).timestamp() - time.time()) < 60
+            content = content.replace(match[0], '')
+        return content
+
     expected_foo_info = textwrap.dedent(f"""
         The following local cache directory was automatically created by west:
         - Local Cache:  {foo_hash}
         - Project Url:  file://{tmpdir / 'remotes' / 'foo'}
     """)
-    with open(auto_cache_dir / 'foo' / foo_hash + '.info') as f:
-        assert f.read() == expected_foo_info
+    assert read_info(auto_cache_dir / 'foo' / foo_hash + '.info') == expected_foo_info
     expected_bar_info = textwrap.dedent(f"""
         The following local cache directory was automatically created by west:
         - Local Cache:  {bar_hash}
         - Project Url:  file://{tmpdir / 'remotes' / 'bar'}
     """)
-    with open(auto_cache_dir / 'bar' / bar_hash + '.info') as f:
-        assert f.read() == expected_bar_info
+    assert read_info(auto_cache_dir / 'bar' / bar_hash + '.info') == expected_bar_info
 
     # Move the repositories out of the way and test the configuration option.
     # (We can't use shutil.rmtree here because Windows.)
@@ -409,6 +432,511 @@ def test_update_auto_cache_skipped_remote_update(tmpdir):
         assert msg in stdout
 
 
+def test_update_auto_cache_locking(tmpdir):
+    # Auto-cache mirrors are locked while west clones or fetches into
+    # them, leftovers from interrupted clones are cleaned up, and a
+    # remote update is skipped if someone else did one while west was
+    # waiting for the lock.
+    foo_remote = Path(tmpdir / 'remotes' / 'foo')
+    bar_remote = Path(tmpdir / 'remotes' / 'bar')
+    auto_cache_dir = Path(tmpdir / 'auto_cache_dir')
+    create_repo(foo_remote)
+    create_repo(bar_remote)
+
+    def setup_workspace_and_west_update(workspace):
+        setup_cache_workspace(
+            workspace,
+            foo_remote=foo_remote,
+            foo_head='master',
+            bar_remote=bar_remote,
+            bar_head='master',
+        )
+        with chdir(workspace):
+            return cmd(['-v', 'update', '--auto-cache', auto_cache_dir])
+
+    foo_hash = hashlib.md5(f'file://{foo_remote}'.encode()).hexdigest()
+    auto_cache_dir_foo = auto_cache_dir / 'foo' / foo_hash
+    stale_partial = auto_cache_dir / 'foo' / f'{foo_hash}.partial'
+    stale_partial.mkdir(parents=True)
+    stdout = setup_workspace_and_west_update(tmpdir / 'workspace1')
+    assert f'foo: removing stale {stale_partial}' in stdout
+    assert not stale_partial.exists()
+    assert rev_parse(auto_cache_dir_foo, 'master') == rev_parse(foo_remote, 'HEAD')
+    assert (auto_cache_dir / 'foo' / f'{foo_hash}.lock').is_file()
+
+    # Pretend another west fetched into the foo mirror while this one
+    # was waiting for the lock.
+    with open(auto_cache_dir / 'foo' / f'{foo_hash}.lock', 'w') as f:
+        f.write(f'{time.time() + 3600}\n')
+    foo_old = rev_parse(foo_remote, 'HEAD')
+    add_commit(foo_remote, 'new commit')
+    add_commit(bar_remote, 'new commit')
+    stdout = setup_workspace_and_west_update(tmpdir / 'workspace2')
+    assert (
+        'foo: auto-cache remote update is skipped as it was updated while waiting for it' in stdout
+    )
+    assert 'bar: update auto-cache' in stdout
+    assert rev_parse(auto_cache_dir_foo, 'master') == foo_old
+
+    # A lock held by one process blocks other processes and threads
+    # until it's released.
+    child = [
+        sys.executable,
+        '-c',
+        'import sys\n'
+        'from west.app.project import _AutoCacheLock\n'
+        'with _AutoCacheLock(sys.argv[1]) as lock:\n'
+        '    lock.mark_fetched()\n',
+        os.fspath(auto_cache_dir_foo),
+    ]
+    # Make the child import the same west as this test, even when
+    # it's run from an uninstalled tree.
+    west_path = os.fspath(Path(west.__file__).parent.parent)
+    child_env = dict(os.environ)
+    child_env['PYTHONPATH'] = os.pathsep.join(
+        [west_path] + ([child_env['PYTHONPATH']] if 'PYTHONPATH' in child_env else [])
+    )
+    acquired = threading.Event()
+
+    def take_lock():
+        with _AutoCacheLock(os.fspath(auto_cache_dir_foo)):
+            acquired.set()
+
+    with _AutoCacheLock(os.fspath(auto_cache_dir_foo)) as lock:
+        lock.mark_fetched()
+        fetched = lock.last_fetched()
+        proc = subprocess.Popen(child, env=child_env)
+        thread = threading.Thread(target=take_lock)
+        thread.start()
+        with pytest.raises(subprocess.TimeoutExpired):
+            proc.wait(timeout=1)
+        assert not acquired.is_set()
+    assert proc.wait(timeout=60) == 0
+    thread.join(timeout=60)
+    assert acquired.is_set()
+    with _AutoCacheLock(os.fspath(auto_cache_dir_foo)) as lock:
+        assert lock.last_fetched() >= fetched
+
+
+@pytest.mark.skipif(WINDOWS, reason="chmod is limited on Windows")
+@pytest.mark.skipif(
+    hasattr(os, "geteuid") and os.geteuid() == 0,
+    reason="root user can always write files",
+)
+def test_update_auto_cache_unwritable_lock(tmpdir):
+    # If an auto-cache mirror's lock file can't be opened, "west
+    # update" warns once and goes on without the lock.
+    foo_remote = Path(tmpdir / 'remotes' / 'foo')
+    bar_remote = Path(tmpdir / 'remotes' / 'bar')
+    auto_cache_dir = Path(tmpdir / 'auto_cache_dir')
+    create_repo(foo_remote)
+    create_repo(bar_remote)
+
+    def setup_workspace_and_west_update(workspace):
+        setup_cache_workspace(
+            workspace,
+            foo_remote=foo_remote,
+            foo_head='master',
+            bar_remote=bar_remote,
+            bar_head='master',
+        )
+        with chdir(workspace):
+            return cmd(['update', '--auto-cache', auto_cache_dir])
+
+    setup_workspace_and_west_update(tmpdir / 'workspace1')
+    lock_files = list(auto_cache_dir.glob('*/*.lock'))
+    assert len(lock_files) == 2
+    for lock_file in lock_files:
+        lock_file.chmod(0o444)
+
+    add_commit(foo_remote, 'new commit')
+    output = setup_workspace_and_west_update(tmpdir / 'workspace2')
+    assert output.count('continuing without the lock') == 1
+    assert rev_parse(tmpdir / 'workspace2' / 'subdir' / 'foo', 'HEAD') == rev_parse(
+        foo_remote, 'HEAD'
+    )
+
+
+@pytest.mark.skipif(WINDOWS, reason="chmod is limited on Windows")
+@pytest.mark.skipif(
+    hasattr(os, "geteuid") and os.geteuid() == 0,
+    reason="root user can always write files",
+)
+def test_update_auto_cache_read_only(tmpdir):
+    # Projects can still be cloned from a read-only shared auto-cache.
+    # Its .info files can't be updated, which "west update" warns
+    # about once.
+    foo_remote = Path(tmpdir / 'remotes' / 'foo')
+    bar_remote = Path(tmpdir / 'remotes' / 'bar')
+    auto_cache_dir = Path(tmpdir / 'auto_cache_dir')
+    create_repo(foo_remote)
+    create_repo(bar_remote)
+
+    def setup_workspace_and_west_update(workspace, cache_mode):
+        setup_cache_workspace(
+            workspace,
+            foo_remote=foo_remote,
+            foo_head='master',
+            bar_remote=bar_remote,
+            bar_head='master',
+        )
+        with chdir(workspace):
+            cmd(['config', 'update.cache-mode', cache_mode])
+            return cmd(['update', '--auto-cache', auto_cache_dir])
+
+    setup_workspace_and_west_update(tmpdir / 'workspace1', 'alternates')
+    dirs = [auto_cache_dir] + [d for d in auto_cache_dir.rglob('*') if d.is_dir()]
+    for d in dirs:
+        d.chmod(0o555)
+    try:
+        for i, cache_mode in enumerate(['clone', 'alternates'], start=2):
+            output = setup_workspace_and_west_update(tmpdir / f'workspace{i}', cache_mode)
+            assert output.count('.info: ') == 1
+            assert 'continuing without the lock' not in output
+            foo = Path(tmpdir / f'workspace{i}' / 'subdir' / 'foo')
+            assert rev_parse(foo, 'HEAD') == rev_parse(foo_remote, 'HEAD')
+            # gc.pruneExpire was set while the cache was writable, so
+            # it's still safe to borrow its objects.
+            alternates = foo / '.git' / 'objects' / 'info' / 'alternates'
+            assert alternates.is_file() == (cache_mode == 'alternates')
+    finally:
+        for d in dirs:
+            d.chmod(0o755)
+
+
+def test_update_auto_cache_alternates(tmpdir):
+    # With update.cache-mode=alternates, projects cloned from the
+    # auto-cache borrow its objects instead of copying them.
+    foo_remote = Path(tmpdir / 'remotes' / 'foo')
+    bar_remote = Path(tmpdir / 'remotes' / 'bar')
+    auto_cache_dir = Path(tmpdir / 'auto_cache_dir')
+    create_repo(foo_remote)
+    create_repo(bar_remote)
+    add_commit(foo_remote, 'new commit')
+
+    def alternates(repo):
+        try:
+            with open(repo / '.git' / 'objects' / 'info' / 'alternates') as f:
+                return f.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    workspace = Path(tmpdir / 'workspace1')
+    setup_cache_workspace(
+        workspace,
+        foo_remote=foo_remote,
+        foo_head='master',
+        bar_remote=bar_remote,
+        bar_head='master',
+    )
+    with chdir(workspace):
+        cmd(['update', '--auto-cache', auto_cache_dir])
+    assert alternates(workspace / 'subdir' / 'foo') == []
+
+    workspace = Path(tmpdir / 'workspace2')
+    setup_cache_workspace(
+        workspace,
+        foo_remote=foo_remote,
+        foo_head='master',
+        bar_remote=bar_remote,
+        bar_head='master',
+    )
+    with chdir(workspace):
+        cmd('config update.cache-mode alternates')
+        cmd(['update', '--auto-cache', auto_cache_dir])
+
+        # New commits are fetched through the auto-cache as usual.
+        add_commit(foo_remote, 'another commit')
+        cmd(['update', '--auto-cache', auto_cache_dir])
+
+    foo = workspace / 'subdir' / 'foo'
+    (foo_hash,) = [p for p in (auto_cache_dir / 'foo').iterdir() if p.is_dir()]
+    assert [Path(alt) for alt in alternates(foo)] == [foo_hash / 'objects']
+    assert rev_parse(foo, 'HEAD') == rev_parse(foo_remote, 'HEAD')
+    assert rev_parse(foo_hash, 'master') == rev_parse(foo_remote, 'HEAD')
+    assert list((foo / '.git' / 'objects' / 'pack').iterdir()) == []
+    # The auto-cache never prunes objects the workspace may borrow.
+    assert check_output([GIT, 'config', 'gc.pruneExpire'], cwd=foo_hash).strip() == 'never'
+    subprocess.check_call([GIT, 'fsck', '--connectivity-only'], cwd=foo)
+
+    # Invalid values are ignored with a warning.
+    workspace = Path(tmpdir / 'workspace3')
+    setup_cache_workspace(
+        workspace,
+        foo_remote=foo_remote,
+        foo_head='master',
+        bar_remote=bar_remote,
+        bar_head='master',
+    )
+    with chdir(workspace):
+        cmd('config update.cache-mode bogus')
+        stderr = io.StringIO()
+        cmd(['update', '--auto-cache', auto_cache_dir], stderr=stderr)
+    assert 'ignoring invalid config update.cache-mode=bogus' in stderr.getvalue()
+    assert alternates(workspace / 'subdir' / 'foo') == []
+
+
+def test_update_auto_cache_ttl(tmpdir):
+    # With update.auto-cache-ttl, auto-cache mirrors synced with their
+    # remotes less than that many seconds ago are reused as they are.
+    foo_remote = Path(tmpdir / 'remotes' / 'foo')
+    bar_remote = Path(tmpdir / 'remotes' / 'bar')
+    auto_cache_dir = Path(tmpdir / 'auto_cache_dir')
+    create_repo(foo_remote)
+    create_repo(bar_remote)
+
+    def setup_workspace_and_west_update(workspace, ttl, foo_head='master'):
+        setup_cache_workspace(
+            workspace,
+            foo_remote=foo_remote,
+            foo_head=foo_head,
+            bar_remote=bar_remote,
+            bar_head='master',
+        )
+        with chdir(workspace):
+            cmd(f'config update.auto-cache-ttl {ttl}')
+            stderr = io.StringIO()
+            stdout = cmd(['-v', 'update', '--auto-cache', auto_cache_dir], stderr=stderr)
+        return stdout, stderr.getvalue()
+
+    foo_hash = hashlib.md5(f'file://{foo_remote}'.encode()).hexdigest()
+    auto_cache_dir_foo = auto_cache_dir / 'foo' / foo_hash
+
+    def last_fetched():
+        with open(auto_cache_dir / 'foo' / f'{foo_hash}.info') as f:
+            match = re.search(r'^- Last Fetched: +(.*)$', f.read(), re.MULTILINE)
+        return datetime.fromisoformat(match[1])
+
+    setup_workspace_and_west_update(tmpdir / 'workspace1', 3600)
+    fetched = last_fetched()
+    assert abs(fetched.timestamp() - time.time()) < 60
+
+    # Within the TTL, the new commit is not fetched into the mirror.
+    foo_old = rev_parse(foo_remote, 'HEAD')
+    add_commit(foo_remote, 'new commit')
+    stdout, _ = setup_workspace_and_west_update(tmpdir / 'workspace2', 3600)
+    assert 'foo: auto-cache remote update is skipped as it was updated' in stdout
+    assert '(update.auto-cache-ttl is 3600)' in stdout
+    assert rev_parse(auto_cache_dir_foo, 'master') == foo_old
+    assert rev_parse(tmpdir / 'workspace2' / 'subdir' / 'foo', 'HEAD') == foo_old
+    assert last_fetched() == fetched
+
+    # Revisions missing from the mirror are fetched anyway.
+    foo_new = rev_parse(foo_remote, 'HEAD')
+    stdout, _ = setup_workspace_and_west_update(tmpdir / 'workspace3', 3600, foo_head=foo_new)
+    assert f'foo: update auto-cache ({auto_cache_dir_foo}) with remote' in stdout
+    assert rev_parse(tmpdir / 'workspace3' / 'subdir' / 'foo', 'HEAD') == foo_new
+    assert last_fetched() > fetched
+    fetched = last_fetched()
+
+    # Without it, the mirror is synced again.
+    add_commit(foo_remote, 'another commit')
+    stdout, _ = setup_workspace_and_west_update(tmpdir / 'workspace4', 0)
+    assert f'foo: update auto-cache ({auto_cache_dir_foo}) with remote' in stdout
+    assert rev_parse(auto_cache_dir_foo, 'master') == rev_parse(foo_remote, 'HEAD')
+    assert last_fetched() > fetched
+
+    # Invalid values are ignored with a warning.
+    add_commit(foo_remote, 'yet another commit')
+    _, stderr = setup_workspace_and_west_update(tmpdir / 'workspace5', -1)
+    assert 'ignoring invalid config update.auto-cache-ttl=-1' in stderr
+    assert rev_parse(auto_cache_dir_foo, 'master') == rev_parse(foo_remote, 'HEAD')
+
+
+def test_cache_prefetch(tmpdir):
+    # 'west cache prefetch' fills the caches without updating the
+    # workspace, so a later 'west update' doesn't need the remotes.
+    remotes = Path(tmpdir / 'remotes')
+    for name in ['foo', 'bar', 'baz']:
+        create_repo(remotes / name)
+    workspace = Path(tmpdir / 'workspace')
+    create_workspace(workspace)
+    with open(workspace / 'mp' / 'west.yml', 'w') as f:
+        f.write(f'''
+        manifest:
+          projects:
+          - name: foo
+            path: subdir/foo
+            url: file://{remotes / 'foo'}
+          - name: bar
+            url: file://{remotes / 'bar'}
+            groups: [bar-group]
+          - name: baz
+            url: file://{remotes / 'baz'}
+            groups: [baz-group]
+          - name: foo-again
+            url: file://{remotes / 'foo'}
+          group-filter: [-baz-group]
+        ''')
+    auto_cache_dir = Path(tmpdir / 'auto_cache_dir')
+    name_cache_dir = Path(tmpdir / 'name_cache_dir')
+
+    with chdir(workspace):
+        stdout = cmd([
+            'cache',
+            'prefetch',
+            '--auto-cache',
+            os.fspath(auto_cache_dir),
+            '--name-cache',
+            os.fspath(name_cache_dir),
+            '--gf=-bar-group',
+            '-j',
+            '2',
+        ])
+    assert f'--- foo: prefetching into {auto_cache_dir / "foo"}' in stdout
+    assert f'--- foo: prefetching into {name_cache_dir / "foo"}' in stdout
+    # foo-again has the same URL as foo, so it has the same auto-cache.
+    assert f'--- foo-again: prefetching into {auto_cache_dir}' not in stdout
+    assert f'--- foo-again: prefetching into {name_cache_dir / "foo-again"}' in stdout
+    assert '--- bar:' not in stdout and '--- baz:' not in stdout
+    assert sorted(p.name for p in auto_cache_dir.iterdir()) == ['foo']
+    assert sorted(p.name for p in name_cache_dir.iterdir() if p.is_dir()) == [
+        'foo',
+        'foo-again',
+    ]
+    assert not (workspace / 'subdir' / 'foo').exists()
+
+    with chdir(workspace):
+        cmd('config update.auto-cache ' + os.fspath(auto_cache_dir))
+        cmd('cache prefetch -j 1')
+    assert sorted(p.name for p in auto_cache_dir.iterdir()) == ['bar', 'foo']
+
+    # Everything 'west update' needs is cached now.
+    for name in ['foo', 'bar']:
+        shutil.move(remotes / name, remotes / f'{name}.moved')
+    with chdir(workspace):
+        cmd('update')
+    for name, path in [('foo', 'subdir/foo'), ('bar', 'bar')]:
+        assert rev_parse(workspace / path, 'HEAD') == rev_parse(remotes / f'{name}.moved', 'HEAD')
+
+    # It's an error if there's no cache to prefetch into.
+    with chdir(workspace):
+        cmd('config -d update.auto-cache')
+        _, stderr = cmd_raises('cache prefetch', SystemExit)
+    assert 'no cache to prefetch into' in stderr
+
+
+def test_cache_gc(tmpdir):
+    # 'west cache gc' removes least recently used auto-cache
+    # repositories and leftovers from interrupted clones.
+    remotes = Path(tmpdir / 'remotes')
+    auto_cache_dir = Path(tmpdir / 'auto_cache_dir')
+    for name in ['foo', 'bar']:
+        create_repo(remotes / name)
+    setup_cache_workspace(
+        Path(tmpdir / 'workspace'),
+        foo_remote=remotes / 'foo',
+        foo_head='master',
+        bar_remote=remotes / 'bar',
+        bar_head='master',
+    )
+    with chdir(tmpdir / 'workspace'):
+        cmd(['update', '--auto-cache', auto_cache_dir])
+    ((foo_cache,), (bar_cache,)) = [
+        [p for p in (auto_cache_dir / name).iterdir() if p.is_dir()] for name in ['foo', 'bar']
+    ]
+
+    # Pretend foo was last used 10 days ago, and leave behind an
+    # interrupted clone.
+    info = Path(f'{foo_cache}.info')
+    content = info.read_text()
+    last_used = re.search(r'^- Last Used:    (.*)$', content, re.MULTILINE)[1]
+    ten_days_ago = datetime.fromtimestamp(time.time() - 10 * 24 * 60 * 60).astimezone()
+    info.write_text(content.replace(last_used, ten_days_ago.isoformat(timespec='seconds')))
+    partial = auto_cache_dir / 'bar' / f'{bar_cache.name}.partial'
+    partial.mkdir()
+
+    # This works outside of a workspace, and a dry run doesn't
+    # remove anything.
+    gc = ['cache', 'gc', '--auto-cache', os.fspath(auto_cache_dir)]
+    stdout = cmd(gc + ['--max-age', '5', '--dry-run'])
+    assert f'would remove {partial}' in stdout
+    assert f'would remove {foo_cache} (' in stdout
+    assert f'would remove {bar_cache} (' not in stdout
+    assert 'would remove 1 cache repositories' in stdout
+    assert foo_cache.is_dir() and partial.is_dir()
+
+    # Nothing is too old or too big, so only the leftover is removed.
+    stdout = cmd(gc + ['--max-age', '30', '--max-size', '1G'])
+    assert f'removing {partial}' in stdout
+    assert 'removed 0 cache repositories (0B), kept 2' in stdout
+    assert not partial.exists()
+
+    stdout = cmd(gc + ['--max-age', '5'])
+    assert f'removing {foo_cache} (' in stdout
+    assert not (auto_cache_dir / 'foo').exists()
+    assert bar_cache.is_dir()
+    assert Path(f'{bar_cache}.info').is_file()
+
+    # The auto-cache can come from the configuration too.
+    with chdir(tmpdir / 'workspace'):
+        cmd('config update.auto-cache ' + os.fspath(auto_cache_dir))
+    stdout = cmd(['cache', 'gc', '--max-size', '1'], cwd=tmpdir / 'workspace')
+    assert f'removing {bar_cache} (' in stdout
+    assert 'removed 1 cache repositories' in stdout
+    assert list(auto_cache_dir.iterdir()) == []
+
+    _, stderr = cmd_raises(gc + ['--max-size', '1X'], SystemExit)
+    assert 'invalid --max-size: 1X' in stderr
+
+    # It doesn't need the manifest, so it works in a workspace whose
+    # manifest can't be loaded too.
+    os.remove(tmpdir / 'workspace' / 'mp' / 'west.yml')
+    stdout = cmd(['cache', 'gc'], cwd=tmpdir / 'workspace')
+    assert 'removed 0 cache repositories' in stdout
+
+
+def test_cache_gc_alternates(tmpdir):
+    # 'west cache gc' keeps auto-cache repositories which projects
+    # cloned with update.cache-mode=alternates borrow objects from,
+    # and never prunes objects in them.
+    remotes = Path(tmpdir / 'remotes')
+    auto_cache_dir = Path(tmpdir / 'auto_cache_dir')
+    workspace = Path(tmpdir / 'workspace')
+    for name in ['foo', 'bar']:
+        create_repo(remotes / name)
+    setup_cache_workspace(
+        workspace,
+        foo_remote=remotes / 'foo',
+        foo_head='master',
+        bar_remote=remotes / 'bar',
+        bar_head='master',
+    )
+    with chdir(workspace):
+        cmd('config update.cache-mode alternates')
+        cmd(['update', '--auto-cache', auto_cache_dir])
+    ((foo_cache,), (bar_cache,)) = [
+        [p for p in (auto_cache_dir / name).iterdir() if p.is_dir()] for name in ['foo', 'bar']
+    ]
+    info = Path(f'{foo_cache}.info').read_text()
+    assert f'- Borrowers:    {workspace / "subdir" / "foo"}\n' in info
+
+    gc = ['cache', 'gc', '--auto-cache', os.fspath(auto_cache_dir), '--max-size', '1']
+    stdout = cmd(gc + ['--dry-run'])
+    assert f'keeping {foo_cache}: still used by {workspace / "subdir" / "foo"}' in stdout
+    assert f'keeping {bar_cache}: still used by {workspace / "bar"}' in stdout
+    assert 'would remove 0 cache repositories' in stdout
+
+    # Objects which became unreachable in the auto-cache stay.
+    orphan = check_output([GIT, 'hash-object', '-w', '--stdin'], input=b'orphan', cwd=foo_cache)
+    stdout = cmd(gc + ['--repack'])
+    assert 'removed 0 cache repositories (0B), kept 2' in stdout
+    subprocess.check_call([GIT, 'cat-file', '-e', orphan.strip()], cwd=foo_cache)
+
+    # Once nothing borrows from a cache repository, it can go.
+    shutil.rmtree(workspace / 'subdir' / 'foo')
+    stdout = cmd(gc)
+    assert f'removing {foo_cache} (' in stdout
+    assert f'keeping {bar_cache}: still used by' in stdout
+    assert bar_cache.is_dir()
+
+    stderr = io.StringIO()
+    stdout = cmd(gc + ['--force'], stderr=stderr)
+    assert f'{bar_cache} is still used by: {workspace / "bar"}' in stderr.getvalue()
+    assert f'removing {bar_cache} (' in stdout
+    assert list(auto_cache_dir.iterdir()) == []
+
+
 def test_update_caches_priorities(tmpdir):
     # Test that the correct cache is used if multiple caches are specified
     # e.g. if 'west update --name-cache X --path-cache Y --auto-cache Z'